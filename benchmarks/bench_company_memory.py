@@ -0,0 +1,98 @@
+"""Measures the memory per ticker of `CompanyFundamentals` snapshots.
+
+Parses synthetic replay recordings into `MSNMoney`, `YahooFinanceAnalysis` and
+`Zacks` objects, and compares the memory retained by keeping those against
+keeping one `CompanyFundamentals` per ticker. Memory is measured with
+`tracemalloc`, so it counts every Python object a snapshot keeps alive.
+
+Usage:
+  python -m benchmarks.bench_company_memory [--tickers 2000]
+"""
+
+import argparse
+import gc
+import timeit
+import tracemalloc
+
+from isthisstockgood.Active.MSNMoney import MSNMoney
+from isthisstockgood.Active.YahooFinance import YahooFinanceAnalysis
+from isthisstockgood.Active.Zacks import Zacks
+from isthisstockgood.CompanyInfo import CompanyFundamentals
+from isthisstockgood.DataFetcher import computeTemplateValues
+from isthisstockgood.Replay import build_synthetic_recordings, synthetic_tickers
+
+
+def _parse_sources(ticker, bodies):
+  msn_money = MSNMoney(ticker)
+  stock_id = msn_money.extract_stock_id(bodies[msn_money.get_ticker_autocomplete_url()])
+  msn_money.parse_ratios_data(bodies[msn_money.get_key_ratios_url(stock_id)])
+  msn_money.parse_quotes_data(bodies[msn_money.get_quotes_url(stock_id)])
+  msn_money.parse_annual_report_data(bodies[msn_money.get_annual_statements_url(stock_id)])
+  yahoo_finance_analysis = YahooFinanceAnalysis(ticker)
+  yahoo_finance_analysis.parse_analyst_five_year_growth_rate(bodies[yahoo_finance_analysis.url])
+  zacks_analysis = Zacks(ticker)
+  zacks_analysis.five_year_growth_rate = zacks_analysis.get_growth_rate(bodies[zacks_analysis.url])
+  return msn_money, yahoo_finance_analysis, zacks_analysis
+
+
+def _retained_bytes(build):
+  """Returns the bytes still allocated by the object `build` returns."""
+  gc.collect()
+  tracemalloc.start()
+  before = tracemalloc.get_traced_memory()[0]
+  result = build()
+  gc.collect()
+  retained = tracemalloc.get_traced_memory()[0] - before
+  tracemalloc.stop()
+  del result
+  return retained
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--tickers', type=int, default=2000)
+  args = parser.parse_args()
+
+  tickers = synthetic_tickers(args.tickers)
+  bodies = {recording.url : recording.body for recording in build_synthetic_recordings(tickers)}
+
+  def build_sources():
+    return [_parse_sources(ticker, bodies) for ticker in tickers]
+
+  def build_snapshots():
+    # Only the snapshots survive; the parsed sources are discarded one by one.
+    return [
+      CompanyFundamentals.from_msn_money(*_parse_sources(ticker, bodies), ticker=ticker)
+      for ticker in tickers
+    ]
+
+  sources_bytes = _retained_bytes(build_sources) / len(tickers)
+  snapshot_bytes = _retained_bytes(build_snapshots) / len(tickers)
+  print(f'{len(tickers)} tickers')
+  print(f'{"MSNMoney + Yahoo + Zacks":>26}: {sources_bytes:8.0f} bytes/ticker')
+  print(f'{"CompanyFundamentals":>26}: {snapshot_bytes:8.0f} bytes/ticker '
+        f'({snapshot_bytes / sources_bytes:.0%})')
+
+  sources = build_sources()
+  snapshots = [CompanyFundamentals.from_msn_money(*parsed, ticker=ticker)
+               for ticker, parsed in zip(tickers, sources)]
+  for snapshot, (msn_money, yahoo_finance_analysis, zacks_analysis), ticker in zip(snapshots, sources, tickers):
+    expected = computeTemplateValues(ticker, msn_money, yahoo_finance_analysis, zacks_analysis)
+    assert snapshot.to_template_values() == expected, ticker
+
+  def template_values_from_sources():
+    for ticker, parsed in zip(tickers, sources):
+      computeTemplateValues(ticker, *parsed)
+
+  def template_values_from_snapshots():
+    for snapshot in snapshots:
+      snapshot.to_template_values()
+
+  for name, fn in (('from sources', template_values_from_sources),
+                   ('from snapshots', template_values_from_snapshots)):
+    seconds = min(timeit.repeat(fn, number=1, repeat=5))
+    print(f'{"template values " + name:>30}: {seconds / len(tickers) * 1e6:6.1f} us/ticker')
+
+
+if __name__ == '__main__':
+  main()
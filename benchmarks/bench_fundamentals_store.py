@@ -0,0 +1,66 @@
+"""Compares valuing a universe from the FundamentalsStore with reparsing its JSON.
+
+Parses synthetic replay recordings once and upserts them into a temporary
+`FundamentalsStore`. Then it times two ways of computing the Rule #1
+valuations for every ticker:
+- reparse: parses every payload again and calls `computeTemplateValues` per
+  ticker.
+- store: memory-maps the flushed columns and calls
+  `FundamentalsTable.valuations`.
+
+Usage:
+  python -m benchmarks.bench_fundamentals_store [--tickers 2000]
+"""
+
+import argparse
+import os
+import tempfile
+import timeit
+
+from benchmarks.bench_company_memory import _parse_sources
+from isthisstockgood.CompanyInfo import CompanyFundamentals
+from isthisstockgood.DataFetcher import computeTemplateValues
+from isthisstockgood.FundamentalsStore import FundamentalsStore, open_fundamentals
+from isthisstockgood.Replay import build_synthetic_recordings, synthetic_tickers
+
+
+def _directory_bytes(path):
+  return sum(
+    os.path.getsize(os.path.join(root, name))
+    for root, _, names in os.walk(path) for name in names
+  )
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--tickers', type=int, default=2000)
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  tickers = synthetic_tickers(args.tickers)
+  bodies = {recording.url : recording.body for recording in build_synthetic_recordings(tickers)}
+
+  def reparse():
+    for ticker in tickers:
+      computeTemplateValues(ticker, *_parse_sources(ticker, bodies))
+
+  with tempfile.TemporaryDirectory() as path:
+    store = FundamentalsStore(path, flush_every=None)
+    upsert_seconds = timeit.timeit(lambda: store.upsert_many(
+        CompanyFundamentals.from_msn_money(*_parse_sources(ticker, bodies), ticker=ticker)
+        for ticker in tickers), number=1)
+    flush_seconds = timeit.timeit(store.flush, number=1)
+    print(f'Parsed and upserted {len(tickers)} tickers in {upsert_seconds:.2f}s, '
+          f'flushed in {flush_seconds * 1000:.1f}ms '
+          f'({_directory_bytes(path) / 1024:.0f} KiB on disk)')
+
+    reparse_seconds = min(timeit.repeat(reparse, number=1, repeat=args.repeat))
+    store_seconds = min(timeit.repeat(
+        lambda: open_fundamentals(path).valuations(), number=1, repeat=args.repeat))
+  print(f'{"reparse":>8}: {reparse_seconds * 1000:9.1f}ms')
+  print(f'{"store":>8}: {store_seconds * 1000:9.1f}ms '
+        f'({reparse_seconds / store_seconds:.0f}x faster)')
+
+
+if __name__ == '__main__':
+  main()
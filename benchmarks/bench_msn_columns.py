@@ -0,0 +1,76 @@
+"""Benchmarks building the MSN Money metric columns from decoded key ratios.
+
+Compares `MSNMoney._extract_metric_columns`, which visits each period once and
+appends its values to every column of its kind, against splitting the periods
+by kind first and building each column with its own comprehension. Payloads
+are decoded once up front, so only the column building is timed.
+
+Usage:
+  python -m benchmarks.bench_msn_columns [--tickers 200] [--recordings DIR]
+"""
+
+import argparse
+import timeit
+from array import array
+
+import isthisstockgood.JSONBackend as JSONBackend
+from isthisstockgood.Active.MSNMoney import MSNMoney
+from isthisstockgood.Replay import RecordingStore, build_synthetic_recordings, synthetic_tickers
+
+
+def _per_metric_columns(json_data):
+  """The columns built with one comprehension per metric over pre-split periods."""
+  annual_periods = []
+  quarterly_periods = []
+  for metrics in json_data.get('companyMetrics', []):
+    time_period = metrics.get('fiscalPeriodType', '')
+    if time_period == 'Annual':
+      annual_periods.append(metrics)
+    elif 'Q' in time_period:
+      quarterly_periods.append(metrics)
+  annual = {
+    key : array('d', [period[key] for period in annual_periods if period.get(key) is not None])
+    for key in MSNMoney.ANNUAL_METRICS
+  }
+  quarterly = {
+    key : array('d', [period[key] for period in quarterly_periods if period.get(key) is not None])
+    for key in MSNMoney.QUARTERLY_METRICS
+  }
+  return annual if annual_periods else None, quarterly if quarterly_periods else None
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--tickers', type=int, default=200)
+  parser.add_argument('--repeat', type=int, default=20)
+  parser.add_argument('--recordings', help='Use recorded responses instead of synthetic ones.')
+  args = parser.parse_args()
+
+  if args.recordings:
+    recordings = list(RecordingStore(args.recordings))
+  else:
+    recordings = build_synthetic_recordings(synthetic_tickers(args.tickers))
+  payloads = [
+    JSONBackend.loads_members(recording.body, MSNMoney.RATIOS_MEMBERS)
+    for recording in recordings
+    if 'KeyRatios' in recording.url and recording.status == 200
+  ]
+  msn_money = MSNMoney('DUMMY')
+  for json_data in payloads:
+    assert msn_money._extract_metric_columns(json_data) == _per_metric_columns(json_data)
+
+  periods = sum(len(json_data.get('companyMetrics', [])) for json_data in payloads)
+  print(f'{len(payloads)} key ratios payloads, {periods / max(len(payloads), 1):.0f} periods each')
+  builds = {'single walk' : msn_money._extract_metric_columns, 'per metric' : _per_metric_columns}
+  best = dict.fromkeys(builds, float('inf'))
+  # Interleaved in alternating order, so that both see the same load on the machine.
+  for index in range(args.repeat):
+    for name, build in list(builds.items())[::1 if index % 2 else -1]:
+      seconds = timeit.timeit(lambda: [build(json_data) for json_data in payloads], number=1)
+      best[name] = min(best[name], seconds)
+  for name, seconds in best.items():
+    print(f'{name:>12}: {seconds / max(len(payloads), 1) * 1e6:6.1f} us/payload')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,124 @@
+"""Benchmarks decoding the MSN Money payloads with each available JSON backend.
+
+Parses the autosuggest, key ratios, quotes and equities payloads of synthetic
+recordings (or of a directory recorded with `isthisstockgood.Replay record`)
+with every available backend. The `json.loads` row decodes every whole payload
+with the standard library, as the parsers did before the backends and the
+selective decoding of the key ratios.
+
+Usage:
+  python -m benchmarks.bench_msn_json [--tickers 50] [--recordings DIR]
+"""
+
+import argparse
+import json
+import timeit
+from urllib.parse import urlparse
+
+import isthisstockgood.JSONBackend as JSONBackend
+from isthisstockgood.Active.MSNMoney import MSNMoney
+from isthisstockgood.Replay import RecordingStore, build_synthetic_recordings, synthetic_tickers
+
+_KINDS = {
+  'csautosuggest' : 'autosuggest',
+  'KeyRatios' : 'key_ratios',
+  'Quotes' : 'quotes',
+  'Equities' : 'equities',
+}
+
+
+def _kind_of(url):
+  for marker, kind in _KINDS.items():
+    if marker in url:
+      return kind
+  return None
+
+
+def _load_payloads(recordings):
+  """Groups MSN response bodies, as bytes, by payload kind."""
+  payloads = {kind : [] for kind in _KINDS.values()}
+  for recording in recordings:
+    kind = _kind_of(recording.url)
+    if kind and recording.status == 200:
+      ticker = ''
+      if kind == 'autosuggest':
+        ticker = urlparse(recording.url).query.split('query=')[1].split('&')[0]
+      payloads[kind].append((ticker, recording.body.encode('utf8')))
+  return payloads
+
+
+def _parse_all(kind, payloads):
+  for ticker, body in payloads:
+    msn_money = MSNMoney(ticker or 'DUMMY')
+    if kind == 'autosuggest':
+      msn_money.extract_stock_id(body)
+    elif kind == 'key_ratios':
+      msn_money.parse_ratios_data(body)
+    elif kind == 'quotes':
+      msn_money.parse_quotes_data(body)
+    else:
+      msn_money.parse_annual_report_data(body)
+
+
+def _decode_all(payloads, loads=json.loads):
+  for _, body in payloads:
+    loads(body)
+
+
+def _decode_selected(kind, payloads):
+  """Decodes `payloads` the way the parsers now do, without parsing them."""
+  if kind == 'key_ratios':
+    _decode_all(payloads, lambda body: JSONBackend.loads_members(body, MSNMoney.RATIOS_MEMBERS))
+  else:
+    _decode_all(payloads, JSONBackend.loads)
+
+
+def _microseconds_per_payload(fn, count, repeat):
+  return min(timeit.repeat(fn, number=1, repeat=repeat)) / max(count, 1) * 1e6
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--tickers', type=int, default=50)
+  parser.add_argument('--repeat', type=int, default=20)
+  parser.add_argument('--recordings', help='Use recorded responses instead of synthetic ones.')
+  args = parser.parse_args()
+
+  if args.recordings:
+    recordings = list(RecordingStore(args.recordings))
+  else:
+    recordings = build_synthetic_recordings(synthetic_tickers(args.tickers))
+  payloads = _load_payloads(recordings)
+
+  sizes = ', '.join(
+    f'{kind} {sum(len(body) for _, body in bodies) / max(len(bodies), 1) / 1024:.1f} KiB'
+    for kind, bodies in payloads.items()
+  )
+  print(f'Average payload sizes: {sizes}')
+  header = f'{"backend":>12} ' + ' '.join(f'{kind + " us":>15}' for kind in payloads)
+
+  def print_row(name, fn):
+    row = [_microseconds_per_payload(lambda: fn(kind, bodies), len(bodies), args.repeat)
+           for kind, bodies in payloads.items()]
+    print(f'{name:>12} ' + ' '.join(f'{value:>15.1f}' for value in row))
+
+  previous = JSONBackend.get_json_backend()
+  try:
+    print('\nDecoding only:')
+    print(header)
+    print_row('json.loads', lambda kind, bodies: _decode_all(bodies))
+    for backend in JSONBackend.AVAILABLE_BACKENDS:
+      JSONBackend.configure_json_backend(backend)
+      print_row(backend, _decode_selected)
+
+    print('\nDecoding and parsing:')
+    print(header)
+    for backend in JSONBackend.AVAILABLE_BACKENDS:
+      JSONBackend.configure_json_backend(backend)
+      print_row(backend, _parse_all)
+  finally:
+    JSONBackend.configure_json_backend(previous)
+
+
+if __name__ == '__main__':
+  main()
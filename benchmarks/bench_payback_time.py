@@ -0,0 +1,56 @@
+"""Benchmarks the closed-form `payback_time` against the original loop.
+
+Usage:
+  python -m benchmarks.bench_payback_time [--rows 20000]
+"""
+
+import argparse
+import random
+import timeit
+
+import isthisstockgood.RuleOneBatchCalculations as RuleOneBatch
+import isthisstockgood.RuleOneInvestingCalculations as RuleOne
+
+
+def _generate_rows(count, seed=0):
+  rng = random.Random(seed)
+  rows = []
+  for _ in range(count):
+    market_cap = rng.uniform(1e8, 3e12)
+    net_income = rng.uniform(1e5, 1e10)
+    growth_rate = rng.choice([rng.uniform(0.0005, 0.01), rng.uniform(0.01, 0.5)])
+    rows.append((market_cap, net_income, growth_rate))
+  return rows
+
+
+def _time(fn, repeat=3):
+  return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--rows', type=int, default=20000)
+  args = parser.parse_args()
+
+  rows = _generate_rows(args.rows)
+  market_caps, net_incomes, growth_rates = (list(column) for column in zip(*rows))
+
+  expected = [RuleOne._payback_time_iterative(*row) for row in rows]
+  closed_form = [RuleOne.payback_time(*row) for row in rows]
+  batch = RuleOneBatch.payback_time(market_caps, net_incomes, growth_rates).tolist()
+  assert closed_form == expected, 'closed form disagrees with the loop'
+  assert batch == expected, 'batch closed form disagrees with the loop'
+
+  timings = [
+    ('loop (scalar)', _time(lambda: [RuleOne._payback_time_iterative(*row) for row in rows])),
+    ('closed form (scalar)', _time(lambda: [RuleOne.payback_time(*row) for row in rows])),
+    ('closed form (numpy batch)', _time(lambda: RuleOneBatch.payback_time(market_caps, net_incomes, growth_rates))),
+  ]
+  print(f'{args.rows} rows, max payback {max(expected)} years, mean {sum(expected) / len(expected):.1f} years')
+  baseline = timings[0][1]
+  for name, seconds in timings:
+    print(f'  {name:28s} {seconds * 1000:10.2f} ms  {baseline / seconds:8.1f}x')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,152 @@
+"""Benchmarks the full `fetchDataForTickerSymbol` pipeline against replayed data.
+
+Every upstream request is answered by a local `ReplayServer`, with cold source
+caches and symbol index for each concurrency level, so runs are reproducible
+and need no network access.
+
+Usage:
+  python -m benchmarks.bench_pipeline [--tickers 64] [--concurrency 1,4,16,64]
+      [--latency 0.05] [--jitter 0.02] [--failure-rate 0.0] [--recordings DIR]
+      [--metrics] [--deadline 5.0] [--host-latency www.zacks.com=1.0 ...]
+      [--stall-rate 0.02] [--stall-latency 1.0] [--no-hedging]
+
+With --metrics every lookup is traced, and the mean time per source and
+stage is printed at the end. With --stall-rate a fraction of the requests
+stall, which slow requests are hedged against unless --no-hedging is given.
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from isthisstockgood.DataFetcher import DEFAULT_DEADLINE, fetchDataForTickerSymbol
+from isthisstockgood.Hedging import configure_hedger
+from isthisstockgood.Metrics import configure_metrics
+from isthisstockgood.RateLimiter import HostGuard
+from isthisstockgood.Replay import (
+  ReplayAdapter,
+  ReplayServer,
+  RecordingStore,
+  build_synthetic_recordings,
+  synthetic_tickers,
+)
+from isthisstockgood.SessionPool import configure_session_pool
+from isthisstockgood.SourceCache import configure_source_cache
+from isthisstockgood.SymbolIndex import configure_symbol_index
+
+
+def _percentile(sorted_values, percent):
+  """Nearest-rank percentile of an already sorted list."""
+  if not sorted_values:
+    return float('nan')
+  rank = max(1, -(-len(sorted_values) * percent // 100))
+  return sorted_values[int(rank) - 1]
+
+
+def _timed_fetch(ticker, deadline):
+  start = time.perf_counter()
+  template_values = fetchDataForTickerSymbol(ticker, deadline=deadline)
+  return time.perf_counter() - start, template_values is not None
+
+
+def _parse_host_latency(values):
+  host_latency = {}
+  for value in values or ():
+    host, _, seconds = value.partition('=')
+    host_latency[host] = float(seconds)
+  return host_latency
+
+
+def run_level(server, tickers, concurrency, deadline=DEFAULT_DEADLINE):
+  # Cold caches, so each level pays for every upstream request.
+  configure_source_cache(max_memory_bytes=0)
+  configure_symbol_index()
+  configure_session_pool(
+    max_workers=max(32, 4 * concurrency),
+    pool_maxsize=max(16, 4 * concurrency),
+    adapter_class=partial(ReplayAdapter, server_url=server.url),
+    # No rate limit, so the levels measure the pipeline itself. Circuits
+    # still open when --failure-rate is high.
+    host_guard=HostGuard(rate=None)
+  )
+
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=concurrency) as executor:
+    results = list(executor.map(partial(_timed_fetch, deadline=deadline), tickers))
+  elapsed = time.perf_counter() - start
+
+  latencies = sorted(latency for latency, _ in results)
+  return {
+    'concurrency' : concurrency,
+    'tickers' : len(tickers),
+    'succeeded' : sum(1 for _, ok in results if ok),
+    'throughput' : len(tickers) / elapsed,
+    'p50' : _percentile(latencies, 50),
+    'p95' : _percentile(latencies, 95),
+    'p99' : _percentile(latencies, 99),
+    'max' : latencies[-1],
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--tickers', type=int, default=64)
+  parser.add_argument('--concurrency', default='1,4,16,64')
+  parser.add_argument('--latency', type=float, default=0.05)
+  parser.add_argument('--jitter', type=float, default=0.02)
+  parser.add_argument('--failure-rate', type=float, default=0.0)
+  parser.add_argument('--recordings', help='Replay recorded responses instead of synthetic ones.')
+  parser.add_argument('--symbols', nargs='*', help='Tickers available in --recordings.')
+  parser.add_argument('--metrics', action='store_true', help='Trace every lookup.')
+  parser.add_argument('--deadline', type=float, default=DEFAULT_DEADLINE,
+                      help='Seconds each lookup waits for its sources.')
+  parser.add_argument('--host-latency', nargs='*', metavar='HOST=SECONDS',
+                      help='Additional latency of individual upstream hosts.')
+  parser.add_argument('--stall-rate', type=float, default=0.0,
+                      help='The fraction of requests that stall.')
+  parser.add_argument('--stall-latency', type=float, default=1.0,
+                      help='The additional seconds of latency of a stalled request.')
+  parser.add_argument('--no-hedging', action='store_true', help='Never hedge slow requests.')
+  args = parser.parse_args()
+  metrics = configure_metrics(enabled=args.metrics)
+  # One hedger for every level, so that later levels hedge from the start.
+  hedger = configure_hedger(max_in_flight=0) if args.no_hedging else configure_hedger()
+
+  if args.recordings:
+    store = RecordingStore(args.recordings)
+    tickers = args.symbols or []
+  else:
+    tickers = synthetic_tickers(args.tickers)
+    store = RecordingStore()
+    store.add_many(build_synthetic_recordings(tickers))
+
+  server = ReplayServer(store, latency=args.latency, jitter=args.jitter,
+                        failure_rate=args.failure_rate,
+                        host_latency=_parse_host_latency(args.host_latency),
+                        stall_rate=args.stall_rate, stall_latency=args.stall_latency)
+  print(f'{len(tickers)} tickers, {args.latency * 1000:.0f}ms (+{args.jitter * 1000:.0f}ms) '
+        f'upstream latency, {args.failure_rate:.0%} failures, {args.stall_rate:.0%} stalls')
+  print(f'{"concurrency":>11} {"ok":>5} {"tickers/s":>10} {"p50 ms":>8} '
+        f'{"p95 ms":>8} {"p99 ms":>8} {"max ms":>8}')
+  with server:
+    for concurrency in (int(level) for level in args.concurrency.split(',')):
+      result = run_level(server, tickers, concurrency, deadline=args.deadline)
+      print(f'{result["concurrency"]:>11} {result["succeeded"]:>5} {result["throughput"]:>10.1f} '
+            f'{result["p50"] * 1000:>8.1f} {result["p95"] * 1000:>8.1f} '
+            f'{result["p99"] * 1000:>8.1f} {result["max"] * 1000:>8.1f}')
+
+  if args.metrics:
+    print(f'\n{"source":>18} {"stage":>8} {"count":>6} {"mean ms":>8}')
+    for (source, stage), (count, total) in sorted(metrics.stage_seconds.totals().items()):
+      print(f'{source:>18} {stage:>8} {count:>6} {total / count * 1000:>8.2f}')
+
+  if not args.no_hedging:
+    print(f'\n{"source":>18} {"requests":>9} {"hedged":>7} {"won":>5} {"capped":>7}')
+    for source, stats in hedger.get_stats()['sources'].items():
+      print(f'{source:>18} {stats["requests"]:>9} {stats["hedged"]:>7} '
+            f'{stats["hedges_won"]:>5} {stats["capped"]:>7}')
+
+
+if __name__ == '__main__':
+  main()
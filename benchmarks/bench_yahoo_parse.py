@@ -0,0 +1,75 @@
+"""Benchmarks streaming vs. full DOM parsing of the Yahoo Finance analysis page.
+
+Peak memory is measured as the growth of the peak resident set size in a fresh
+process per mode, since lxml allocates its trees outside of the Python heap
+where `tracemalloc` cannot see them.
+
+Usage:
+  python -m benchmarks.bench_yahoo_parse [--repeat 50] [--page PATH]
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import timeit
+
+from isthisstockgood.Active.YahooFinance import YahooFinanceAnalysis
+
+_FIXTURE = os.path.join(
+  os.path.dirname(__file__), '..', 'testdata', 'dummy_yahoo_finance_analysis.html')
+
+
+def _read_page(path):
+  # The fixture is not valid UTF-8, so decode it the way `requests` would.
+  with open(path, encoding='latin-1') as f:
+    return f.read()
+
+
+def _parse(content, streaming):
+  analysis = YahooFinanceAnalysis('DUMMY')
+  analysis.parse_analyst_five_year_growth_rate(content, streaming=streaming)
+  return analysis.five_year_growth_rate
+
+
+def _peak_rss_kib():
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Linux reports kibibytes, macOS reports bytes.
+  return peak / 1024 if sys.platform == 'darwin' else peak
+
+
+def _measure_peak_memory(path, streaming, results):
+  content = _read_page(path)
+  before = _peak_rss_kib()
+  _parse(content, streaming)
+  results.put(_peak_rss_kib() - before)
+
+
+def peak_memory_kib(path, streaming):
+  context = multiprocessing.get_context('spawn')
+  results = context.Queue()
+  process = context.Process(target=_measure_peak_memory, args=(path, streaming, results))
+  process.start()
+  growth = results.get()
+  process.join()
+  return growth
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--repeat', type=int, default=50)
+  parser.add_argument('--page', default=_FIXTURE)
+  args = parser.parse_args()
+
+  content = _read_page(args.page)
+  print(f'{len(content) / 1024:.0f} KiB page, growth rate '
+        f'{_parse(content, True)!r} (streaming) vs {_parse(content, False)!r} (DOM)')
+  print(f'{"mode":>10} {"ms/page":>10} {"peak RSS growth KiB":>20}')
+  for name, streaming in (('dom', False), ('streaming', True)):
+    seconds = min(timeit.repeat(lambda: _parse(content, streaming), number=1, repeat=args.repeat))
+    print(f'{name:>10} {seconds * 1000:>10.2f} {peak_memory_kib(args.page, streaming):>20.0f}')
+
+
+if __name__ == '__main__':
+  main()
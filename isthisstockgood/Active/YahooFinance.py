@@ -2,10 +2,15 @@ from enum import Enum
 import json
 import logging
 import re
-from lxml import html
+from lxml import etree, html
 
 class YahooFinanceAnalysis:
   URL_TEMPLATE = 'https://finance.yahoo.com/quote/{}/analysis?p={}'
+  # The attributes populated by the parser, used to cache parsed results.
+  FIELDS = ('five_year_growth_rate',)
+  FIVE_YEAR_GROWTH_RATE_LABEL = 'Next 5 Years (per annum)'
+  # How many characters of the page the streaming parser is fed at a time.
+  STREAMING_CHUNK_SIZE = 16 * 1024
 
   @classmethod
   def _construct_url(cls, ticker_symbol):
@@ -33,12 +38,100 @@ class YahooFinanceAnalysis:
     self.url = YahooFinanceAnalysis._construct_url(self.ticker_symbol)
     self.five_year_growth_rate = None
 
-  def parse_analyst_five_year_growth_rate(self, content):
+  def parse_analyst_five_year_growth_rate(self, content, streaming=True):
+    """Extracts the analysts' "Next 5 Years (per annum)" growth estimate.
+
+    By default the page is pre-scanned for the label and then fed to a
+    streaming parser that never builds a tree and stops as soon as the
+    estimate is found. Pass `streaming=False` to build the full DOM instead.
+    """
+    if streaming:
+      percentage = YahooFinanceAnalysis._streamNextFiveYearsPercentage(content)
+    else:
+      percentage = YahooFinanceAnalysis._findNextFiveYearsPercentage(content)
+    self.five_year_growth_rate = percentage.rstrip("%") if percentage else None
+    return True if self.five_year_growth_rate else False
+
+  @classmethod
+  def _findNextFiveYearsPercentage(cls, content):
     tree = html.fromstring(bytes(content, encoding='utf8'))
     tree_iterator = tree.iter()
     for element in tree_iterator:
       text = element.text
-      if text == 'Next 5 Years (per annum)':
-        percentage = YahooFinanceAnalysis._parseNextPercentage(tree_iterator)
-        self.five_year_growth_rate = percentage.rstrip("%") if percentage else None
-    return True if self.five_year_growth_rate else False
+      if text == cls.FIVE_YEAR_GROWTH_RATE_LABEL:
+        return cls._parseNextPercentage(tree_iterator)
+    return None
+
+  @classmethod
+  def _streamNextFiveYearsPercentage(cls, content):
+    # Pre-scan for the label and start parsing at the tag just before it, so
+    # the (large) part of the page in front of the table is skipped entirely.
+    # Parse the whole page if that finds nothing, e.g. when the first
+    # occurrence was inside a script or the label is written with entities.
+    label_index = content.find(cls.FIVE_YEAR_GROWTH_RATE_LABEL)
+    offset = content.rfind('<', 0, label_index) if label_index > 0 else -1
+    if offset > 0:
+      percentage = cls._streamNextPercentage(content, offset)
+      if percentage is not None:
+        return percentage
+    return cls._streamNextPercentage(content, 0)
+
+  @classmethod
+  def _streamNextPercentage(cls, content, offset):
+    target = _NextPercentageTarget(cls.FIVE_YEAR_GROWTH_RATE_LABEL)
+    parser = etree.HTMLParser(target=target)
+    for start in range(offset, len(content), cls.STREAMING_CHUNK_SIZE):
+      parser.feed(content[start:start + cls.STREAMING_CHUNK_SIZE])
+      if target.percentage is not None:
+        break
+    parser.close()
+    return target.percentage
+
+
+class _NextPercentageTarget:
+  """An lxml parser target that finds the first percentage following a label.
+
+  Texts are checked in the same document order, and with the same `.text`
+  semantics (the text before an element's first child), as walking the DOM
+  with `tree.iter()`.
+  """
+
+  def __init__(self, label):
+    self.label = label
+    self.percentage = None
+    self._found_label = False
+    self._text = None  # Text chunks of the element that was started last.
+
+  def start(self, tag, attrib):
+    self._flush()
+    self._text = []
+
+  def end(self, tag):
+    self._flush()
+
+  def data(self, data):
+    if self._text is not None:
+      self._text.append(data)
+
+  def comment(self, text):
+    self._flush()
+    self._check(text)
+
+  def close(self):
+    self._flush()
+    return self.percentage
+
+  def _flush(self):
+    if self._text is None:
+      return
+    text = ''.join(self._text) or None
+    self._text = None
+    self._check(text)
+
+  def _check(self, text):
+    if self.percentage is not None:
+      return
+    if not self._found_label:
+      self._found_label = text == self.label
+    elif YahooFinanceAnalysis._isPercentage(text):
+      self.percentage = text
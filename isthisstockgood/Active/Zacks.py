@@ -1,6 +1,14 @@
 import re
 
+from requests.exceptions import RequestException
+
 class Zacks:
+    # The attributes populated by the parser, used to cache parsed results.
+    FIELDS = ('five_year_growth_rate',)
+    GROWTH_RATE_LABEL = "Next 5 Years"
+    # How much of the response body is read at a time while scanning.
+    STREAMING_CHUNK_SIZE = 16 * 1024
+
     def __init__(self, ticker_symbol):
         base_url = "https://www.zacks.com/stock/quote"
 
@@ -10,23 +18,101 @@ class Zacks:
         self.maintenance_capital_expenditures = None
 
     def parse(self, response, **kwargs):
-        if response.status_code != 200:
-          return
+        """Scans a (possibly streamed) `requests` response for the growth rate.
 
-        if not response.text:
-          return
+        The body is read in chunks and the connection is released as soon as
+        the value is found, so the rest of the page is never downloaded.
 
+        Returns:
+          Whether the page was read, even if it has no growth rate.
+        """
         try:
-          self.five_year_growth_rate = self.get_growth_rate(response.text)
-        except:
+          # A failed response is closed as well, releasing its connection.
+          if response.status_code != 200:
+            return False
+          if response.encoding is None:
+            response.encoding = 'utf-8'
+          self.five_year_growth_rate = self.scan_growth_rate(
+            response.iter_content(chunk_size=self.STREAMING_CHUNK_SIZE, decode_unicode=True))
+          return True
+        except RequestException:
           self.five_year_growth_rate = None
+          return False
+        finally:
+          response.close()
 
     def get_growth_rate(self, text):
-      lines = text.split("\n")
+      return self.scan_growth_rate((text,))
+
+    @classmethod
+    def scan_growth_rate(cls, chunks):
+      """Returns the estimate on the line after the first "Next 5 Years" label.
+
+      Args:
+        chunks: An iterable of text chunks, e.g. a streamed response body.
+
+      Returns:
+        The growth rate as a float, or None if the label or a numeric value
+        on the following line is not found.
+      """
+      scanner = GrowthRateScanner(cls.GROWTH_RATE_LABEL)
+      for chunk in chunks:
+        if scanner.feed(chunk):
+          break
+      return scanner.close()
+
+
+class GrowthRateScanner:
+    """Incrementally finds the value on the line following a label.
+
+    Only the unscanned tail of the text is kept between chunks, so neither
+    the whole body nor a list of its lines is ever held in memory.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.done = False
+        self.growth_rate = None
+        self._pending = ''
+        self._after_label = False  # Whether `_pending` starts after the label's line.
+
+    def feed(self, chunk):
+      """Scans the next chunk of text. Returns True once the scan is complete."""
+      if self.done:
+        return True
+      self._pending += chunk
+      if not self._after_label:
+        index = self._pending.find(self.label)
+        if index < 0:
+          # Keep just enough to match a label split across two chunks.
+          self._pending = self._pending[-(len(self.label) - 1):] if len(self.label) > 1 else ''
+          return False
+        end_of_line = self._pending.find('\n', index + len(self.label))
+        if end_of_line < 0:
+          self._pending = self._pending[index:]
+          return False
+        self._pending = self._pending[end_of_line + 1:]
+        self._after_label = True
+
+      end_of_line = self._pending.find('\n')
+      if end_of_line < 0:
+        return False
+      self._finish(self._pending[:end_of_line])
+      return True
 
-      for i, line in enumerate(lines):
-          if "Next 5 Years" in line:
-              result = lines[i+1]
+    def close(self):
+      """Ends the scan, treating any unterminated line as the last one."""
+      if not self.done:
+        self._finish(self._pending if self._after_label else None)
+      return self.growth_rate
 
-      estimate = re.sub(r"[^\d\.]", "", result)
-      return float(estimate)
+    def _finish(self, line):
+      self.done = True
+      self._pending = ''
+      if line is None:
+        return
+      estimate = re.sub(r"[^\d\.]", "", line)
+      try:
+        self.growth_rate = float(estimate)
+      except ValueError:
+        self.growth_rate = None
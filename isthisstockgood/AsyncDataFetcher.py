@@ -0,0 +1,319 @@
+"""An asyncio-native alternative to the callback based `DataFetcher` pipeline.
+
+Every network request is a coroutine on a single event loop, so thousands of
+ticker lookups can be in flight without tying up a thread per request. This
+requires the optional `aiohttp` dependency (`pip install .[async]`).
+
+Unlike `DataFetcher`, every lookup goes to the upstream sources: the async
+pipeline does not read or fill the `SourceCache`, bypasses the per-host
+`HostGuard` limits of the `SessionPool`, waits for every request rather than a
+deadline (the session's timeout bounds them), and does not collapse concurrent
+lookups of the same ticker. Use `iterDataForTickerSymbols` with a modest
+`concurrency` to stay polite to the upstream hosts.
+"""
+
+import asyncio
+import codecs
+import logging
+import random
+
+from isthisstockgood.Active.MSNMoney import MSNMoney
+from isthisstockgood.Active.YahooFinance import YahooFinanceAnalysis
+from isthisstockgood.Active.Zacks import GrowthRateScanner, Zacks
+from isthisstockgood.DataFetcher import (
+  MSN_SOURCE_KINDS, SOURCE_KINDS, DataFetcher, SourcesUnavailable, computeTemplateValues,
+  isUpstreamFailure, recordFundamentals
+)
+from isthisstockgood.SymbolIndex import get_symbol_index
+
+try:
+  import aiohttp
+except ImportError:  # pragma: no cover - depends on the optional extra.
+  aiohttp = None
+
+logger = logging.getLogger("IsThisStockGood")
+
+# Default number of tickers evaluated concurrently by `fetchDataForTickerSymbols`.
+DEFAULT_CONCURRENCY = 100
+
+
+def _create_client_session(**kwargs):
+  if aiohttp is None:
+    raise RuntimeError('AsyncDataFetcher requires the optional `aiohttp` dependency.')
+  return aiohttp.ClientSession(**kwargs)
+
+
+async def fetchDataForTickerSymbolAsync(ticker, session=None):
+  """Coroutine version of `DataFetcher.fetchDataForTickerSymbol`.
+
+    Args:
+      ticker: The ticker symbol string.
+      session: An optional `aiohttp.ClientSession` to share connections
+          across many lookups. A temporary session is used if omitted.
+
+    Raises:
+      SourcesUnavailable: If MSN Money could not be reached, as in the
+          synchronous pipeline.
+
+    Returns:
+      The same dictionary of processed financial data as the synchronous
+      pipeline, or None if the ticker is unknown.
+  """
+  if not ticker:
+    return None
+
+  if session is None:
+    async with _create_client_session() as session:
+      return await fetchDataForTickerSymbolAsync(ticker, session=session)
+
+  data_fetcher = AsyncDataFetcher(ticker, session)
+  await data_fetcher.fetch_all()
+  missing_sources = data_fetcher.missing_sources()
+  # Without any MSN Money data there is nothing to compute.
+  if all(kind in missing_sources for kind in MSN_SOURCE_KINDS):
+    failed_sources = [source for source in data_fetcher.failed_sources() if source.startswith('msn_')]
+    if failed_sources:
+      raise SourcesUnavailable(ticker, failed_sources)
+    return None
+  sources = (
+      data_fetcher.msn_money,
+      data_fetcher.yahoo_finance_analysis,
+      data_fetcher.zacks_analysis
+  )
+  template_values = computeTemplateValues(ticker, *sources)
+  template_values['missing_sources'] = missing_sources
+  # Partial MSN Money data would overwrite complete stored fundamentals.
+  if not any(kind in missing_sources for kind in MSN_SOURCE_KINDS):
+    recordFundamentals(ticker, *sources)
+  return template_values
+
+
+async def iterDataForTickerSymbols(tickers, concurrency=DEFAULT_CONCURRENCY, session=None):
+  """Yields `(ticker, template_values, error)` tuples as each lookup finishes.
+
+    At most `concurrency` tickers are fetched at the same time, all sharing one
+    client session and event loop.
+  """
+  if session is None:
+    async with _create_client_session() as session:
+      async for result in iterDataForTickerSymbols(tickers, concurrency, session):
+        yield result
+    return
+
+  semaphore = asyncio.Semaphore(concurrency)
+
+  async def fetch(ticker):
+    async with semaphore:
+      try:
+        return ticker, await fetchDataForTickerSymbolAsync(ticker, session=session), None
+      except Exception as e:
+        logger.warning(f'Async fetch failed for {ticker}: {e}')
+        return ticker, None, e
+
+  tasks = [asyncio.ensure_future(fetch(ticker)) for ticker in tickers]
+  try:
+    for task in asyncio.as_completed(tasks):
+      yield await task
+  finally:
+    for task in tasks:
+      task.cancel()
+
+
+def fetchDataForTickerSymbol(ticker):
+  """Synchronous wrapper with the same signature as the `DataFetcher` version.
+
+    This can be handed to `create_app` in place of the threaded pipeline. It
+    must not be called from a thread that is already running an event loop.
+  """
+  return asyncio.run(fetchDataForTickerSymbolAsync(ticker))
+
+
+def fetchDataForTickerSymbols(tickers, concurrency=DEFAULT_CONCURRENCY):
+  """Synchronously evaluates many tickers on one event loop.
+
+    Returns:
+      A dictionary mapping each ticker to its template values (None on error).
+  """
+  async def collect():
+    results = {}
+    async for ticker, template_values, _ in iterDataForTickerSymbols(tickers, concurrency):
+      results[ticker] = template_values
+    return results
+
+  return asyncio.run(collect())
+
+
+class AsyncDataFetcher():
+  """Coroutine counterpart of `DataFetcher`, with one `fetch_*`/`parse_*` pair per source."""
+
+  def __init__(self, ticker, session, symbol_index=None):
+    self.session = session
+    self.symbol_index = symbol_index if symbol_index is not None else get_symbol_index()
+    self.ticker_symbol = ticker
+    self.user_agent = random.choice(DataFetcher.USER_AGENT_LIST)
+    self.msn_money = None
+    self.yahoo_finance_analysis = None
+    self.zacks_analysis = None
+    # The `SOURCE_KINDS` that were fetched and parsed successfully.
+    self.fetched_kinds = set()
+    # The sources whose request failed, see `failed_sources`.
+    self.failures = []
+
+  def missing_sources(self):
+    """Returns the `SOURCE_KINDS` whose request failed, like `DataFetcher.missing_sources`."""
+    return [kind for kind in SOURCE_KINDS if kind not in self.fetched_kinds]
+
+  def failed_sources(self):
+    """Returns the sources whose request failed, like `DataFetcher.failed_sources`."""
+    return list(dict.fromkeys(self.failures))
+
+  def _request(self, url, source):
+    """Returns the response context manager of a GET, recording its failures."""
+    headers = {'User-Agent' : self.user_agent}
+    return _RecordedRequest(self, source, self.session.get(url, headers=headers, allow_redirects=True))
+
+  async def _get_text(self, url, source):
+    """Returns the body of `url`, or None for a non-200 response."""
+    async with self._request(url, source) as response:
+      if response.status != 200:
+        return None
+      return await response.text()
+
+  async def fetch_all(self):
+    """Runs every source concurrently; a failing source is left unset."""
+    results = await asyncio.gather(
+      self.fetch_msn_money_data(),
+      self.fetch_yahoo_finance_analysis(),
+      self.fetch_zacks_analysis(),
+      return_exceptions=True
+    )
+    for result in results:
+      if isinstance(result, Exception):
+        logger.warning(f'Async fetch failed for {self.ticker_symbol}: {result}')
+
+  async def fetch_msn_money_data(self):
+    """
+    Resolves the internal MSN stock id for the ticker and then fetches the
+    ratios, quotes and annual statements concurrently. The autosuggest round
+    trip is skipped when the symbol index already knows the stock id.
+    """
+    self.msn_money = MSNMoney(self.ticker_symbol)
+    entry = self.symbol_index.lookup(self.msn_money.ticker_symbol)
+    if entry:
+      msn_stock_id, self.msn_money.description = entry
+      await self.fetch_msn_money_financials(msn_stock_id)
+      return
+    content = await self._get_text(self.msn_money.get_ticker_autocomplete_url(), 'msn_autosuggest')
+    if content is None:
+      return
+    await self.continue_fetching_msn_money_data(content)
+
+  async def continue_fetching_msn_money_data(self, content):
+    msn_stock_id = self.msn_money.extract_stock_id(content)
+    if not msn_stock_id:
+      return
+    self.symbol_index.add(self.msn_money.ticker_symbol, msn_stock_id, self.msn_money.description)
+    await self.fetch_msn_money_financials(msn_stock_id)
+
+  async def fetch_msn_money_financials(self, msn_stock_id):
+    # Waits for every request, so that none of them outlives the lookup.
+    results = await asyncio.gather(
+      self.fetch_msn_money_ratios_data(msn_stock_id),
+      self.fetch_msn_money_quotes_data(msn_stock_id),
+      self.fetch_msn_money_annual_statement_data(msn_stock_id),
+      return_exceptions=True
+    )
+    for result in results:
+      if isinstance(result, Exception):
+        logger.warning(f'Async fetch failed for {self.ticker_symbol}: {result}')
+
+  async def fetch_msn_money_ratios_data(self, msn_stock_id):
+    content = await self._get_text(self.msn_money.get_key_ratios_url(msn_stock_id), 'msn_ratios')
+    self.parse_msn_money_ratios_data(content)
+
+  def parse_msn_money_ratios_data(self, content):
+    if content is None or not self.msn_money:
+      return
+    if self.msn_money.parse_ratios_data(content):
+      self.fetched_kinds.add('msn_ratios')
+
+  async def fetch_msn_money_quotes_data(self, msn_stock_id):
+    content = await self._get_text(self.msn_money.get_quotes_url(msn_stock_id), 'msn_quotes')
+    self.parse_msn_money_quotes_data(content)
+
+  def parse_msn_money_quotes_data(self, content):
+    if content is None or not self.msn_money:
+      return
+    self.msn_money.parse_quotes_data(content)
+    if self.msn_money.current_price:
+      self.fetched_kinds.add('msn_quotes')
+
+  async def fetch_msn_money_annual_statement_data(self, msn_stock_id):
+    content = await self._get_text(self.msn_money.get_annual_statements_url(msn_stock_id), 'msn_annual_report')
+    self.parse_msn_money_annual_statement_data(content)
+
+  def parse_msn_money_annual_statement_data(self, content):
+    if content is None or not self.msn_money:
+      return
+    self.msn_money.parse_annual_report_data(content)
+    if self.msn_money.shares_outstanding:
+      self.fetched_kinds.add('msn_annual_report')
+
+  async def fetch_yahoo_finance_analysis(self):
+    self.yahoo_finance_analysis = YahooFinanceAnalysis(self.ticker_symbol)
+    content = await self._get_text(self.yahoo_finance_analysis.url, 'yahoo_analysis')
+    # The analysis page is large, so parse it off the event loop.
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, self.parse_yahoo_finance_analysis, content)
+
+  def parse_yahoo_finance_analysis(self, content):
+    if content is None or not self.yahoo_finance_analysis:
+      return
+    # A page without an estimate was still fetched, and Zacks may have one.
+    self.fetched_kinds.add('yahoo_analysis')
+    success = self.yahoo_finance_analysis.parse_analyst_five_year_growth_rate(content)
+    if not success:
+      self.yahoo_finance_analysis = None
+
+  async def fetch_zacks_analysis(self):
+    """Streams the Zacks page, only reading it up to the growth rate."""
+    self.zacks_analysis = Zacks(self.ticker_symbol)
+    async with self._request(self.zacks_analysis.url, 'zacks_analysis') as response:
+      if response.status != 200:
+        return
+      try:
+        decoder = codecs.getincrementaldecoder(response.charset or 'utf-8')(errors='replace')
+      except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+      scanner = GrowthRateScanner(Zacks.GROWTH_RATE_LABEL)
+      async for chunk in response.content.iter_chunked(Zacks.STREAMING_CHUNK_SIZE):
+        if scanner.feed(decoder.decode(chunk)):
+          break
+      else:
+        scanner.feed(decoder.decode(b'', final=True))
+    self.zacks_analysis.five_year_growth_rate = scanner.close()
+    self.fetched_kinds.add('zacks_analysis')
+
+
+class _RecordedRequest:
+  """Wraps an `aiohttp` request context to record a failed request with its fetcher."""
+
+  def __init__(self, fetcher, source, request):
+    self.fetcher = fetcher
+    self.source = source
+    self.request = request
+
+  async def __aenter__(self):
+    try:
+      response = await self.request.__aenter__()
+    except Exception:
+      self.fetcher.failures.append(self.source)
+      raise
+    if isUpstreamFailure(response.status):
+      self.fetcher.failures.append(self.source)
+    return response
+
+  async def __aexit__(self, *args):
+    if args[0] is not None and issubclass(args[0], Exception):
+      self.fetcher.failures.append(self.source)
+    return await self.request.__aexit__(*args)
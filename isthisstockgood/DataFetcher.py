@@ -1,24 +1,70 @@
 import random
 import logging
+import time
 import isthisstockgood.RuleOneInvestingCalculations as RuleOne
-from requests_futures.sessions import FuturesSession
 from isthisstockgood.Active.MSNMoney import MSNMoney
 from isthisstockgood.Active.YahooFinance import YahooFinanceAnalysis
 from isthisstockgood.Active.Zacks import Zacks
+from isthisstockgood.CompanyInfo import CompanyFundamentals, select_five_year_growth_rate
+from isthisstockgood.FundamentalsStore import get_fundamentals_store
+from isthisstockgood.Hedging import get_hedger
+from isthisstockgood.Metrics import get_metrics
+from isthisstockgood.SessionPool import get_session_pool
+from isthisstockgood.SingleFlight import SingleFlight
+from isthisstockgood.SourceCache import get_source_cache
+from isthisstockgood.SymbolIndex import get_symbol_index
+from concurrent.futures import wait
 from threading import Lock
+from types import SimpleNamespace
 
 logger = logging.getLogger("IsThisStockGood")
 
+# The `SourceCache` kinds a lookup reads, and the ones MSN Money provides.
+MSN_SOURCE_KINDS = ('msn_ratios', 'msn_quotes', 'msn_annual_report')
+SOURCE_KINDS = MSN_SOURCE_KINDS + ('yahoo_analysis', 'zacks_analysis')
 
-def fetchDataForTickerSymbol(ticker):
+# Seconds a lookup waits for its sources. Sources that are late by then are
+# reported in 'missing_sources', and the rest of the result is still computed.
+DEFAULT_DEADLINE = 5.0
+
+# Seconds the valuation inputs in the `FundamentalsStore` are used for before
+# they are fetched again, as quotes move the market cap.
+DEFAULT_FUNDAMENTALS_MAX_AGE = 5 * 60
+
+# Collapses concurrent lookups of the same ticker into one pipeline run. Use
+# `ticker_single_flight.get_stats()` to see how many requests were collapsed.
+ticker_single_flight = SingleFlight()
+
+
+class SourcesUnavailable(Exception):
+  """Raised when a lookup has no MSN Money data because its requests failed.
+
+  Unlike an unknown ticker, whose lookup returns None, the same lookup may
+  succeed once the upstream sources recover.
+  """
+
+  def __init__(self, ticker, sources):
+    super().__init__(f'Sources unavailable for {ticker}: {", ".join(sources)}')
+    self.ticker = ticker
+    self.sources = sources
+
+
+def fetchDataForTickerSymbol(ticker, deadline=DEFAULT_DEADLINE):
   """Fetches and parses all of the financial data for the `ticker`.
 
     Args:
       ticker: The ticker symbol string.
+      deadline: Seconds to wait for the sources, or None to wait for every
+          request to finish or time out.
+
+    Raises:
+      SourcesUnavailable: If MSN Money could not be reached.
 
     Returns:
       Returns a dictionary of all the processed financial data. If
-      there's an error, return None.
+      the ticker is unknown, return None. Values that could not be computed
+      because a source failed or missed the deadline are 'null', and the
+      'missing_sources' key lists those sources (see `SOURCE_KINDS`).
 
       Keys include:
         'roic',
@@ -33,11 +79,84 @@ def fetchDataForTickerSymbol(ticker):
         'margin_of_safety_price',
         'current_price'
         'ten_cap_price'
+        'missing_sources'
+  """
+  if not ticker:
+    return None
+
+  # Concurrent callers for the same symbol share one in-flight pipeline.
+  template_values = ticker_single_flight.do(
+      ticker.strip().upper(), _fetchDataForTickerSymbol, ticker, deadline)
+  if not template_values:
+    return template_values
+  # Each caller gets its own copy, echoing the ticker exactly as requested.
+  template_values = dict(template_values)
+  template_values['ticker'] = ticker
+  return template_values
+
+
+def fetchFundamentalsForTickerSymbol(ticker, deadline=DEFAULT_DEADLINE,
+                                     max_age=DEFAULT_FUNDAMENTALS_MAX_AGE, **kwargs):
+  """Returns the raw inputs of the Rule #1 valuations for the `ticker`.
+
+    They are read from the `FundamentalsStore`, if one is configured and it
+    has the ticker from within the last `max_age` seconds. Otherwise they are
+    fetched, with sources served from the `SourceCache` when possible, and
+    recorded into the store.
+
+    Returns:
+      A dictionary with 'ticker', 'ttm_eps', 'pe_low', 'pe_high',
+      'market_cap', 'net_income', 'equity_growth_rate' (percent),
+      'analyst_growth_rate' (percent) and 'estimated_growth_rate' (the
+      conservative decimal rate used by the valuations), or None if the
+      ticker could not be fetched.
   """
   if not ticker:
     return None
 
-  data_fetcher = DataFetcher(ticker)
+  store = get_fundamentals_store()
+  stored = store.get(ticker) if store is not None else None
+  if stored is not None and store.clock() - stored['updated_at'] < max_age:
+    return _valuationInputs(ticker, SimpleNamespace(**stored), stored['five_year_growth_rate'])
+
+  data_fetcher = _runDataFetcher(ticker, deadline=deadline, **kwargs)
+  msn_money = data_fetcher.msn_money
+  if not msn_money:
+    return None
+  if not any(kind in data_fetcher.missing_sources() for kind in MSN_SOURCE_KINDS):
+    recordFundamentals(
+        ticker,
+        msn_money,
+        data_fetcher.yahoo_finance_analysis,
+        data_fetcher.zacks_analysis
+    )
+  return _valuationInputs(ticker, msn_money, select_five_year_growth_rate(
+      data_fetcher.yahoo_finance_analysis, data_fetcher.zacks_analysis))
+
+
+def _valuationInputs(ticker, msn_money, analyst_growth_rate):
+  """Returns the `fetchFundamentalsForTickerSymbol` dictionary, or None."""
+  if not msn_money.equity_growth_rates:
+    return None
+  equity_growth_rate = msn_money.equity_growth_rates[-1]
+  estimated_growth_rate = None
+  if equity_growth_rate and analyst_growth_rate:
+    estimated_growth_rate = _calculate_growth_rate_decimal(analyst_growth_rate, equity_growth_rate)
+  return {
+    'ticker' : ticker,
+    'ttm_eps' : _ttm_eps(msn_money),
+    'pe_low' : msn_money.pe_low,
+    'pe_high' : msn_money.pe_high,
+    'market_cap' : msn_money.market_cap or None,
+    'net_income' : msn_money.last_year_net_income,
+    'equity_growth_rate' : equity_growth_rate,
+    'analyst_growth_rate' : float(analyst_growth_rate) if analyst_growth_rate else None,
+    'estimated_growth_rate' : estimated_growth_rate,
+  }
+
+
+def _runDataFetcher(ticker, deadline=None, **kwargs):
+  data_fetcher = DataFetcher(ticker, **kwargs)
 
   # Make all network request asynchronously to build their portion of
   # the json results.
@@ -45,53 +164,130 @@ def fetchDataForTickerSymbol(ticker):
   data_fetcher.fetch_yahoo_finance_analysis()
   data_fetcher.fetch_zacks_analysis()
 
-
-  # Wait for each RPC result before proceeding.
+  # Requests time out, and ones to an unavailable host fail right away, but
+  # the deadline bounds the wait for the slowest source as well.
+  if not data_fetcher.wait(deadline):
+    logger.warning(f'Deadline of {deadline}s passed for {ticker}')
+  data_fetcher.close()
   for rpc in data_fetcher.rpcs:
-    rpc.result()
+    if rpc.done() and rpc.exception() is not None:
+      logger.warning(f'Fetch failed for {ticker}: {rpc.exception()}')
+
+  data_fetcher.restore_stale_sources()
+  if data_fetcher.trace is not None:
+    data_fetcher.trace.finish()
+  return data_fetcher
+
+
+def _fetchDataForTickerSymbol(ticker, deadline=DEFAULT_DEADLINE, **kwargs):
+  data_fetcher = _runDataFetcher(ticker, deadline=deadline, **kwargs)
+  missing_sources = data_fetcher.missing_sources()
+  # Without any MSN Money data there is nothing to compute.
+  if all(kind in missing_sources for kind in MSN_SOURCE_KINDS):
+    failed_sources = [source for source in data_fetcher.failed_sources() if source.startswith('msn_')]
+    if failed_sources:
+      raise SourcesUnavailable(ticker, failed_sources)
+    return None
+  template_values = computeTemplateValues(
+      ticker,
+      data_fetcher.msn_money,
+      data_fetcher.yahoo_finance_analysis,
+      data_fetcher.zacks_analysis
+  )
+  template_values['missing_sources'] = missing_sources
+  # Partial MSN Money data would overwrite complete stored fundamentals.
+  if not any(kind in missing_sources for kind in MSN_SOURCE_KINDS):
+    recordFundamentals(
+        ticker,
+        data_fetcher.msn_money,
+        data_fetcher.yahoo_finance_analysis,
+        data_fetcher.zacks_analysis
+    )
+  return template_values
 
-  msn_money = data_fetcher.msn_money
-  yahoo_finance_analysis = data_fetcher.yahoo_finance_analysis
-  zacks_analysis = data_fetcher.zacks_analysis
-  # NOTE: Some stocks won't have analyst growth rates, such as newly listed stocks or some foreign stocks.
-  five_year_growth_rate = \
-      yahoo_finance_analysis.five_year_growth_rate if yahoo_finance_analysis \
-      else zacks_analysis.five_year_growth_rate if zacks_analysis \
-      else 0
+
+def recordFundamentals(ticker, msn_money, yahoo_finance_analysis, zacks_analysis):
+  """Upserts the parsed sources into the `FundamentalsStore`, if one is configured."""
+  store = get_fundamentals_store()
+  if store is None:
+    return
+  store.upsert(CompanyFundamentals.from_msn_money(
+      msn_money, yahoo_finance_analysis, zacks_analysis, ticker=ticker))
+
+
+def computeTemplateValues(ticker, msn_money, yahoo_finance_analysis, zacks_analysis):
+  """Computes the Rule #1 template values from already parsed data sources.
+
+    This is shared by the synchronous `DataFetcher` pipeline and the asyncio
+    pipeline in `AsyncDataFetcher`. Values whose inputs are missing, e.g.
+    because a source failed, are 'null' and the others are still computed.
+  """
+  five_year_growth_rate = select_five_year_growth_rate(yahoo_finance_analysis, zacks_analysis)
+  # Each attribute is read once, since `CompanyFundamentals` builds its series on access.
+  equity_growth_rates = msn_money.equity_growth_rates
+  free_cash_flow = msn_money.free_cash_flow
+  one_year_equity_growth_rate = equity_growth_rates[-1] if equity_growth_rates else None
   margin_of_safety_price, sticker_price = _calculateMarginOfSafetyPrice(
-          msn_money.equity_growth_rates[-1],
+          one_year_equity_growth_rate,
           msn_money.pe_low,
           msn_money.pe_high,
-          sum(msn_money.quarterly_eps[-4:]),
+          _ttm_eps(msn_money),
           five_year_growth_rate
       )
-  payback_time = _calculatePaybackTime(msn_money.equity_growth_rates[-1], msn_money.last_year_net_income, msn_money.market_cap, five_year_growth_rate)
-  free_cash_flow_per_share = float(msn_money.free_cash_flow[-1])
-  computed_free_cash_flow = round(free_cash_flow_per_share * msn_money.shares_outstanding)
-  ten_cap_price = 10 * free_cash_flow_per_share
+  payback_time = _calculatePaybackTime(one_year_equity_growth_rate, msn_money.last_year_net_income, msn_money.market_cap, five_year_growth_rate)
+  ten_cap_price = computed_free_cash_flow = debt_payoff_time = None
+  total_debt = msn_money.total_debt
+  if free_cash_flow:
+    free_cash_flow_per_share = float(free_cash_flow[-1])
+    ten_cap_price = round(RuleOne.calculate_ten_cap_price(free_cash_flow_per_share), 2)
+    shares_outstanding = msn_money.shares_outstanding
+    if shares_outstanding:
+      computed_free_cash_flow = round(free_cash_flow_per_share * shares_outstanding)
+      if computed_free_cash_flow and total_debt is not None:
+        debt_payoff_time = round(float(total_debt) / computed_free_cash_flow)
+  debt_equity_ratio = msn_money.debt_equity_ratio
   template_values = {
     'ticker' : ticker,
-    'name' : msn_money.name if msn_money and msn_money.name else 'null',
-    'description': msn_money.description if msn_money and msn_money.description else 'null',
-    'roic': msn_money.roic_averages if msn_money and msn_money.roic_averages else [],
-    'eps': msn_money.eps_growth_rates if msn_money and msn_money.eps_growth_rates else [],
-    'sales': msn_money.revenue_growth_rates if msn_money and msn_money.revenue_growth_rates else [],
-    'equity': msn_money.equity_growth_rates if msn_money and msn_money.equity_growth_rates else [],
-    'cash': msn_money.free_cash_flow_growth_rates if msn_money and msn_money.free_cash_flow_growth_rates else [],
-    'total_debt' : msn_money.total_debt,
-    'free_cash_flow' : computed_free_cash_flow,
-    'ten_cap_price' : round(ten_cap_price, 2),
-    'debt_payoff_time' : round(float(msn_money.total_debt) / computed_free_cash_flow),
-    'debt_equity_ratio' : msn_money.debt_equity_ratio if msn_money and msn_money.debt_equity_ratio >= 0 else -1,
-    'margin_of_safety_price' : margin_of_safety_price if margin_of_safety_price else 'null',
-    'current_price' : msn_money.current_price if msn_money and msn_money.current_price else 'null',
-    'sticker_price' : sticker_price if sticker_price else 'null',
-    'payback_time' : payback_time if payback_time else 'null',
-    'average_volume' : msn_money.average_volume if msn_money and msn_money.average_volume else 'null'
+    'name' : msn_money.name or 'null',
+    'description': msn_money.description or 'null',
+    'roic': msn_money.roic_averages or [],
+    'eps': msn_money.eps_growth_rates or [],
+    'sales': msn_money.revenue_growth_rates or [],
+    'equity': equity_growth_rates or [],
+    'cash': msn_money.free_cash_flow_growth_rates or [],
+    'total_debt' : _null_if_none(total_debt),
+    'free_cash_flow' : _null_if_none(computed_free_cash_flow),
+    'ten_cap_price' : _null_if_none(ten_cap_price),
+    'debt_payoff_time' : _null_if_none(debt_payoff_time),
+    'debt_equity_ratio' : debt_equity_ratio if debt_equity_ratio is not None and debt_equity_ratio >= 0 else -1,
+    'margin_of_safety_price' : margin_of_safety_price or 'null',
+    'current_price' : msn_money.current_price or 'null',
+    'sticker_price' : sticker_price or 'null',
+    'payback_time' : payback_time or 'null',
+    'average_volume' : msn_money.average_volume or 'null'
   }
   return template_values
 
 
+def isUpstreamFailure(status_code):
+  """Whether a response status means the upstream failed, not the request."""
+  return status_code >= 500 or status_code == 429
+
+
+def _request_failed(rpc):
+  if not rpc.done() or rpc.cancelled() or rpc.exception() is not None:
+    return True
+  return isUpstreamFailure(getattr(rpc.result(), 'status_code', 200))
+
+
+def _null_if_none(value):
+  return 'null' if value is None else value
+
+
+def _ttm_eps(msn_money):
+  return sum(msn_money.quarterly_eps[-4:]) if msn_money.quarterly_eps else 0
+
+
 def _calculate_growth_rate_decimal(analyst_growth_rate, current_growth_rate):
   growth_rate = min(float(analyst_growth_rate), float(current_growth_rate))
   # Divide the growth rate by 100 to convert from percent to decimal.
@@ -128,55 +324,241 @@ class DataFetcher():
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.97 Safari/537.36',
   ]
 
-  def __init__(self, ticker):
+  # The requests that are hedged when slow (see `Hedger`). The autosuggest
+  # precedes every MSN Money request of tickers unknown to the `SymbolIndex`.
+  HEDGED_SOURCES = frozenset(('msn_autosuggest',) + SOURCE_KINDS)
+
+  def __init__(self, ticker, session_pool=None, cache=None, symbol_index=None, hedger=None):
     self.lock = Lock()
+    self.session_pool = session_pool or get_session_pool()
+    self.hedger = hedger if hedger is not None else get_hedger()
+    self.cache = cache or get_source_cache()
+    self.symbol_index = symbol_index if symbol_index is not None else get_symbol_index()
+    self.user_agent = random.choice(DataFetcher.USER_AGENT_LIST)
     self.rpcs = []
+    # The source of each RPC, see `failed_sources`.
+    self.rpc_sources = {}
     self.ticker_symbol = ticker
     self.msn_money = None
     self.yahoo_finance_analysis = None
     self.zacks_analysis = None
     self.yahoo_finance_chart = None
     self.error = False
+    self.msn_money_kinds_to_fetch = ()
+    # The `SourceCache` kinds that were fetched and parsed successfully, and
+    # the ones served from the cache instead.
+    self.fetched_kinds = set()
+    self.cached_kinds = set()
+    # Set by `close`, after which responses are no longer applied.
+    self.closed = False
+    # Held while a response is applied, so that `close` waits for it.
+    self.parse_lock = Lock()
+    # Timing spans of every request, or None if metrics are disabled.
+    self.trace = get_metrics().start_trace(ticker)
+
+  def _get(self, url, callback, source, **kwargs):
+    """Issues a GET on the shared session pool and tracks its RPC.
+
+    `source` names the request in the timing spans and metrics.
+    """
+    if not kwargs.get('stream'):
+      callback = self._unless_closed(callback)
+    if self.trace is not None:
+      requested_at = time.perf_counter()
+      callback = self._traced(source, callback, requested_at, kwargs.get('stream', False))
+    if source in DataFetcher.HEDGED_SOURCES:
+      rpc = self.hedger.get(self.session_pool, source, url, callback,
+                            user_agent=self.user_agent, allow_redirects=True, **kwargs)
+    else:
+      rpc = self.session_pool.get(url, user_agent=self.user_agent, allow_redirects=True, hooks={
+         'response': callback,
+      }, **kwargs)
+    if self.trace is not None:
+      rpc.add_done_callback(lambda rpc: self._record_request(source, requested_at, rpc))
+    with self.lock:
+      self.rpcs.append(rpc)
+      self.rpc_sources[rpc] = source
+    return rpc
+
+  def _unless_closed(self, callback):
+    """Wraps a response hook to apply its response only until `close`.
+
+    Streamed responses are read by their hook, which must check `closed`
+    itself, so that the lock is never held while downloading.
+    """
+    def hook(response, *args, **kwargs):
+      # Downloaded before taking the lock.
+      response.content
+      with self.parse_lock:
+        if self.closed:
+          return None
+        return callback(response, *args, **kwargs)
+
+    return hook
+
+  def wait(self, timeout=None):
+    """Waits for every RPC, including the ones issued by response hooks.
+
+    Returns:
+      Whether they all finished within `timeout` seconds.
+    """
+    deadline_at = None if timeout is None else time.monotonic() + timeout
+    while True:
+      with self.lock:
+        pending = [rpc for rpc in self.rpcs if not rpc.done()]
+      if not pending:
+        return True
+      remaining = None if deadline_at is None else deadline_at - time.monotonic()
+      if remaining is not None and remaining <= 0:
+        return False
+      # A hook issues its follow-up RPCs before its own RPC is done.
+      wait(pending, timeout=remaining)
+
+  def close(self):
+    """Stops applying responses, so that the parsed sources no longer change.
+
+    Late requests keep running until they time out, but their responses
+    are discarded.
+    """
+    with self.parse_lock:
+      with self.lock:
+        self.closed = True
+
+  def missing_sources(self):
+    """Returns the `SOURCE_KINDS` whose request failed or missed the deadline.
+
+    Sources served from the cache are not missing, and neither are pages
+    that were read but had no value, e.g. a Yahoo page without an estimate.
+    """
+    with self.lock:
+      available = self.fetched_kinds | self.cached_kinds
+    return [kind for kind in SOURCE_KINDS if kind not in available]
 
-  def _create_session(self):
-    session = FuturesSession()
-    session.headers.update({
-      'User-Agent' : random.choice(DataFetcher.USER_AGENT_LIST)
-    })
-    return session
+  def failed_sources(self):
+    """Returns the sources of the requests that failed or missed the deadline.
+
+    A request failed if it raised, e.g. when its host was unavailable, or if
+    it was answered with a server error or a 429. Sources are listed once,
+    in the order they were requested.
+    """
+    with self.lock:
+      rpc_sources = list(self.rpc_sources.items())
+    failed = []
+    for rpc, source in rpc_sources:
+      if source not in failed and _request_failed(rpc):
+        failed.append(source)
+    return failed
+
+  def _traced(self, source, callback, requested_at, stream):
+    """Wraps a response hook to add the stages of its request to the trace."""
+    trace = self.trace
+
+    def hook(response, *args, **kwargs):
+      timings = getattr(response, 'timings', None)
+      if timings is not None:
+        trace.stage(source, 'queue', requested_at, timings.sent_at)
+        connected_at = timings.sent_at + timings.connect
+        if timings.connect:
+          trace.stage(source, 'connect', timings.sent_at, connected_at)
+        trace.stage(source, 'ttfb', connected_at, timings.headers_at)
+      start = time.perf_counter()
+      if not stream:
+        response.content
+        end = time.perf_counter()
+        trace.stage(source, 'body', start, end)
+        start = end
+      try:
+        return callback(response, *args, **kwargs)
+      finally:
+        trace.stage(source, 'parse', start, time.perf_counter())
+
+    return hook
+
+  def _record_request(self, source, requested_at, rpc):
+    error = rpc.exception()
+    if error is None:
+      outcome = str(rpc.result().status_code)
+    else:
+      outcome = getattr(error, 'reason', None) or type(error).__name__
+    self.trace.add_span(source, requested_at, time.perf_counter(), outcome=outcome)
+    self.trace.metrics.requests.inc(source, outcome)
+
+  def _fetched(self, kind):
+    with self.lock:
+      self.fetched_kinds.add(kind)
+
+  def _cached(self, kinds):
+    with self.lock:
+      self.cached_kinds.update(kinds)
+
+  def restore_stale_sources(self):
+    """Falls back to expired cache entries for every source that could not be fetched.
+
+    Called once all RPCs are done, so that a timed out or rejected request
+    (see `HostGuard`) still yields the last known data when there is some.
+    """
+    if self.msn_money:
+      stale_kinds = [
+        kind for kind in self.msn_money_kinds_to_fetch
+        if kind not in self.fetched_kinds
+        and self.cache.get_fields(kind, self.ticker_symbol, self.msn_money, allow_stale=True)
+      ]
+      if stale_kinds:
+        self.msn_money.compute_last_year_net_income()
+        self._cached(stale_kinds)
+    for kind, analysis in (('yahoo_analysis', self.yahoo_finance_analysis),
+                           ('zacks_analysis', self.zacks_analysis)):
+      if analysis and analysis.five_year_growth_rate is None and kind not in self.fetched_kinds:
+        if self.cache.get_fields(kind, self.ticker_symbol, analysis, allow_stale=True):
+          self._cached((kind,))
 
   def fetch_msn_money_data(self):
     """
     Fetching PE Ratios to calculate Sticker Price and Safety Margin Price. As well as
     the "Big 5" growth rate numbers.
-    First we need to get an internal MSN stock id for a ticker and then fetch the data.
+    First we need to get an internal MSN stock id for a ticker and then fetch the data,
+    unless the id is already known to the symbol index.
     """
     self.msn_money = MSNMoney(self.ticker_symbol)
-    session = self._create_session()
-    rpc = session.get(self.msn_money.get_ticker_autocomplete_url(), allow_redirects=True, hooks={
-       'response': self.continue_fetching_msn_money_data,
-    })
-    self.rpcs.append(rpc)
+    self.msn_money_kinds_to_fetch = tuple(
+      kind for kind in ('msn_ratios', 'msn_quotes', 'msn_annual_report')
+      if not self.cache.get_fields(kind, self.ticker_symbol, self.msn_money)
+    )
+    self.msn_money.compute_last_year_net_income()
+    self._cached(kind for kind in MSN_SOURCE_KINDS if kind not in self.msn_money_kinds_to_fetch)
+    if not self.msn_money_kinds_to_fetch:
+      return
+    entry = self.symbol_index.lookup(self.msn_money.ticker_symbol)
+    if entry:
+      msn_stock_id, self.msn_money.description = entry
+      self.fetch_msn_money_financials(msn_stock_id)
+      return
+    self._get(self.msn_money.get_ticker_autocomplete_url(), self.continue_fetching_msn_money_data,
+              'msn_autosuggest')
 
   def continue_fetching_msn_money_data(self, response, *args, **kwargs):
     """
     After msn_stock_id was fetched in fetch_msn_money_data method
     we can now get the financials.
     """
-    msn_stock_id = self.msn_money.extract_stock_id(response.text)
-    session = self._create_session()
-    rpc = session.get(self.msn_money.get_key_ratios_url(msn_stock_id), allow_redirects=True, hooks={
-       'response': self.parse_msn_money_ratios_data,
-    })
-    self.rpcs.append(rpc)
-    rpc = session.get(self.msn_money.get_quotes_url(msn_stock_id), allow_redirects=True, hooks={
-       'response': self.parse_msn_money_quotes_data,
-    })
-    self.rpcs.append(rpc)
-    rpc = session.get(self.msn_money.get_annual_statements_url(msn_stock_id), allow_redirects=True, hooks={
-       'response': self.parse_msn_money_annual_statement_data,
-    })
-    self.rpcs.append(rpc)
+    if response.status_code != 200:
+      return
+    msn_stock_id = self.msn_money.extract_stock_id(response.content)
+    if msn_stock_id:
+      self.symbol_index.add(self.msn_money.ticker_symbol, msn_stock_id, self.msn_money.description)
+    self.fetch_msn_money_financials(msn_stock_id)
+
+  def fetch_msn_money_financials(self, msn_stock_id):
+    """Fetches every MSN data kind that was not served from the cache."""
+    if 'msn_ratios' in self.msn_money_kinds_to_fetch:
+      self._get(self.msn_money.get_key_ratios_url(msn_stock_id), self.parse_msn_money_ratios_data,
+                'msn_ratios')
+    if 'msn_quotes' in self.msn_money_kinds_to_fetch:
+      self._get(self.msn_money.get_quotes_url(msn_stock_id), self.parse_msn_money_quotes_data,
+                'msn_quotes')
+    if 'msn_annual_report' in self.msn_money_kinds_to_fetch:
+      self._get(self.msn_money.get_annual_statements_url(msn_stock_id), self.parse_msn_money_annual_statement_data,
+                'msn_annual_report')
 
   # Called asynchronously upon completion of the URL fetch from
   # `fetch_msn_money_data` and `continue_fetching_msn_money_data`.
@@ -185,8 +567,11 @@ class DataFetcher():
       return
     if not self.msn_money:
       return
-    result = response.text
-    self.msn_money.parse_ratios_data(result)
+    # The raw bytes are decoded directly by the JSON backend.
+    result = response.content
+    if self.msn_money.parse_ratios_data(result):
+      self.cache.put_fields('msn_ratios', self.ticker_symbol, self.msn_money, MSNMoney.RATIOS_FIELDS)
+      self._fetched('msn_ratios')
 
 
   # Called asynchronously upon completion of the URL fetch from
@@ -196,8 +581,11 @@ class DataFetcher():
       return
     if not self.msn_money:
       return
-    result = response.text
+    result = response.content
     self.msn_money.parse_quotes_data(result)
+    if self.msn_money.current_price:
+      self.cache.put_fields('msn_quotes', self.ticker_symbol, self.msn_money, MSNMoney.QUOTES_FIELDS)
+      self._fetched('msn_quotes')
 
   # Called asynchronously upon completion of the URL fetch from
   # `fetch_msn_money_data` and `continue_fetching_msn_money_data`.
@@ -206,16 +594,18 @@ class DataFetcher():
       return
     if not self.msn_money:
       return
-    result = response.text
+    result = response.content
     self.msn_money.parse_annual_report_data(result)
+    if self.msn_money.shares_outstanding:
+      self.cache.put_fields('msn_annual_report', self.ticker_symbol, self.msn_money, MSNMoney.ANNUAL_REPORT_FIELDS)
+      self._fetched('msn_annual_report')
 
   def fetch_yahoo_finance_analysis(self):
     self.yahoo_finance_analysis = YahooFinanceAnalysis(self.ticker_symbol)
-    session = self._create_session()
-    rpc = session.get(self.yahoo_finance_analysis.url, allow_redirects=True, hooks={
-       'response': self.parse_yahoo_finance_analysis,
-    })
-    self.rpcs.append(rpc)
+    if self.cache.get_fields('yahoo_analysis', self.ticker_symbol, self.yahoo_finance_analysis):
+      self._cached(('yahoo_analysis',))
+      return
+    self._get(self.yahoo_finance_analysis.url, self.parse_yahoo_finance_analysis, 'yahoo_analysis')
 
   # Called asynchronously upon completion of the URL fetch from
   # `fetch_yahoo_finance_analysis`.
@@ -226,21 +616,39 @@ class DataFetcher():
       return
     result = response.text
     success = self.yahoo_finance_analysis.parse_analyst_five_year_growth_rate(result)
+    # A page without an estimate was still fetched, and Zacks may have one.
+    self._fetched('yahoo_analysis')
     if not success:
       self.yahoo_finance_analysis = None
+      return
+    self.cache.put_fields('yahoo_analysis', self.ticker_symbol, self.yahoo_finance_analysis, YahooFinanceAnalysis.FIELDS)
 
   def fetch_zacks_analysis(self):
-    session = self._create_session()
     self.zacks_analysis = Zacks(self.ticker_symbol)
+    if self.cache.get_fields('zacks_analysis', self.ticker_symbol, self.zacks_analysis):
+      self._cached(('zacks_analysis',))
+      return
+    # Streamed, so the parser can stop reading once it has the growth rate.
+    self._get(self.zacks_analysis.url, self.parse_zacks_analysis, 'zacks_analysis', stream=True)
 
-    rpc = session.get(
-      self.zacks_analysis.url,
-      allow_redirects=True,
-      hooks={
-       'response': self.zacks_analysis.parse,
-      }
-    )
-    self.rpcs.append(rpc)
+  # Called asynchronously upon completion of the URL fetch from
+  # `fetch_zacks_analysis`.
+  def parse_zacks_analysis(self, response, *args, **kwargs):
+    if not self.zacks_analysis:
+      return
+    # Streamed into a new object, which is only applied if not too late.
+    zacks_analysis = Zacks(self.ticker_symbol)
+    if not zacks_analysis.parse(response):
+      return
+    with self.parse_lock:
+      if self.closed:
+        return
+      # A page without an estimate was still fetched, and Yahoo may have one.
+      self._fetched('zacks_analysis')
+      if zacks_analysis.five_year_growth_rate is None:
+        return
+      self.zacks_analysis = zacks_analysis
+      self.cache.put_fields('zacks_analysis', self.ticker_symbol, self.zacks_analysis, Zacks.FIELDS)
 
   def parse_growth_rate_estimate(self, response, *args, **kwargs):
     if response.status_code != 200:
@@ -254,11 +662,7 @@ class DataFetcher():
 
   def fetch_yahoo_finance_chart(self):
     self.yahoo_finance_chart = YahooFinanceChart(self.ticker_symbol)
-    session = self._create_session()
-    rpc = session.get(self.yahoo_finance_chart.url, allow_redirects=True, hooks={
-       'response': self.parse_yahoo_finance_chart,
-    })
-    self.rpcs.append(rpc)
+    self._get(self.yahoo_finance_chart.url, self.parse_yahoo_finance_chart, 'yahoo_chart')
 
   # Called asynchronously upon completion of the URL fetch from
   # `fetch_yahoo_finance_analysis`.
@@ -0,0 +1,473 @@
+"""A columnar on-disk store of company fundamentals.
+
+Every numeric field of `CompanyFundamentals` is one NumPy `.npy` file with one
+row per ticker, so readers can memory-map the whole universe and run the Rule
+#1 calculations over it (see `FundamentalsTable.valuations`) without fetching
+or reparsing any JSON. Annual and quarterly series are right-aligned and
+padded with NaN on the left, so column -1 is always the most recent value. The
+growth rates and averages have a column per 1, 3, 5 and maximum year period
+instead, so column `i` is always period `i`. The growth rates are computed
+from the annual series on upsert, as `MSNMoney` does, but with NaN for the
+periods whose rate is undefined, which the `MSNMoney` lists leave out.
+
+Writers buffer upserts in memory and `flush` writes a complete new generation
+directory, fsyncs it, then atomically points the `CURRENT` file at it.
+Readers (in this or any other process) therefore never see a partially
+written generation, even after a crash, and mappings of an older generation
+stay valid after it is replaced. The previous generation is kept until the
+next flush, so a reader that just read `CURRENT` can still load it.
+
+The store supports a single writer: only one `FundamentalsStore` (in one
+process) may write to a directory at a time.
+
+Layout:
+  <path>/CURRENT              The name of the latest generation, e.g. 'gen-000003'.
+  <path>/gen-000003/meta.json Tickers, names, industries and series widths.
+  <path>/gen-000003/<column>.npy
+"""
+
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from threading import Lock
+
+import numpy as np
+
+import isthisstockgood.RuleOneBatchCalculations as RuleOneBatch
+from isthisstockgood.Active.MSNMoney import compute_growth_rates_by_period
+
+logger = logging.getLogger("IsThisStockGood")
+
+DEFAULT_MAX_YEARS = 10
+DEFAULT_MAX_QUARTERS = 8
+DEFAULT_FLUSH_EVERY = 100
+# The 1, 3, 5 and maximum year growth rates and averages.
+PERIOD_COUNT = 4
+
+SCALAR_COLUMNS = (
+  'current_price', 'average_volume', 'market_cap', 'shares_outstanding',
+  'total_debt', 'pe_high', 'pe_low', 'debt_equity_ratio',
+  'last_year_net_income', 'five_year_growth_rate', 'updated_at',
+)
+ANNUAL_COLUMNS = ('roic', 'equity', 'free_cash_flow', 'revenue', 'eps')
+QUARTERLY_COLUMNS = ('quarterly_eps',)
+PERIOD_COLUMNS = (
+  'roic_averages', 'equity_growth_rates', 'free_cash_flow_growth_rates',
+  'revenue_growth_rates', 'eps_growth_rates',
+)
+
+# The annual series each growth rate column is computed from.
+GROWTH_RATE_SERIES = {
+  'equity_growth_rates' : 'equity',
+  'free_cash_flow_growth_rates' : 'free_cash_flow',
+  'revenue_growth_rates' : 'revenue',
+  'eps_growth_rates' : 'eps',
+}
+
+_CURRENT = 'CURRENT'
+_META = 'meta.json'
+_GENERATION_PREFIX = 'gen-'
+
+
+def _widths(max_years, max_quarters):
+  """Returns the row width of every column, with 0 for scalars."""
+  widths = {name : 0 for name in SCALAR_COLUMNS}
+  widths.update({name : max_years for name in ANNUAL_COLUMNS})
+  widths.update({name : max_quarters for name in QUARTERLY_COLUMNS})
+  widths.update({name : PERIOD_COUNT for name in PERIOD_COLUMNS})
+  return widths
+
+
+def _as_float(value):
+  try:
+    return float(value)
+  except (TypeError, ValueError):
+    return np.nan
+
+
+def _left_aligned(values, width):
+  row = np.full(width, np.nan)
+  if values is not None and len(values):
+    values = np.asarray(values, dtype=np.float64)[:width]
+    row[:len(values)] = values
+  return row
+
+
+def _right_aligned(values, width):
+  row = np.full(width, np.nan)
+  if values is not None and len(values):
+    values = np.asarray(values, dtype=np.float64)[-width:]
+    row[width - len(values):] = values
+  return row
+
+
+def _write_synced(path, write):
+  """Writes a file with `write(file)` and fsyncs it."""
+  with open(path, 'wb') as output:
+    write(output)
+    output.flush()
+    os.fsync(output.fileno())
+
+
+def _fsync_directory(path):
+  """Makes the entries created or renamed in `path` durable, where supported."""
+  if os.name != 'posix':
+    return
+  descriptor = os.open(path, os.O_RDONLY)
+  try:
+    os.fsync(descriptor)
+  finally:
+    os.close(descriptor)
+
+
+def _generation_number(generation):
+  return int(generation[len(_GENERATION_PREFIX):])
+
+
+def current_generation(path):
+  """Returns the name of the latest flushed generation at `path`, or None."""
+  try:
+    with open(os.path.join(path, _CURRENT)) as current:
+      return current.read().strip() or None
+  except FileNotFoundError:
+    return None
+
+
+class FundamentalsTable:
+  """One generation of the store, with a row per ticker.
+
+  Attributes:
+    tickers: The upper case ticker of every row.
+    names: The company name of every row, or None.
+    industries: The industry of every row, or None.
+    generation: The name of the generation directory, if loaded from disk.
+    columns: A float64 array per column name; `(rows,)` for scalars and
+        `(rows, width)` for series.
+  """
+
+  def __init__(self, tickers, names, industries, columns, generation=None):
+    self.generation = generation
+    self.tickers = tickers
+    self.names = names
+    self.industries = industries
+    self.columns = columns
+    self._index = {ticker : row for row, ticker in enumerate(tickers)}
+
+  @classmethod
+  def load(cls, directory, mmap=True):
+    with open(os.path.join(directory, _META)) as meta_file:
+      meta = json.load(meta_file)
+    mmap_mode = 'r' if mmap and meta['tickers'] else None
+    columns = {
+      name : np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+      for name in meta['widths']
+    }
+    return cls(meta['tickers'], meta['names'], meta['industries'], columns,
+               generation=os.path.basename(os.path.normpath(directory)))
+
+  def __len__(self):
+    return len(self.tickers)
+
+  def __contains__(self, ticker):
+    return ticker.upper() in self._index
+
+  def row_of(self, ticker):
+    """Returns the row index of the `ticker`, or None."""
+    return self._index.get(ticker.upper())
+
+  def latest(self, name):
+    """Returns the most recent value of the series `name` for every row (NaN if none)."""
+    return self.columns[name][:, -1]
+
+  def longest_period(self, name):
+    """Returns the value of the longest period of `name` for every row (NaN if none).
+
+    This is the `[-1]` value `DataFetcher` uses, e.g. of 'equity_growth_rates'.
+    """
+    values = self.columns[name]
+    present = ~np.isnan(values)
+    # The last present column, skipping the periods without a value.
+    last = values.shape[1] - 1 - np.argmax(present[:, ::-1], axis=1)
+    return np.where(present.any(axis=1), values[np.arange(len(values)), last], np.nan)
+
+  def ttm_eps(self):
+    """Returns the trailing twelve month EPS, as `DataFetcher` sums it, for every row."""
+    return np.nansum(self.columns['quarterly_eps'][:, -4:], axis=1)
+
+  def estimated_growth_rate(self):
+    """Returns the conservative decimal growth rate used by the valuations."""
+    return RuleOneBatch.conservative_growth_rate(
+        self.columns['five_year_growth_rate'], self.longest_period('equity_growth_rates'))
+
+  def valuations(self):
+    """Runs `RuleOneBatchCalculations.valuations` over every row.
+
+    Matches the values of `computeTemplateValues`, except that a missing
+    value is NaN (and a payback time that cannot be computed is -1).
+    """
+    return RuleOneBatch.valuations(
+        self.ttm_eps(),
+        self.estimated_growth_rate(),
+        self.columns['pe_low'],
+        self.columns['pe_high'],
+        self.columns['market_cap'],
+        self.columns['last_year_net_income'],
+        self.latest('free_cash_flow'))
+
+  def get(self, ticker):
+    """Returns the stored fields of the `ticker` as a dictionary, or None.
+
+    Series are lists without their NaN padding, and missing scalars are None.
+    """
+    row = self.row_of(ticker)
+    if row is None:
+      return None
+    return _row_fields(self.tickers[row], self.names[row], self.industries[row],
+                       {name : values[row] for name, values in self.columns.items()})
+
+
+def _row_fields(ticker, name, industry, row):
+  fields = {'ticker_symbol' : ticker, 'name' : name, 'industry' : industry}
+  for column, value in row.items():
+    if np.ndim(value):
+      fields[column] = value[~np.isnan(value)].tolist()
+    else:
+      fields[column] = None if np.isnan(value) else float(value)
+  return fields
+
+
+def open_fundamentals(path, mmap=True):
+  """Opens the latest flushed generation of the store at `path`.
+
+  Returns:
+    A `FundamentalsTable` with memory-mapped columns (unless `mmap` is False),
+    or None if nothing was flushed yet.
+  """
+  generation = current_generation(path)
+  if generation is None:
+    return None
+  return FundamentalsTable.load(os.path.join(path, generation), mmap=mmap)
+
+
+class FundamentalsStore:
+  """Collects `CompanyFundamentals` snapshots into the columnar files at `path`.
+
+  It must be the only writer of `path`.
+
+  Args:
+    path: The store directory, created if needed.
+    max_years: How many of the most recent annual values to keep per series.
+        Ignored once the store has been flushed, since every generation keeps
+        the widths of the first.
+    max_quarters: How many of the most recent quarterly values to keep.
+    flush_every: Flush automatically, on a background thread, once this many
+        tickers are pending. Zero or None disables automatic flushes.
+    clock: A function returning the current time in seconds, stored with each
+        upsert as 'updated_at'.
+  """
+
+  def __init__(self, path, max_years=DEFAULT_MAX_YEARS, max_quarters=DEFAULT_MAX_QUARTERS,
+               flush_every=DEFAULT_FLUSH_EVERY, clock=time.time):
+    self.path = path
+    self.flush_every = flush_every
+    self.clock = clock
+    os.makedirs(path, exist_ok=True)
+    self._lock = Lock()
+    self._flush_lock = Lock()
+    self._pending = {}
+    # Runs the automatic flushes, so that upserts never wait for one.
+    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='IsThisStockGood-fundamentals')
+    self._scheduled_flush = None
+    self._table = open_fundamentals(path)
+    if self._table is not None:
+      self._widths = {name : (values.shape[1] if values.ndim > 1 else 0)
+                      for name, values in self._table.columns.items()}
+    else:
+      self._widths = _widths(max_years, max_quarters)
+    self._stats = {'upserts' : 0, 'flushes' : 0}
+
+  def __len__(self):
+    """The number of flushed tickers."""
+    return len(self._table) if self._table is not None else 0
+
+  def upsert(self, fundamentals):
+    """Inserts or replaces the row of a `CompanyFundamentals` snapshot."""
+    ticker = fundamentals.ticker_symbol.upper()
+    row = {}
+    for name, width in self._widths.items():
+      if name in GROWTH_RATE_SERIES:
+        rates = compute_growth_rates_by_period(getattr(fundamentals, GROWTH_RATE_SERIES[name]))
+        row[name] = np.array([np.nan if rate is None else rate for rate in rates])
+      elif name in PERIOD_COLUMNS:
+        row[name] = _left_aligned(getattr(fundamentals, name), width)
+      elif width:
+        row[name] = _right_aligned(getattr(fundamentals, name), width)
+      elif name != 'updated_at':
+        row[name] = _as_float(getattr(fundamentals, name, None))
+    row['updated_at'] = self.clock()
+    labels = (fundamentals.name or None, fundamentals.industry or None)
+    with self._lock:
+      self._pending[ticker] = (labels, row)
+      self._stats['upserts'] += 1
+      if self._should_flush() and (self._scheduled_flush is None or self._scheduled_flush.done()):
+        self._scheduled_flush = self._executor.submit(self._flush_in_background)
+
+  def _should_flush(self):
+    # Must be called with `self._lock` held.
+    return self.flush_every and len(self._pending) >= self.flush_every
+
+  def _flush_in_background(self):
+    while True:
+      try:
+        self.flush()
+      except Exception as e:
+        logger.warning(f'Fundamentals flush failed: {e}')
+        return
+      # Upserts made during the flush did not schedule another one.
+      with self._lock:
+        if not self._should_flush():
+          return
+
+  def join(self, timeout=None):
+    """Waits for the automatic flush in progress. Returns False on a timeout."""
+    with self._lock:
+      scheduled_flush = self._scheduled_flush
+    if scheduled_flush is None:
+      return True
+    try:
+      scheduled_flush.result(timeout=timeout)
+    except TimeoutError:
+      return False
+    return True
+
+  def upsert_many(self, snapshots):
+    for fundamentals in snapshots:
+      self.upsert(fundamentals)
+
+  def get(self, ticker):
+    """Returns the latest fields of the `ticker` (see `FundamentalsTable.get`), or None.
+
+    Unlike the flushed table, this includes the upserts still pending.
+    """
+    ticker = ticker.upper()
+    with self._lock:
+      pending = self._pending.get(ticker)
+      table = self._table
+    if pending is not None:
+      (name, industry), row = pending
+      return _row_fields(ticker, name, industry, row)
+    return table.get(ticker) if table is not None else None
+
+  def pending(self):
+    with self._lock:
+      return len(self._pending)
+
+  def flush(self):
+    """Writes the pending upserts as a new generation.
+
+    Returns:
+      The flushed `FundamentalsTable`, or None if the store is still empty.
+    """
+    with self._flush_lock:
+      with self._lock:
+        pending, self._pending = self._pending, {}
+      if not pending:
+        return self._table
+
+      previous = self._table
+      tickers = list(previous.tickers) if previous is not None else []
+      names = list(previous.names) if previous is not None else []
+      industries = list(previous.industries) if previous is not None else []
+      index = dict(previous._index) if previous is not None else {}
+      for ticker in pending:
+        if ticker not in index:
+          index[ticker] = len(tickers)
+          tickers.append(ticker)
+          names.append(None)
+          industries.append(None)
+
+      columns = {}
+      for name, width in self._widths.items():
+        shape = (len(tickers), width) if width else (len(tickers),)
+        values = np.full(shape, np.nan)
+        if previous is not None:
+          values[:len(previous)] = previous.columns[name]
+        columns[name] = values
+      for ticker, ((name, industry), row) in pending.items():
+        position = index[ticker]
+        names[position] = name
+        industries[position] = industry
+        for column, value in row.items():
+          columns[column][position] = value
+
+      self._write_generation(tickers, names, industries, columns)
+      self._stats['flushes'] += 1
+      return self._table
+
+  def read(self, mmap=True):
+    """Returns the latest flushed generation (see `open_fundamentals`)."""
+    return open_fundamentals(self.path, mmap=mmap)
+
+  def get_stats(self):
+    with self._lock:
+      stats = dict(self._stats, pending=len(self._pending))
+    stats['tickers'] = len(self)
+    return stats
+
+  def close(self):
+    self._executor.shutdown(wait=True)
+    self.flush()
+
+  def _write_generation(self, tickers, names, industries, columns):
+    previous_generation = current_generation(self.path)
+    number = _generation_number(previous_generation) + 1 if previous_generation else 1
+    generation = f'{_GENERATION_PREFIX}{number:06d}'
+    directory = os.path.join(self.path, generation)
+    os.makedirs(directory, exist_ok=True)
+    # Everything is on disk before `CURRENT` points at it.
+    for name, values in columns.items():
+      _write_synced(os.path.join(directory, name + '.npy'), lambda output: np.save(output, values))
+    meta = {'tickers' : tickers, 'names' : names, 'industries' : industries,
+            'widths' : self._widths}
+    _write_synced(os.path.join(directory, _META), lambda output: output.write(json.dumps(meta).encode('utf8')))
+    _fsync_directory(directory)
+
+    current = os.path.join(self.path, _CURRENT)
+    _write_synced(current + '.tmp', lambda output: output.write(generation.encode('utf8')))
+    os.replace(current + '.tmp', current)
+    _fsync_directory(self.path)
+    self._table = FundamentalsTable.load(directory)
+
+    # The previous generation is kept for readers that read `CURRENT` just
+    # before the swap. Open mappings of older generations stay readable after
+    # the unlink (on platforms that refuse, they are removed by a later flush).
+    for entry in os.listdir(self.path):
+      if entry.startswith(_GENERATION_PREFIX) and _generation_number(entry) < number - 1:
+        shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+
+
+_fundamentals_store = None
+_fundamentals_store_lock = Lock()
+
+
+def get_fundamentals_store():
+  """Returns the process-wide `FundamentalsStore`, or None unless one was configured."""
+  with _fundamentals_store_lock:
+    return _fundamentals_store
+
+
+def configure_fundamentals_store(path=None, **kwargs):
+  """Replaces the process-wide `FundamentalsStore`. A None `path` disables it.
+
+  The previous store is flushed.
+  """
+  global _fundamentals_store
+  with _fundamentals_store_lock:
+    previous = _fundamentals_store
+    _fundamentals_store = FundamentalsStore(path, **kwargs) if path else None
+  if previous is not None:
+    previous.close()
+  return _fundamentals_store
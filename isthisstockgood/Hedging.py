@@ -0,0 +1,231 @@
+"""Hedged requests: a duplicate of a slow request, of which the first answer wins.
+
+Most upstream requests answer quickly, but now and then one stalls (e.g. on a
+bad connection) and then sets the latency of the whole lookup. The `Hedger`
+keeps a rolling window of the latencies of each source. When a request has
+not answered within the p95 of its source, the same request is sent again,
+on another pooled connection, and whichever response arrives first is
+parsed. The response hook never runs for the other one.
+
+At most `max_in_flight` hedges are outstanding at once, so a source that is
+slow for everybody is not hit with twice the requests.
+"""
+
+import time
+from collections import deque
+from concurrent.futures import Future
+from threading import Lock
+
+from isthisstockgood.Timers import Timers
+
+DEFAULT_PERCENTILE = 95
+# Latencies kept per source, and how many are needed before hedging.
+DEFAULT_WINDOW = 200
+DEFAULT_MIN_SAMPLES = 20
+# Requests are never hedged sooner than this many seconds.
+DEFAULT_MIN_DELAY = 0.1
+DEFAULT_MAX_IN_FLIGHT = 8
+
+
+class LatencyWindow:
+  """The most recent latencies of a source, in seconds."""
+
+  def __init__(self, size=DEFAULT_WINDOW):
+    self._latencies = deque(maxlen=size)
+    self._lock = Lock()
+
+  def __len__(self):
+    with self._lock:
+      return len(self._latencies)
+
+  def add(self, seconds):
+    with self._lock:
+      self._latencies.append(seconds)
+
+  def percentile(self, percent, min_samples=1):
+    """Returns the nearest-rank percentile, or None with fewer than `min_samples`."""
+    with self._lock:
+      latencies = sorted(self._latencies)
+    if len(latencies) < max(min_samples, 1):
+      return None
+    rank = max(1, -(-len(latencies) * percent // 100))
+    return latencies[int(rank) - 1]
+
+
+class _HedgedRequest:
+
+  def __init__(self, source, url, hook, stream, kwargs):
+    self.source = source
+    self.url = url
+    self.hook = hook
+    self.stream = stream
+    self.kwargs = kwargs
+    self.future = Future()
+    # The index of the attempt that answered first (0 is the original).
+    self.answered_by = None
+    self.pending = 0
+    # Set once the outcome of `future` is decided.
+    self.done = False
+    self.timer = None
+    self.lock = Lock()
+
+
+class Hedger:
+  """Sends a duplicate of each request that is slower than its source's p95.
+
+  Args:
+    percentile: The percentile of a source's latencies after which a
+        request is hedged.
+    window: How many recent latencies to keep per source.
+    min_samples: The latencies a source needs before its requests are hedged.
+    min_delay: The fewest seconds to wait before hedging.
+    max_in_flight: The most hedges outstanding at once, over all sources.
+        0 disables hedging.
+    clock: A function returning the current time in seconds.
+  """
+
+  def __init__(self, percentile=DEFAULT_PERCENTILE, window=DEFAULT_WINDOW,
+               min_samples=DEFAULT_MIN_SAMPLES, min_delay=DEFAULT_MIN_DELAY,
+               max_in_flight=DEFAULT_MAX_IN_FLIGHT, clock=time.perf_counter):
+    self.percentile = percentile
+    self.window = window
+    self.min_samples = min_samples
+    self.min_delay = min_delay
+    self.max_in_flight = max_in_flight
+    self.clock = clock
+    self._windows = {}
+    self._stats = {}
+    self._in_flight = 0
+    self._timers = Timers('IsThisStockGood-hedger')
+    self._lock = Lock()
+
+  def latencies(self, source):
+    """Returns the `LatencyWindow` of the `source`."""
+    with self._lock:
+      window = self._windows.get(source)
+      if window is None:
+        window = self._windows[source] = LatencyWindow(self.window)
+      return window
+
+  def _count(self, source, name):
+    with self._lock:
+      stats = self._stats.setdefault(
+          source, {'requests' : 0, 'hedged' : 0, 'hedges_won' : 0, 'capped' : 0})
+      stats[name] += 1
+
+  def delay(self, source):
+    """Returns the seconds after which a request to the `source` is hedged, or None."""
+    if not self.max_in_flight:
+      return None
+    latency = self.latencies(source).percentile(self.percentile, self.min_samples)
+    return None if latency is None else max(latency, self.min_delay)
+
+  def get(self, session_pool, source, url, hook, **kwargs):
+    """Issues a GET on `session_pool`, hedged once it is slower than usual.
+
+    Args:
+      session_pool: The `SessionPool` to send the requests on.
+      source: The name of the source, whose latencies decide when to hedge.
+      url: The URL to fetch.
+      hook: The response hook, which runs for the first response only.
+      **kwargs: Forwarded to `SessionPool.get`.
+
+    Returns:
+      A `Future` of the first response, as returned by its hook. It fails
+      if every request that was sent failed.
+    """
+    request = _HedgedRequest(source, url, hook, kwargs.get('stream', False), kwargs)
+    self._count(source, 'requests')
+    delay = self.delay(source)
+    self._send(session_pool, request, 0)
+    if delay is not None:
+      request.timer = self._timers.schedule(delay, lambda: self._hedge(session_pool, request))
+    return request.future
+
+  def _send(self, session_pool, request, index):
+    sent_at = self.clock()
+
+    def on_response(response, *args, **kwargs):
+      self.latencies(request.source).add(self.clock() - sent_at)
+      with request.lock:
+        first = request.answered_by is None
+        if first:
+          request.answered_by = index
+      if not first:
+        if request.stream:
+          response.close()
+        return None
+      if request.timer is not None:
+        self._timers.cancel(request.timer)
+      if index:
+        self._count(request.source, 'hedges_won')
+      return request.hook(response, *args, **kwargs)
+
+    with request.lock:
+      request.pending += 1
+    attempt = session_pool.get(request.url, hooks={'response' : on_response}, **request.kwargs)
+    attempt.add_done_callback(lambda attempt: self._attempt_done(request, index, attempt))
+
+  def _hedge(self, session_pool, request):
+    with request.lock:
+      if request.done or request.answered_by is not None:
+        return
+    with self._lock:
+      capped = self._in_flight >= self.max_in_flight
+      if not capped:
+        self._in_flight += 1
+    if capped:
+      self._count(request.source, 'capped')
+      return
+    self._count(request.source, 'hedged')
+    self._send(session_pool, request, 1)
+
+  def _attempt_done(self, request, index, attempt):
+    if index:
+      with self._lock:
+        self._in_flight -= 1
+    error = attempt.exception()
+    with request.lock:
+      request.pending -= 1
+      if request.done:
+        return
+      if request.answered_by is not None and request.answered_by != index:
+        return  # The other attempt answered first and completes the request.
+      if error is not None and request.answered_by is None and request.pending:
+        return  # The other attempt may still answer.
+      request.done = True
+    if request.timer is not None:
+      self._timers.cancel(request.timer)
+    if error is None:
+      request.future.set_result(attempt.result())
+    else:
+      request.future.set_exception(error)
+
+  def get_stats(self):
+    with self._lock:
+      sources = {source : dict(stats) for source, stats in sorted(self._stats.items())}
+      in_flight = self._in_flight
+    for source, stats in sources.items():
+      stats['delay'] = self.delay(source)
+    return {'in_flight' : in_flight, 'sources' : sources}
+
+
+_hedger = None
+_hedger_lock = Lock()
+
+
+def get_hedger():
+  """Returns the process-wide `Hedger`, creating it on first use."""
+  global _hedger
+  with _hedger_lock:
+    if _hedger is None:
+      _hedger = Hedger()
+    return _hedger
+
+
+def configure_hedger(**kwargs):
+  """Replaces the process-wide `Hedger` with one using `kwargs`."""
+  global _hedger
+  with _hedger_lock:
+    _hedger = Hedger(**kwargs)
+  return _hedger
@@ -0,0 +1,129 @@
+"""A pluggable JSON decoder for the (large) MSN Money payloads, and encoder for responses.
+
+Uses `orjson` or `simdjson` when one is installed, and the standard library
+otherwise. Neither is a required dependency (`pip install .[json]` adds orjson).
+Only `orjson` encodes, so `dumps` falls back to the standard library with the
+`simdjson` backend.
+
+`loads_members` decodes only the requested top-level members of an object,
+which lets the standard library backend skip large parts of a payload that are
+never read (e.g. the industry metrics next to the company metrics).
+"""
+
+import json
+from threading import Lock
+
+try:
+  import orjson
+except ImportError:  # pragma: no cover - depends on the environment.
+  orjson = None
+
+try:
+  import simdjson
+except ImportError:  # pragma: no cover - depends on the environment.
+  simdjson = None
+
+_DECODERS = {'json' : json.loads}
+if simdjson is not None:
+  _DECODERS['simdjson'] = simdjson.loads
+if orjson is not None:
+  _DECODERS['orjson'] = orjson.loads
+
+# In order of preference.
+AVAILABLE_BACKENDS = tuple(
+  name for name in ('orjson', 'simdjson', 'json') if name in _DECODERS
+)
+
+_stdlib_decoder = json.JSONDecoder()
+_backend = AVAILABLE_BACKENDS[0]
+_backend_lock = Lock()
+
+
+def get_json_backend():
+  """Returns the name of the backend used by `loads`."""
+  return _backend
+
+
+def configure_json_backend(name=None):
+  """Selects the backend by name, or the fastest available one by default."""
+  global _backend
+  name = name or AVAILABLE_BACKENDS[0]
+  if name not in _DECODERS:
+    raise ValueError(f'Unknown or unavailable JSON backend: {name}')
+  with _backend_lock:
+    _backend = name
+  return name
+
+
+def loads(content):
+  """Decodes a JSON `str` or UTF-8 `bytes` document."""
+  return _DECODERS[_backend](content)
+
+
+def dumps(data):
+  """Encodes `data` as compact UTF-8 JSON `bytes`.
+
+  JSON has no NaN or infinity, and the backends disagree on them: `orjson`
+  encodes them as null, while the standard library raises a ValueError.
+  Callers must replace them with None before calling `dumps`, as
+  `Serializer.stock_data` does.
+
+  The backends decode to the same values, but may spell floats differently,
+  e.g. `orjson` writes 1e16 as `1e16` and the standard library as `1e+16`.
+  Bytes, and the ETags hashed from them, are therefore only stable between
+  processes using the same backend.
+  """
+  if _backend == 'orjson':
+    return orjson.dumps(data)
+  return json.dumps(data, separators=(',', ':'), ensure_ascii=False, allow_nan=False).encode('utf8')
+
+
+def loads_members(content, names):
+  """Decodes just the top-level members `names` of a JSON object.
+
+  With the standard library backend each member is decoded in place, as long
+  as its key occurs exactly once in the document, so the rest of the payload
+  is only scanned and never materialized. Anything unexpected falls back to
+  decoding the whole document. This assumes, as holds for the MSN payloads,
+  that the requested keys are never used by nested objects alone.
+
+  Returns:
+    A dictionary holding whichever of `names` are present.
+  """
+  if _backend == 'json':
+    if isinstance(content, (bytes, bytearray)):
+      content = content.decode('utf8')
+    members = _decode_members_in_place(content, names)
+    if members is not None:
+      return members
+  data = loads(content)
+  if not isinstance(data, dict):
+    return {}
+  return {name : data[name] for name in names if name in data}
+
+
+def _decode_members_in_place(content, names):
+  if not content.lstrip().startswith('{'):
+    return None
+  members = {}
+  for name in names:
+    key = json.dumps(name)
+    count = content.count(key)
+    if count == 0:
+      continue
+    if count > 1:
+      return None
+    colon = _skip_whitespace(content, content.index(key) + len(key))
+    if colon >= len(content) or content[colon] != ':':
+      return None
+    try:
+      members[name], _ = _stdlib_decoder.raw_decode(content, _skip_whitespace(content, colon + 1))
+    except ValueError:
+      return None
+  return members
+
+
+def _skip_whitespace(content, index):
+  while index < len(content) and content[index] in ' \t\n\r':
+    index += 1
+  return index
@@ -0,0 +1,273 @@
+"""Timing spans and Prometheus-style metrics for the data source pipeline.
+
+Every ticker lookup gets a `Trace`, and every upstream request it makes is
+broken down into spans per stage:
+- queue: waiting for a worker of the `SessionPool`;
+- connect: opening a new connection, i.e. DNS resolution, the TCP handshake
+  and the TLS handshake (urllib3 resolves inside its connect, so DNS is not
+  measured on its own). Absent when a keep-alive connection was reused;
+- ttfb: sending the request until the response headers arrived;
+- body: downloading the response body. Streamed responses (Zacks) are read
+  by their parser, so their download is part of the parse stage;
+- parse: running the `parse_*` hook.
+
+The stage durations are also aggregated into histograms, which `render`
+exposes in the Prometheus text format (see the `/metrics` route).
+
+Metrics are disabled unless `configure_metrics(enabled=True)` is called.
+Otherwise `start_trace` returns None and the pipeline skips every timer.
+"""
+
+import logging
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from threading import Lock
+
+logger = logging.getLogger("IsThisStockGood")
+
+# Upper bounds, in seconds, of the histogram buckets.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# How many finished traces are kept for `recent_traces`.
+DEFAULT_MAX_TRACES = 200
+
+STAGES = ('queue', 'connect', 'ttfb', 'body', 'parse')
+
+# A named interval of a trace. `start` is relative to the start of the trace.
+Span = namedtuple('Span', ['name', 'start', 'duration', 'attributes'])
+
+
+def _escape_label_value(value):
+  return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+  pairs = list(zip(names, values)) + list(extra)
+  if not pairs:
+    return ''
+  return '{' + ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+  if value == float('inf'):
+    return '+Inf'
+  return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+  """A thread-safe counter per combination of label values."""
+
+  def __init__(self, name, documentation, label_names=()):
+    self.name = name
+    self.documentation = documentation
+    self.label_names = tuple(label_names)
+    self._values = {}
+    self._lock = Lock()
+
+  def inc(self, *label_values, amount=1):
+    with self._lock:
+      self._values[label_values] = self._values.get(label_values, 0) + amount
+
+  def value(self, *label_values):
+    with self._lock:
+      return self._values.get(label_values, 0)
+
+  def render(self):
+    """Returns the Prometheus text exposition lines of the counter."""
+    with self._lock:
+      values = sorted(self._values.items())
+    lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+    for label_values, value in values:
+      lines.append(f'{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}')
+    return lines
+
+
+class Histogram:
+  """A thread-safe histogram per combination of label values.
+
+  Args:
+    name: The metric name.
+    documentation: The help text of the metric.
+    label_names: The names of the labels every observation is made with.
+    buckets: The sorted upper bounds of the buckets. An implicit '+Inf'
+        bucket catches everything above them.
+  """
+
+  def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+    self.name = name
+    self.documentation = documentation
+    self.label_names = tuple(label_names)
+    self.buckets = tuple(buckets)
+    self._series = {}  # label values -> [bucket counts, sum]
+    self._lock = Lock()
+
+  def observe(self, value, *label_values):
+    index = bisect_left(self.buckets, value)
+    with self._lock:
+      series = self._series.get(label_values)
+      if series is None:
+        series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+      series[0][index] += 1
+      series[1] += value
+
+  def count(self, *label_values):
+    with self._lock:
+      series = self._series.get(label_values)
+      return sum(series[0]) if series else 0
+
+  def totals(self):
+    """Returns `{label values : (count, sum)}` of every series."""
+    with self._lock:
+      return {labels : (sum(counts), total) for labels, (counts, total) in self._series.items()}
+
+  def render(self):
+    """Returns the Prometheus text exposition lines of the histogram."""
+    with self._lock:
+      series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+    lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+    for label_values, (counts, total) in series:
+      cumulative = 0
+      for bound, count in zip(self.buckets + (float('inf'),), counts):
+        cumulative += count
+        labels = _format_labels(self.label_names, label_values, [('le', _format_value(bound))])
+        lines.append(f'{self.name}_bucket{labels} {cumulative}')
+      labels = _format_labels(self.label_names, label_values)
+      lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+      lines.append(f'{self.name}_count{labels} {cumulative}')
+    return lines
+
+
+class Trace:
+  """The spans of one ticker lookup, linked by a random `trace_id`.
+
+  Spans may be added from any thread. Upstream stages are added with
+  `stage`, which also feeds the stage histogram of the `Metrics`.
+  """
+
+  def __init__(self, metrics, name, clock=time.perf_counter):
+    self.metrics = metrics
+    self.name = name
+    self.clock = clock
+    self.trace_id = uuid.uuid4().hex[:16]
+    self.started_at = clock()
+    self.duration = None
+    self.spans = []
+    self._lock = Lock()
+
+  def add_span(self, name, start, end, **attributes):
+    """Adds a span between the `clock` times `start` and `end`."""
+    span = Span(name, start - self.started_at, end - start, attributes)
+    with self._lock:
+      self.spans.append(span)
+    return span
+
+  @contextmanager
+  def span(self, name, **attributes):
+    """Times the enclosed block as a span."""
+    start = self.clock()
+    try:
+      yield
+    finally:
+      self.add_span(name, start, self.clock(), **attributes)
+
+  def stage(self, source, stage, start, end):
+    """Adds the span of one `STAGES` entry of a request to the `source`."""
+    self.add_span(f'{source}.{stage}', start, end)
+    self.metrics.stage_seconds.observe(end - start, source, stage)
+
+  def finish(self):
+    """Ends the trace and hands it to the `Metrics`. Returns its duration."""
+    self.duration = self.clock() - self.started_at
+    self.metrics.finish_trace(self)
+    return self.duration
+
+  def as_dict(self):
+    with self._lock:
+      spans = sorted(self.spans, key=lambda span: span.start)
+    return {
+      'trace_id' : self.trace_id,
+      'name' : self.name,
+      'duration' : self.duration,
+      'spans' : [
+        dict(span.attributes, name=span.name, start=span.start, duration=span.duration)
+        for span in spans
+      ],
+    }
+
+
+class Metrics:
+  """The histograms, counters and recent traces of the pipeline.
+
+  Args:
+    enabled: Whether lookups are traced at all.
+    max_traces: How many finished traces to keep.
+    buckets: The histogram bucket upper bounds, in seconds.
+  """
+
+  def __init__(self, enabled=False, max_traces=DEFAULT_MAX_TRACES, buckets=DEFAULT_BUCKETS):
+    self.enabled = enabled
+    self.stage_seconds = Histogram(
+      'isthisstockgood_upstream_stage_seconds',
+      'Time spent per stage of the upstream requests.',
+      ('source', 'stage'),
+      buckets
+    )
+    self.requests = Counter(
+      'isthisstockgood_upstream_requests_total',
+      'Upstream requests by outcome (the status code, or why none was received).',
+      ('source', 'outcome')
+    )
+    self.lookup_seconds = Histogram(
+      'isthisstockgood_lookup_seconds',
+      'Time spent fetching and parsing every source of a ticker.',
+      (),
+      buckets
+    )
+    self._traces = deque(maxlen=max_traces)
+    self._lock = Lock()
+
+  def start_trace(self, name):
+    """Returns a new `Trace`, or None if metrics are disabled."""
+    if not self.enabled:
+      return None
+    return Trace(self, name)
+
+  def finish_trace(self, trace):
+    self.lookup_seconds.observe(trace.duration)
+    with self._lock:
+      self._traces.append(trace)
+    if logger.isEnabledFor(logging.DEBUG):
+      logger.debug(f'Trace {trace.trace_id} for {trace.name} took {trace.duration * 1000:.1f}ms: ' +
+                   ', '.join(f'{span.name}={span.duration * 1000:.1f}ms' for span in trace.spans))
+
+  def recent_traces(self, name=None):
+    """Returns the finished traces, newest first, optionally only those of `name`."""
+    with self._lock:
+      traces = list(self._traces)
+    return [trace for trace in reversed(traces) if name is None or trace.name == name]
+
+  def render(self):
+    """Returns every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in (self.stage_seconds, self.requests, self.lookup_seconds):
+      lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+_metrics = Metrics()
+_metrics_lock = Lock()
+
+
+def get_metrics():
+  """Returns the process-wide `Metrics`, which are disabled by default."""
+  return _metrics
+
+
+def configure_metrics(**kwargs):
+  """Replaces the process-wide `Metrics` with ones using `kwargs`."""
+  global _metrics
+  with _metrics_lock:
+    _metrics = Metrics(**kwargs)
+  return _metrics
@@ -0,0 +1,240 @@
+"""Opt-in sampling profiler for slow requests.
+
+While a profiled request runs, a background thread samples the call stack of
+its thread every few milliseconds, along with the stacks of the busy
+`SessionPool` workers (which run the response hooks, i.e. the parsers). When
+the request finishes, its samples are kept if it was slower than the
+threshold or was picked by the sample rate, and are written as collapsed
+stacks (the `flamegraph.pl` / speedscope input format) to
+`<directory>/<request id>.collapsed`.
+
+Sampling only ever looks at stacks from the outside, so unlike `cProfile` it
+does not slow down the profiled code, and it is cheap enough to leave on for
+every request. Worker threads are shared by concurrent requests, so their
+samples may include work done for other requests running at the same time.
+"""
+
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# Requests slower than this many seconds are kept.
+DEFAULT_THRESHOLD = 1.0
+# Seconds between two samples.
+DEFAULT_INTERVAL = 0.005
+# How many profiles are kept on disk. The oldest ones are deleted first.
+DEFAULT_MAX_PROFILES = 100
+# Name prefixes of the threads that work on behalf of requests.
+DEFAULT_WORKER_PREFIXES = ('IsThisStockGood-http',)
+
+KEPT_SLOW = 'slow'
+KEPT_SAMPLED = 'sampled'
+
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+# Code object -> frame label, as formatting them dominates the sampling cost.
+_frame_labels = {}
+
+
+def is_valid_request_id(request_id):
+  """Returns whether `request_id` is safe to use as a profile file name."""
+  return bool(request_id) and bool(_REQUEST_ID_PATTERN.match(request_id)) \
+      and request_id not in ('.', '..')
+
+
+def _frame_label(code):
+  label = _frame_labels.get(code)
+  if label is None:
+    label = _frame_labels[code] = \
+        f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+  return label
+
+
+def _collapse(frame, root):
+  """Returns the `;`-joined stack of `frame`, outermost frame first."""
+  labels = []
+  while frame is not None:
+    labels.append(_frame_label(frame.f_code))
+    frame = frame.f_back
+  labels.append(root)
+  return ';'.join(reversed(labels))
+
+
+def _is_idle_worker(frame):
+  # An idle `ThreadPoolExecutor` worker waits in the C queue, right inside `_worker`.
+  return frame.f_code.co_name == '_worker' and frame.f_code.co_filename.endswith(
+      os.path.join('concurrent', 'futures', 'thread.py'))
+
+
+class ProfileSession:
+  """The samples of one profiled request."""
+
+  def __init__(self, request_id, name, thread_id, started_at, sampled):
+    self.request_id = request_id
+    self.name = name
+    self.thread_id = thread_id
+    self.started_at = started_at
+    self.sampled = sampled
+    self.samples = Counter()
+
+
+class SamplingProfiler:
+  """Samples the stacks of requests and keeps the profiles of slow ones.
+
+  Args:
+    directory: Where the collapsed stacks are written.
+    threshold: Requests taking at least this many seconds are kept, or None
+        to only keep sampled ones.
+    sample_rate: The fraction of requests kept regardless of their latency.
+    interval: Seconds between two samples.
+    max_profiles: How many profiles to keep on disk.
+    worker_prefixes: Name prefixes of the threads whose busy stacks are
+        sampled along with the request threads.
+    clock: A function returning the current time in seconds.
+  """
+
+  def __init__(self, directory, threshold=DEFAULT_THRESHOLD, sample_rate=0.0,
+               interval=DEFAULT_INTERVAL, max_profiles=DEFAULT_MAX_PROFILES,
+               worker_prefixes=DEFAULT_WORKER_PREFIXES, clock=time.perf_counter):
+    self.directory = directory
+    self.threshold = threshold
+    self.sample_rate = sample_rate
+    self.interval = interval
+    self.max_profiles = max_profiles
+    self.worker_prefixes = tuple(worker_prefixes)
+    self.clock = clock
+    self._random = random.Random()
+    self._sessions = {}  # id(session) -> session
+    self._profiles = OrderedDict()  # request id -> metadata, oldest first
+    self._lock = threading.Lock()
+    self._active = threading.Condition(self._lock)
+    self._closed = False
+    self._thread = None
+    os.makedirs(directory, exist_ok=True)
+
+  def start(self, request_id, name=''):
+    """Starts sampling the calling thread on behalf of `request_id`."""
+    session = ProfileSession(
+      request_id,
+      name,
+      threading.get_ident(),
+      self.clock(),
+      self._random.random() < self.sample_rate
+    )
+    with self._lock:
+      self._sessions[id(session)] = session
+      if self._thread is None and not self._closed:
+        self._thread = threading.Thread(
+          target=self._run,
+          name='IsThisStockGood-profiler',
+          daemon=True
+        )
+        self._thread.start()
+      self._active.notify()
+    return session
+
+  def stop(self, session):
+    """Stops sampling `session`.
+
+    Returns:
+      The metadata of the kept profile, or None if the request was neither
+      slow nor sampled.
+    """
+    duration = self.clock() - session.started_at
+    with self._lock:
+      self._sessions.pop(id(session), None)
+      samples = Counter(session.samples)
+    if self.threshold is not None and duration >= self.threshold:
+      reason = KEPT_SLOW
+    elif session.sampled:
+      reason = KEPT_SAMPLED
+    else:
+      return None
+    return self._save(session, duration, reason, samples)
+
+  def _save(self, session, duration, reason, samples):
+    metadata = {
+      'request_id' : session.request_id,
+      'name' : session.name,
+      'duration' : duration,
+      'reason' : reason,
+      'samples' : sum(samples.values()),
+      'created_at' : time.time(),
+    }
+    with open(self._path(session.request_id), 'w') as f:
+      for stack, count in sorted(samples.items()):
+        f.write(f'{stack} {count}\n')
+    with self._lock:
+      self._profiles.pop(session.request_id, None)
+      self._profiles[session.request_id] = metadata
+      evicted = []
+      while len(self._profiles) > self.max_profiles:
+        evicted.append(self._profiles.popitem(last=False)[0])
+    for request_id in evicted:
+      try:
+        os.remove(self._path(request_id))
+      except OSError:
+        pass
+    return metadata
+
+  def _path(self, request_id):
+    return os.path.join(self.directory, f'{request_id}.collapsed')
+
+  def sample(self):
+    """Records one sample of every active session."""
+    with self._lock:
+      sessions = list(self._sessions.values())
+    if not sessions:
+      return
+    frames = sys._current_frames()
+    worker_stacks = []
+    for thread in threading.enumerate():
+      if not thread.name.startswith(self.worker_prefixes):
+        continue
+      frame = frames.get(thread.ident)
+      if frame is not None and not _is_idle_worker(frame):
+        worker_stacks.append(_collapse(frame, 'worker'))
+    with self._lock:
+      for session in sessions:
+        frame = frames.get(session.thread_id)
+        if frame is not None:
+          session.samples[_collapse(frame, 'request')] += 1
+        for stack in worker_stacks:
+          session.samples[stack] += 1
+
+  def _run(self):
+    while True:
+      with self._lock:
+        self._active.wait_for(lambda: self._sessions or self._closed)
+        # Even the first sample is taken an interval into the request.
+        if self._active.wait_for(lambda: self._closed, timeout=self.interval):
+          return
+      self.sample()
+
+  def get(self, request_id):
+    """Returns the collapsed stacks kept for `request_id`, or None."""
+    with self._lock:
+      if request_id not in self._profiles:
+        return None
+    try:
+      with open(self._path(request_id)) as f:
+        return f.read()
+    except OSError:
+      return None
+
+  def profiles(self):
+    """Returns the metadata of the kept profiles, newest first."""
+    with self._lock:
+      return [dict(metadata) for metadata in reversed(self._profiles.values())]
+
+  def close(self):
+    """Stops the sampling thread."""
+    with self._lock:
+      self._closed = True
+      self._active.notify_all()
+      thread = self._thread
+    if thread is not None:
+      thread.join()
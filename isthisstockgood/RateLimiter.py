@@ -0,0 +1,270 @@
+"""Rate limits and circuit breakers for the upstream data source hosts.
+
+A slow or failing upstream should not hold every request (and worker thread)
+hostage. `HostGuard` gives every host a token bucket and a `CircuitBreaker`.
+Requests to a host that keeps failing are rejected right away, so callers can
+fall back to other sources. Requests over a host's rate are delayed until
+the bucket refills, and only rejected if that takes too long.
+"""
+
+import time
+from threading import Lock
+
+# Requests per second and burst size allowed per upstream host.
+DEFAULT_HOST_RATE = 20.0
+DEFAULT_HOST_BURST = 40
+# Consecutive failures that open a circuit, and seconds until it is retried.
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+CIRCUIT_OPEN = 'circuit_open'
+RATE_LIMITED = 'rate_limited'
+
+
+class UpstreamUnavailable(Exception):
+  """Raised for a request that was rejected without being sent."""
+
+  def __init__(self, host, reason):
+    super().__init__(f'{host} is unavailable ({reason})')
+    self.host = host
+    self.reason = reason
+
+
+class TokenBucket:
+  """A thread-safe token bucket.
+
+  Args:
+    rate: Tokens added per second.
+    burst: The most tokens the bucket holds, i.e. the largest burst allowed.
+        Defaults to `rate` (and at least 1).
+    clock: A function returning the current time in seconds.
+  """
+
+  def __init__(self, rate, burst=None, clock=time.monotonic):
+    self.rate = rate
+    self.burst = burst if burst is not None else max(rate, 1)
+    self.clock = clock
+    self._tokens = self.burst
+    self._updated_at = clock()
+    self._lock = Lock()
+
+  def _refill(self):
+    # Must be called with `self._lock` held.
+    now = self.clock()
+    self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+    self._updated_at = now
+
+  def available(self):
+    """Returns how many whole tokens could be taken right now."""
+    with self._lock:
+      self._refill()
+      return int(self._tokens)
+
+  def try_acquire(self, tokens=1):
+    """Takes `tokens` if they are available. Returns whether they were taken."""
+    with self._lock:
+      self._refill()
+      if self._tokens < tokens:
+        return False
+      self._tokens -= tokens
+      return True
+
+  def reserve(self, tokens=1, max_wait=0.0):
+    """Takes `tokens` now or, if they are available within `max_wait` seconds, ahead of time.
+
+    Returns:
+      The seconds to wait before using the tokens (0 if they are available
+      now), or None if they were not taken.
+    """
+    with self._lock:
+      self._refill()
+      missing = tokens - self._tokens
+      wait = max(missing / self.rate, 0.0) if self.rate else (0.0 if missing <= 0 else float('inf'))
+      if wait > max_wait:
+        return None
+      # Reserved tokens leave the bucket in debt until it refills.
+      self._tokens -= tokens
+      return wait
+
+  def refund(self, tokens=1):
+    """Puts back `tokens` that were taken but not used."""
+    with self._lock:
+      self._refill()
+      self._tokens = min(self.burst, self._tokens + tokens)
+
+  def delay(self, tokens=1):
+    """Returns how many seconds until `tokens` are available."""
+    with self._lock:
+      self._refill()
+      missing = tokens - self._tokens
+      return max(missing / self.rate, 0.0) if self.rate else float('inf')
+
+
+class CircuitBreaker:
+  """Opens after consecutive failures, then lets one trial request through.
+
+  Args:
+    failure_threshold: Consecutive failures that open the circuit.
+    reset_timeout: Seconds an open circuit rejects requests before a single
+        trial request is let through (the "half open" state). The circuit
+        closes if the trial succeeds and opens again otherwise.
+    clock: A function returning the current time in seconds.
+  """
+
+  CLOSED = 'closed'
+  OPEN = 'open'
+  HALF_OPEN = 'half_open'
+
+  def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+               reset_timeout=DEFAULT_RESET_TIMEOUT, clock=time.monotonic):
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self.clock = clock
+    self.state = CircuitBreaker.CLOSED
+    self.failures = 0
+    self.opened_at = None
+    self.trips = 0
+    self._lock = Lock()
+
+  def _can_try(self):
+    # Must be called with `self._lock` held.
+    if self.state == CircuitBreaker.CLOSED:
+      return True
+    if self.state == CircuitBreaker.OPEN:
+      return self.clock() - self.opened_at >= self.reset_timeout
+    return False  # The half open trial is still in flight.
+
+  def allows(self):
+    """Returns whether a request would be let through, without starting one."""
+    with self._lock:
+      return self._can_try()
+
+  def allow(self):
+    """Returns whether a request may be sent now, starting the trial if half open."""
+    with self._lock:
+      if not self._can_try():
+        return False
+      if self.state == CircuitBreaker.OPEN:
+        self.state = CircuitBreaker.HALF_OPEN
+      return True
+
+  def record_success(self):
+    with self._lock:
+      self.failures = 0
+      self.state = CircuitBreaker.CLOSED
+
+  def record_failure(self):
+    with self._lock:
+      self.failures += 1
+      if self.state == CircuitBreaker.HALF_OPEN or self.failures >= self.failure_threshold:
+        if self.state != CircuitBreaker.OPEN:
+          self.trips += 1
+        self.state = CircuitBreaker.OPEN
+        self.opened_at = self.clock()
+
+
+class HostGuard:
+  """A token bucket and a circuit breaker per upstream host.
+
+  Args:
+    rate: Requests per second allowed per host, or None for no rate limit.
+    burst: The largest burst of requests allowed per host.
+    failure_threshold: See `CircuitBreaker`.
+    reset_timeout: See `CircuitBreaker`.
+    overrides: Optional `{host : {'rate' : ..., 'burst' : ...}}` settings for
+        individual hosts.
+    clock: A function returning the current time in seconds.
+  """
+
+  def __init__(self, rate=DEFAULT_HOST_RATE, burst=DEFAULT_HOST_BURST,
+               failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+               reset_timeout=DEFAULT_RESET_TIMEOUT, overrides=None, clock=time.monotonic):
+    self.rate = rate
+    self.burst = burst
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self.overrides = overrides or {}
+    self.clock = clock
+    self._hosts = {}  # host -> (TokenBucket or None, CircuitBreaker)
+    self._rejected = {}  # (host, reason) -> count
+    self._lock = Lock()
+
+  def _host(self, host):
+    with self._lock:
+      entry = self._hosts.get(host)
+      if entry is None:
+        settings = self.overrides.get(host, {})
+        rate = settings.get('rate', self.rate)
+        bucket = None
+        if rate is not None:
+          bucket = TokenBucket(rate, settings.get('burst', self.burst), clock=self.clock)
+        breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout, clock=self.clock)
+        entry = self._hosts[host] = (bucket, breaker)
+      return entry
+
+  def allows(self, host):
+    """Returns whether the circuit of `host` would let a request through."""
+    return self._host(host)[1].allows()
+
+  def acquire(self, host):
+    """Admits a request to `host` right now.
+
+    Returns:
+      None if the request may be sent, or else the reason it is rejected
+      (`CIRCUIT_OPEN` or `RATE_LIMITED`). An admitted request must be
+      followed by a call to `record`.
+    """
+    return self.reserve(host)[0]
+
+  def reserve(self, host, max_wait=0.0):
+    """Admits a request to `host`, possibly after a delay of up to `max_wait` seconds.
+
+    Returns:
+      A `(reason, delay)` tuple. `reason` is None if the request may be sent
+      after `delay` seconds, or else the reason it is rejected
+      (`CIRCUIT_OPEN` or `RATE_LIMITED`). An admitted request must be
+      followed by a call to `record`.
+    """
+    bucket, breaker = self._host(host)
+    reason = None
+    delay = 0.0
+    if not breaker.allows():
+      reason = CIRCUIT_OPEN
+    else:
+      if bucket is not None:
+        delay = bucket.reserve(max_wait=max_wait)
+      if delay is None:
+        reason = RATE_LIMITED
+      elif not breaker.allow():
+        # E.g. another request started the half open trial since `allows`.
+        if bucket is not None:
+          bucket.refund()
+        reason = CIRCUIT_OPEN
+    if reason:
+      with self._lock:
+        self._rejected[host, reason] = self._rejected.get((host, reason), 0) + 1
+      return reason, 0.0
+    return None, delay
+
+  def record(self, host, success):
+    """Records the outcome of an admitted request to `host`."""
+    breaker = self._host(host)[1]
+    if success:
+      breaker.record_success()
+    else:
+      breaker.record_failure()
+
+  def get_stats(self):
+    with self._lock:
+      hosts = dict(self._hosts)
+      rejected = dict(self._rejected)
+    return {
+      host : {
+        'state' : breaker.state,
+        'consecutive_failures' : breaker.failures,
+        'trips' : breaker.trips,
+        CIRCUIT_OPEN : rejected.get((host, CIRCUIT_OPEN), 0),
+        RATE_LIMITED : rejected.get((host, RATE_LIMITED), 0),
+      }
+      for host, (_, breaker) in sorted(hosts.items())
+    }
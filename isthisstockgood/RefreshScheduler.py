@@ -0,0 +1,307 @@
+"""Keeps a watchlist of tickers warm in the `ResultCache`.
+
+Without it every first lookup (and every lookup after the TTL) pays the full
+upstream latency. The `RefreshScheduler` re-runs the `DataFetcher` pipeline for
+the watched tickers in the background, on two cadences:
+- quotes, which only refetch the MSN quote (the other sources are served from
+  the `SourceCache`), every few minutes;
+- fundamentals, which refetch every source, once a day.
+
+Due refreshes are started most urgent first, where urgency is how overdue a
+refresh is (in multiples of its interval) times the ticker's popularity. Each
+upstream host gets a concurrency limit and a token bucket rate limit, and a
+refresh only starts once every host it touches has room for it. Results are
+written into the `ResultCache` that `/search` reads from.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from isthisstockgood.Active.MSNMoney import MSNMoney
+from isthisstockgood.Active.YahooFinance import YahooFinanceAnalysis
+from isthisstockgood.Active.Zacks import Zacks
+from isthisstockgood.RateLimiter import TokenBucket
+from isthisstockgood.ResultCache import normalize_ticker
+from isthisstockgood.SourceCache import MINUTE, DAY, get_source_cache
+
+logger = logging.getLogger("IsThisStockGood")
+
+# A refresh kind, the `SourceCache` kinds it expires and the hosts it fetches from.
+RefreshKind = namedtuple('RefreshKind', ['name', 'source_kinds', 'hosts'])
+
+
+def _host_of(url):
+  return urlparse(url).hostname
+
+
+_MSN_HOSTS = tuple(sorted({
+  _host_of(MSNMoney.TICKER_URL),
+  _host_of(MSNMoney.KEY_RATIOS_URL),
+  _host_of(MSNMoney.QUOTES_URL),
+  _host_of(MSNMoney.ANNUAL_STATEMENTS_URL),
+}))
+
+QUOTES = RefreshKind('quotes', ('msn_quotes',), (_host_of(MSNMoney.QUOTES_URL),))
+FUNDAMENTALS = RefreshKind(
+  'fundamentals',
+  ('msn_quotes', 'msn_ratios', 'msn_annual_report', 'yahoo_analysis', 'zacks_analysis'),
+  _MSN_HOSTS + (_host_of(YahooFinanceAnalysis.URL_TEMPLATE), _host_of(Zacks('').url)),
+)
+
+# Inside the default `ResultCache` TTL, so watched tickers are never stale.
+DEFAULT_QUOTES_INTERVAL = 4 * MINUTE
+DEFAULT_FUNDAMENTALS_INTERVAL = DAY
+# How long to wait before retrying a failed refresh.
+DEFAULT_RETRY_INTERVAL = 5 * MINUTE
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_HOST_CONCURRENCY = 2
+# Refreshes per second and burst size allowed per host.
+DEFAULT_HOST_RATE = 1.0
+DEFAULT_HOST_BURST = 5
+DEFAULT_TICK = 1.0
+
+
+class _WatchedTicker:
+
+  def __init__(self, ticker, popularity):
+    self.ticker = ticker
+    self.popularity = popularity
+    self.refreshed_at = {}  # Refresh kind name -> time.
+    # A failed refresh postpones every refresh of the ticker until then.
+    self.retry_at = 0
+    self.running = False
+
+
+class RefreshScheduler:
+  """Refreshes the watched tickers into `result_cache` in the background.
+
+  Args:
+    fetch: The `fetchDataForTickerSymbol` style function to run.
+    result_cache: The `ResultCache` to write results into.
+    watchlist: Optional tickers, or a `{ticker : popularity}` dictionary.
+    source_cache: The `SourceCache` to expire the sources of before each refresh.
+        Defaults to the process-wide one.
+    quotes_interval: Seconds between quote refreshes of a ticker.
+    fundamentals_interval: Seconds between full refreshes of a ticker.
+    retry_interval: Seconds to wait after a failed refresh.
+    max_workers: The most refreshes running at once overall.
+    host_concurrency: The most refreshes running at once per upstream host.
+    host_rate: Refreshes started per second per upstream host.
+    host_burst: The most refreshes started at once per upstream host.
+    tick: Seconds between scheduling rounds of the background thread.
+    clock: A function returning the current time in seconds.
+  """
+
+  def __init__(self, fetch, result_cache, watchlist=None, source_cache=None,
+               quotes_interval=DEFAULT_QUOTES_INTERVAL,
+               fundamentals_interval=DEFAULT_FUNDAMENTALS_INTERVAL,
+               retry_interval=DEFAULT_RETRY_INTERVAL, max_workers=DEFAULT_MAX_WORKERS,
+               host_concurrency=DEFAULT_HOST_CONCURRENCY, host_rate=DEFAULT_HOST_RATE,
+               host_burst=DEFAULT_HOST_BURST, tick=DEFAULT_TICK, clock=time.time):
+    self.fetch = fetch
+    self.result_cache = result_cache
+    self.source_cache = source_cache if source_cache is not None else get_source_cache()
+    self.intervals = {QUOTES.name : quotes_interval, FUNDAMENTALS.name : fundamentals_interval}
+    self.retry_interval = retry_interval
+    self.max_workers = max_workers
+    self.host_concurrency = host_concurrency
+    self.host_rate = host_rate
+    self.host_burst = host_burst
+    self.tick = tick
+    self.clock = clock
+    self._watched = {}
+    self._running_per_host = {}
+    self._buckets = {}
+    self._running = 0
+    self._stats = {'refreshes' : 0, 'failures' : 0, 'rate_limited' : 0}
+    self._lock = threading.Lock()
+    self._idle = threading.Condition(self._lock)
+    self._executor = ThreadPoolExecutor(
+      max_workers=max_workers,
+      thread_name_prefix='IsThisStockGood-scheduler'
+    )
+    self._stop = threading.Event()
+    self._thread = None
+    if isinstance(watchlist, dict):
+      for ticker, popularity in watchlist.items():
+        self.watch(ticker, popularity)
+    else:
+      for ticker in watchlist or ():
+        self.watch(ticker)
+
+  def watch(self, ticker, popularity=1):
+    """Adds the `ticker` to the watchlist, or updates its popularity."""
+    key = normalize_ticker(ticker)
+    if not key:
+      return
+    with self._lock:
+      entry = self._watched.get(key)
+      if entry is None:
+        self._watched[key] = _WatchedTicker(key, popularity)
+      else:
+        entry.popularity = popularity
+
+  def unwatch(self, ticker):
+    with self._lock:
+      self._watched.pop(normalize_ticker(ticker), None)
+
+  def record_lookup(self, ticker):
+    """Counts a user lookup of the `ticker` towards its popularity, if it is watched."""
+    with self._lock:
+      entry = self._watched.get(normalize_ticker(ticker))
+      if entry is not None:
+        entry.popularity += 1
+
+  def watchlist(self):
+    """Returns the watched tickers and their popularity."""
+    with self._lock:
+      return {ticker : entry.popularity for ticker, entry in self._watched.items()}
+
+  def _last_refresh(self, entry, kind, now):
+    refreshed_at = entry.refreshed_at.get(kind.name)
+    if kind is QUOTES:
+      # A lookup through `/search` fetches fresh quotes as well.
+      age = self.result_cache.age_of(entry.ticker)
+      if age is not None:
+        refreshed_at = max(refreshed_at or 0, now - age)
+      fundamentals_at = entry.refreshed_at.get(FUNDAMENTALS.name)
+      if fundamentals_at is not None:
+        refreshed_at = max(refreshed_at or 0, fundamentals_at)
+    return refreshed_at
+
+  def _due(self, now):
+    """Returns the due `(priority, popularity, ticker, kind)` refreshes, most urgent first."""
+    due = []
+    for entry in self._watched.values():
+      if entry.running or entry.retry_at > now:
+        continue
+      # A full refresh fetches quotes too, so it takes precedence.
+      for kind in (FUNDAMENTALS, QUOTES):
+        interval = self.intervals[kind.name]
+        refreshed_at = self._last_refresh(entry, kind, now)
+        if refreshed_at is None:
+          staleness = float('inf')
+        elif now - refreshed_at >= interval:
+          staleness = (now - refreshed_at) / interval
+        else:
+          continue
+        due.append((staleness * entry.popularity, entry.popularity, entry.ticker, kind))
+        break
+    # Ties (e.g. never refreshed tickers) go to the more popular one.
+    return heapq.nlargest(len(due), due, key=lambda job: job[:2])
+
+  def _bucket(self, host):
+    bucket = self._buckets.get(host)
+    if bucket is None:
+      bucket = self._buckets[host] = TokenBucket(self.host_rate, self.host_burst)
+    return bucket
+
+  def _try_reserve(self, kind):
+    # Must be called with `self._lock` held.
+    hosts = kind.hosts
+    if any(self._running_per_host.get(host, 0) >= self.host_concurrency for host in hosts):
+      return False
+    if any(self._bucket(host).available() < 1 for host in hosts):
+      self._stats['rate_limited'] += 1
+      return False
+    for host in hosts:
+      self._bucket(host).try_acquire()
+      self._running_per_host[host] = self._running_per_host.get(host, 0) + 1
+    return True
+
+  def _release(self, kind):
+    # Must be called with `self._lock` held.
+    for host in kind.hosts:
+      self._running_per_host[host] -= 1
+
+  def run_pending(self):
+    """Starts as many due refreshes as the limits allow. Returns how many started."""
+    started = 0
+    with self._lock:
+      now = self.clock()
+      for _, _, ticker, kind in self._due(now):
+        if self._running >= self.max_workers:
+          break
+        if not self._try_reserve(kind):
+          continue
+        entry = self._watched[ticker]
+        entry.running = True
+        self._running += 1
+        self._executor.submit(self._refresh, entry, kind)
+        started += 1
+    return started
+
+  def _refresh(self, entry, kind):
+    template_values = None
+    try:
+      for source_kind in kind.source_kinds:
+        # Expired rather than deleted, so a failed refetch falls back to them.
+        self.source_cache.expire(source_kind, entry.ticker)
+      template_values = self.fetch(entry.ticker)
+      if template_values:
+        self.result_cache.put(entry.ticker, template_values)
+    except Exception as e:
+      logger.warning(f'Scheduled {kind.name} refresh failed for {entry.ticker}: {e}')
+    finally:
+      with self._lock:
+        self._release(kind)
+        entry.running = False
+        now = self.clock()
+        # A partial result is retried like a failed refresh.
+        if template_values and not template_values.get('missing_sources'):
+          entry.refreshed_at[kind.name] = now
+          self._stats['refreshes'] += 1
+        else:
+          entry.retry_at = now + self.retry_interval
+          self._stats['failures'] += 1
+        self._running -= 1
+        self._idle.notify_all()
+
+  def join(self, timeout=None):
+    """Waits for the running refreshes to finish. Returns False on a timeout."""
+    with self._idle:
+      return self._idle.wait_for(lambda: not self._running, timeout=timeout)
+
+  def start(self):
+    """Starts the background scheduling thread."""
+    if self._thread is not None:
+      return
+    self._stop.clear()
+    self._thread = threading.Thread(
+      target=self._run,
+      name='IsThisStockGood-scheduler',
+      daemon=True
+    )
+    self._thread.start()
+
+  def _run(self):
+    while not self._stop.wait(self.tick):
+      try:
+        self.run_pending()
+      except Exception as e:
+        logger.warning(f'Refresh scheduling failed: {e}')
+
+  def stop(self, wait=True):
+    """Stops scheduling, and optionally waits for the running refreshes."""
+    self._stop.set()
+    if self._thread is not None:
+      self._thread.join()
+      self._thread = None
+    if wait:
+      self.join()
+    self._executor.shutdown(wait=wait)
+
+  def get_stats(self):
+    with self._lock:
+      stats = dict(self._stats)
+      stats.update({
+        'watched' : len(self._watched),
+        'running' : self._running,
+        'running_per_host' : {host : count for host, count in self._running_per_host.items() if count},
+      })
+      return stats
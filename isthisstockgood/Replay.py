@@ -0,0 +1,456 @@
+"""Records and replays upstream HTTP responses so the pipeline can run offline.
+
+Recordings are stored one JSON file per URL (named by the SHA-1 of the URL)
+holding the status code, headers and body. A `ReplayServer` serves them from a
+local HTTP server with configurable latency and failure injection, and mounting
+a `ReplayAdapter` on the `SessionPool` redirects every MSN, Yahoo and Zacks
+request to that server. `build_synthetic_recordings` produces realistic
+payloads for any number of made up tickers, so no network access is needed
+at all.
+
+Usage:
+  python -m isthisstockgood.Replay record --dir recordings AAPL MSFT
+  python -m isthisstockgood.Replay synthesize --dir recordings --count 100
+  python -m isthisstockgood.Replay serve --dir recordings --latency 0.05
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import string
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+from requests.structures import CaseInsensitiveDict
+
+from isthisstockgood.Active.MSNMoney import MSNMoney
+from isthisstockgood.Active.YahooFinance import YahooFinanceAnalysis
+from isthisstockgood.Active.Zacks import Zacks
+from isthisstockgood.SessionPool import CountingHTTPAdapter
+
+# Headers that describe the original transfer rather than the content.
+_HOP_BY_HOP_HEADERS = {
+  'connection', 'content-encoding', 'content-length', 'keep-alive',
+  'transfer-encoding',
+}
+
+
+def recording_key(url):
+  return hashlib.sha1(url.encode('utf8')).hexdigest()
+
+
+class Recording:
+  """A single recorded response."""
+
+  def __init__(self, url, status, body, headers=None):
+    self.url = url
+    self.status = status
+    self.body = body
+    self.headers = {
+      name : value for name, value in (headers or {}).items()
+      if name.lower() not in _HOP_BY_HOP_HEADERS
+    }
+
+  def as_dict(self):
+    return {'url' : self.url, 'status' : self.status, 'headers' : self.headers, 'body' : self.body}
+
+
+class RecordingStore:
+  """Thread-safe recordings keyed by URL, optionally persisted to a directory.
+
+  Args:
+    directory: Optional directory of `<sha1(url)>.json` files to load from and
+        save new recordings to.
+  """
+
+  def __init__(self, directory=None):
+    self.directory = directory
+    self._recordings = {}
+    self._lock = threading.Lock()
+    if directory and os.path.isdir(directory):
+      for name in os.listdir(directory):
+        if not name.endswith('.json'):
+          continue
+        with open(os.path.join(directory, name), encoding='utf8') as f:
+          data = json.load(f)
+        self._recordings[data['url']] = Recording(
+          data['url'], data['status'], data['body'], data.get('headers'))
+
+  def __len__(self):
+    return len(self._recordings)
+
+  def __iter__(self):
+    with self._lock:
+      return iter(list(self._recordings.values()))
+
+  def get(self, url):
+    with self._lock:
+      return self._recordings.get(url)
+
+  def add(self, recording):
+    with self._lock:
+      self._recordings[recording.url] = recording
+    if self.directory:
+      os.makedirs(self.directory, exist_ok=True)
+      path = os.path.join(self.directory, recording_key(recording.url) + '.json')
+      with open(path, 'w', encoding='utf8') as f:
+        json.dump(recording.as_dict(), f)
+
+  def add_many(self, recordings):
+    for recording in recordings:
+      self.add(recording)
+
+
+def synthetic_tickers(count):
+  """Returns `count` distinct, made up, upper-case ticker symbols."""
+  letters = string.ascii_uppercase
+  tickers = []
+  for i in range(count):
+    symbol = ''
+    i += len(letters)  # Start at two letter symbols.
+    while i:
+      i, remainder = divmod(i, len(letters))
+      symbol = letters[remainder] + symbol
+    tickers.append('Z' + symbol)
+  return tickers
+
+
+# Stand-ins for the many other metrics in real key ratios payloads, which the
+# parsers never read.
+_UNUSED_METRICS = (
+  'returnOnAssets', 'returnOnEquity', 'grossMargin', 'operatingMargin',
+  'netMargin', 'currentRatio', 'quickRatio', 'priceToBookRatio',
+  'priceToSalesRatio', 'priceToCashFlowRatio', 'dividendYield',
+  'payoutRatio', 'assetTurnover', 'inventoryTurnover', 'interestCoverage',
+)
+
+
+def _synthetic_unused_metrics(rng):
+  return {name : round(rng.uniform(-50, 150), 4) for name in _UNUSED_METRICS}
+
+
+def _synthetic_company_recordings(ticker, rng):
+  msn_money = MSNMoney(ticker)
+  sec_id = 'a' + hashlib.sha1(ticker.encode('utf8')).hexdigest()[:5]
+  recordings = []
+
+  autocomplete = {'data' : {'stocks' : [
+    json.dumps({'RT00S' : msn_money.ticker_symbol + 'X', 'SecId' : sec_id + 'x', 'Description' : ''}),
+    json.dumps({'RT00S' : msn_money.ticker_symbol, 'SecId' : sec_id,
+                'Description' : f'{ticker} Corp. is a synthetic company used for offline benchmarks.'}),
+  ]}}
+  recordings.append((msn_money.get_ticker_autocomplete_url(), autocomplete))
+
+  # Ten years of steadily (but noisily) growing per share numbers.
+  growth = rng.uniform(0.04, 0.2)
+  eps = rng.uniform(0.5, 8.0)
+  book_value = eps * rng.uniform(3, 10)
+  revenue = eps * rng.uniform(4, 15)
+  metrics = []
+  industry_metrics = []
+  for year in range(2014, 2024):
+    eps *= 1 + growth + rng.uniform(-0.03, 0.03)
+    book_value *= 1 + growth + rng.uniform(-0.03, 0.03)
+    revenue *= 1 + growth + rng.uniform(-0.03, 0.03)
+    metrics.append({
+      'fiscalPeriodType' : 'Annual',
+      'year' : str(year),
+      'priceToEarningsRatio' : round(rng.uniform(10, 40), 2),
+      'earningsPerShare' : round(eps, 2),
+      'freeCashFlowPerShare' : round(eps * rng.uniform(0.8, 1.3), 2),
+      'bookValuePerShare' : round(book_value, 2),
+      'revenuePerShare' : round(revenue, 2),
+      'roic' : round(rng.uniform(5, 35), 2),
+      **_synthetic_unused_metrics(rng),
+    })
+    industry_metrics.append({
+      'fiscalPeriodType' : 'Annual',
+      'year' : str(year),
+      'priceToEarningsRatio' : round(rng.uniform(10, 40), 2),
+      'roic' : round(rng.uniform(5, 35), 2),
+      **_synthetic_unused_metrics(rng),
+    })
+  for quarter in range(1, 9):
+    metrics.append({
+      'fiscalPeriodType' : f'Q{(quarter - 1) % 4 + 1}',
+      'earningsPerShare' : round(eps / 4 * rng.uniform(0.9, 1.1), 2),
+      'debtToEquityRatio' : round(rng.uniform(0, 150), 2),
+      **_synthetic_unused_metrics(rng),
+    })
+  key_ratios = {
+    'displayName' : f'{ticker} Corp.',
+    'industry' : rng.choice(['Software', 'Semiconductors', 'Retail', 'Banks', 'Utilities']),
+    'companyMetrics' : metrics,
+    'industryMetrics' : industry_metrics,
+  }
+  recordings.append((msn_money.get_key_ratios_url(sec_id), key_ratios))
+
+  shares_outstanding = rng.uniform(1e8, 1e10)
+  price = eps * rng.uniform(10, 40)
+  quotes = [{
+    'price' : round(price, 2),
+    'averageVolume' : round(rng.uniform(1e5, 1e8)),
+    'marketCap' : price * shares_outstanding,
+  }]
+  recordings.append((msn_money.get_quotes_url(sec_id), quotes))
+
+  equities = [{'analysis' : {'annualStatements' : {
+    str(year) : {
+      'longTermDebt' : round(rng.uniform(0, 5e10)),
+      'sharesOutstanding' : shares_outstanding,
+    } for year in range(2021, 2024)
+  }}}]
+  recordings.append((msn_money.get_annual_statements_url(sec_id), equities))
+
+  result = [Recording(url, 200, json.dumps(body), {'Content-Type' : 'application/json'})
+            for url, body in recordings]
+
+  analyst_growth_rate = round(rng.uniform(2, 25), 2)
+  yahoo_page = (
+    '<html><head><title>Analysis</title></head><body><table><tbody>'
+    '<tr><td><span>Current Year</span></td><td>5.10%</td></tr>'
+    '<tr><td><span>Next 5 Years (per annum)</span></td>'
+    f'<td>{analyst_growth_rate}%</td></tr>'
+    '</tbody></table></body></html>'
+  )
+  result.append(Recording(YahooFinanceAnalysis(ticker).url, 200, yahoo_page,
+                          {'Content-Type' : 'text/html; charset=utf-8'}))
+
+  zacks_page = (
+    'Growth Estimates\n'
+    'Current Qtr\n5.20%\n'
+    'Next 5 Years\n'
+    f'{round(rng.uniform(2, 25), 2)}%\n'
+  )
+  result.append(Recording(Zacks(ticker).url, 200, zacks_page,
+                          {'Content-Type' : 'text/html; charset=utf-8'}))
+  return result
+
+
+def build_synthetic_recordings(tickers, seed=0):
+  """Builds MSN, Yahoo and Zacks recordings for made up `tickers`."""
+  rng = random.Random(seed)
+  recordings = []
+  for ticker in tickers:
+    recordings.extend(_synthetic_company_recordings(ticker, rng))
+  return recordings
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+  # Headers and body are written separately, which would otherwise stall on
+  # delayed ACKs and add ~40ms to every keep-alive response.
+  disable_nagle_algorithm = True
+
+  def do_GET(self):
+    self.server.replay.handle(self)
+
+  def log_message(self, *args):
+    pass
+
+
+class ReplayServer:
+  """Serves recorded responses on `127.0.0.1` at `<url>/replay?url=<original>`.
+
+  Args:
+    store: The `RecordingStore` to serve.
+    latency: Seconds to wait before answering each request.
+    jitter: Up to this many additional, uniformly random, seconds of latency.
+    host_latency: Optional `{host : seconds}` of additional latency for the
+        requests to individual upstream hosts.
+    stall_rate: The fraction of requests that stall, e.g. on a bad connection.
+    stall_latency: The additional seconds of latency of a stalled request.
+    failure_rate: The fraction of requests answered with `failure_status`.
+    failure_status: The HTTP status of injected failures.
+    port: The port to listen on. An unused port is chosen by default.
+    seed: Seeds the jitter and failure injection for reproducible runs.
+  """
+
+  def __init__(self, store, latency=0.0, jitter=0.0, failure_rate=0.0,
+               failure_status=503, port=0, seed=0, host_latency=None,
+               stall_rate=0.0, stall_latency=1.0):
+    self.store = store
+    self.latency = latency
+    self.jitter = jitter
+    self.host_latency = host_latency or {}
+    self.stall_rate = stall_rate
+    self.stall_latency = stall_latency
+    self.failure_rate = failure_rate
+    self.failure_status = failure_status
+    self.requests = 0
+    self.misses = 0
+    self.failures = 0
+    self._random = random.Random(seed)
+    self._lock = threading.Lock()
+    self._server = ThreadingHTTPServer(('127.0.0.1', port), _ReplayHandler)
+    self._server.daemon_threads = True
+    self._server.replay = self
+    self._thread = None
+
+  @property
+  def url(self):
+    return f'http://127.0.0.1:{self._server.server_address[1]}'
+
+  def start(self):
+    self._thread = threading.Thread(
+      target=self._server.serve_forever,
+      name='IsThisStockGood-replay',
+      daemon=True
+    )
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self._server.shutdown()
+    self._server.server_close()
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *args):
+    self.stop()
+
+  def handle(self, handler):
+    original_url = parse_qs(urlparse(handler.path).query).get('url', [''])[0]
+    with self._lock:
+      self.requests += 1
+      delay = self.latency + self._random.uniform(0, self.jitter) + \
+          self.host_latency.get(urlparse(original_url).hostname, 0.0)
+      if self.stall_rate and self._random.random() < self.stall_rate:
+        delay += self.stall_latency
+      fail = self._random.random() < self.failure_rate
+      if fail:
+        self.failures += 1
+    if delay > 0:
+      time.sleep(delay)
+
+    recording = None if fail else self.store.get(original_url)
+    if fail:
+      status, headers, body = self.failure_status, {}, b''
+    elif recording is None:
+      with self._lock:
+        self.misses += 1
+      status, headers, body = 404, {}, b''
+    else:
+      status, headers, body = recording.status, recording.headers, recording.body.encode('utf8')
+
+    handler.send_response(status)
+    for name, value in headers.items():
+      handler.send_header(name, value)
+    handler.send_header('Content-Length', str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+  def get_stats(self):
+    with self._lock:
+      return {'requests' : self.requests, 'misses' : self.misses, 'failures' : self.failures}
+
+
+class ReplayAdapter(CountingHTTPAdapter):
+  """Redirects every request to a `ReplayServer`.
+
+  Mount it with `SessionPool(adapter_class=functools.partial(ReplayAdapter,
+  server_url=server.url))`. Responses keep the original URL.
+  """
+
+  def __init__(self, stats, server_url, **kwargs):
+    self.server_url = server_url.rstrip('/')
+    super().__init__(stats, **kwargs)
+
+  def send(self, request, **kwargs):
+    original_url = request.url
+    request.url = f'{self.server_url}/replay?url={quote(original_url, safe="")}'
+    response = super().send(request, **kwargs)
+    response.url = original_url
+    request.url = original_url
+    return response
+
+
+class RecordingAdapter(CountingHTTPAdapter):
+  """Performs real requests and saves every response to a `RecordingStore`."""
+
+  def __init__(self, stats, store, **kwargs):
+    self.store = store
+    super().__init__(stats, **kwargs)
+
+  def send(self, request, **kwargs):
+    response = super().send(request, **kwargs)
+    # Reading the content here keeps it available to the response hooks.
+    self.store.add(Recording(request.url, response.status_code, response.text,
+                             dict(CaseInsensitiveDict(response.headers))))
+    return response
+
+
+def record(tickers, directory):
+  """Fetches `tickers` from the live sources, saving every response."""
+  from functools import partial
+
+  from isthisstockgood.DataFetcher import _runDataFetcher
+  from isthisstockgood.SessionPool import SessionPool
+  from isthisstockgood.SourceCache import SourceCache
+  from isthisstockgood.SymbolIndex import SymbolIndex
+
+  store = RecordingStore(directory)
+  session_pool = SessionPool(adapter_class=partial(RecordingAdapter, store=store))
+  try:
+    for ticker in tickers:
+      _runDataFetcher(ticker, session_pool=session_pool,
+                      cache=SourceCache(max_memory_bytes=0), symbol_index=SymbolIndex())
+  finally:
+    session_pool.close()
+  return store
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  subparsers = parser.add_subparsers(dest='command', required=True)
+
+  record_parser = subparsers.add_parser('record', help='Record live responses for tickers.')
+  record_parser.add_argument('--dir', required=True)
+  record_parser.add_argument('tickers', nargs='+')
+
+  synthesize_parser = subparsers.add_parser('synthesize', help='Write synthetic recordings.')
+  synthesize_parser.add_argument('--dir', required=True)
+  synthesize_parser.add_argument('--count', type=int, default=100)
+  synthesize_parser.add_argument('--seed', type=int, default=0)
+
+  serve_parser = subparsers.add_parser('serve', help='Serve recordings until interrupted.')
+  serve_parser.add_argument('--dir', required=True)
+  serve_parser.add_argument('--port', type=int, default=8001)
+  serve_parser.add_argument('--latency', type=float, default=0.0)
+  serve_parser.add_argument('--jitter', type=float, default=0.0)
+  serve_parser.add_argument('--failure-rate', type=float, default=0.0)
+  serve_parser.add_argument('--failure-status', type=int, default=503)
+
+  args = parser.parse_args()
+  if args.command == 'record':
+    store = record(args.tickers, args.dir)
+    print(f'Recorded {len(store)} responses to {args.dir}')
+  elif args.command == 'synthesize':
+    store = RecordingStore(args.dir)
+    store.add_many(build_synthetic_recordings(synthetic_tickers(args.count), seed=args.seed))
+    print(f'Wrote {len(store)} recordings to {args.dir}')
+  else:
+    server = ReplayServer(
+      RecordingStore(args.dir),
+      latency=args.latency,
+      jitter=args.jitter,
+      failure_rate=args.failure_rate,
+      failure_status=args.failure_status,
+      port=args.port
+    )
+    print(f'Serving {len(server.store)} recordings at {server.url}/replay?url=...')
+    with server:
+      try:
+        while True:
+          time.sleep(3600)
+      except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,182 @@
+"""Caches complete `fetchDataForTickerSymbol` results for the Flask app.
+
+In stale-while-revalidate mode an expired result is still served immediately,
+flagged with its age, while a single background refresh per ticker fetches a
+new one. Hot symbols are then never blocked on upstream response times.
+
+Refreshes run on a small, bounded pool of threads. Every casing of a ticker
+shares one entry, but each response echoes the ticker as it was requested.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from isthisstockgood.Serializer import encode_stock_data
+
+logger = logging.getLogger("IsThisStockGood")
+
+# How long, in seconds, a result is considered fresh.
+DEFAULT_TTL = 5 * 60
+# How long, in seconds, past its TTL an expired result may still be served.
+DEFAULT_MAX_STALE = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_MAX_REFRESHES = 4
+
+# `template_values` is None for invalid tickers. `age` is in seconds. `body`
+# is the `EncodedBody` of the template values, if they were encoded already.
+CachedResult = namedtuple('CachedResult', ['template_values', 'age', 'stale', 'body'],
+                          defaults=(None,))
+
+
+def normalize_ticker(ticker):
+  return ticker.strip().upper() if ticker else ''
+
+
+def _as_requested(ticker, result):
+  """Returns `result` with the ticker spelled as in this request."""
+  template_values = result.template_values
+  if template_values.get('ticker') == ticker:
+    return result
+  template_values = dict(template_values, ticker=ticker)
+  return result._replace(template_values=template_values, body=encode_stock_data(template_values))
+
+
+class ResultCache:
+  """An LRU of template values with optional stale-while-revalidate serving.
+
+  Results are encoded when they are stored, so every request serving one
+  reuses the same `EncodedBody`.
+
+  Args:
+    fetch: The `fetchDataForTickerSymbol` style function to populate entries.
+    ttl: Seconds a result stays fresh.
+    max_stale: Seconds an expired result may still be served while it is
+        refreshed in the background. Ignored unless `stale_while_revalidate`.
+    max_entries: The maximum number of tickers to keep.
+    stale_while_revalidate: Whether to serve expired results immediately.
+    max_refreshes: The most background refreshes that run at once. Further
+        refreshes wait for one of them to finish.
+    clock: A function returning the current time in seconds.
+  """
+
+  def __init__(self, fetch, ttl=DEFAULT_TTL, max_stale=DEFAULT_MAX_STALE,
+               max_entries=DEFAULT_MAX_ENTRIES, stale_while_revalidate=True,
+               max_refreshes=DEFAULT_MAX_REFRESHES, clock=time.time):
+    self.fetch = fetch
+    self.ttl = ttl
+    self.max_stale = max_stale
+    self.max_entries = max_entries
+    self.stale_while_revalidate = stale_while_revalidate
+    self.clock = clock
+    self.hits = 0
+    self.stale_hits = 0
+    self.misses = 0
+    self.refreshes = 0
+    self._entries = OrderedDict()  # normalized ticker -> (fetched_at, template_values, body)
+    self._refreshing = {}  # normalized ticker -> `Future` of its refresh
+    self._lock = threading.Lock()
+    self._executor = ThreadPoolExecutor(
+      max_workers=max_refreshes,
+      thread_name_prefix='IsThisStockGood-refresh'
+    )
+
+  def get(self, ticker):
+    """Returns a `CachedResult` for `ticker`, fetching synchronously on a miss."""
+    key = normalize_ticker(ticker)
+    now = self.clock()
+    result = None
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None:
+        fetched_at, template_values, body = entry
+        age = now - fetched_at
+        if age < self.ttl:
+          self._entries.move_to_end(key)
+          self.hits += 1
+          result = CachedResult(template_values, age, False, body)
+        elif self.stale_while_revalidate and age < self.ttl + self.max_stale:
+          self._entries.move_to_end(key)
+          self.stale_hits += 1
+          self._start_refresh(key, ticker)
+          result = CachedResult(template_values, age, True, body)
+      if result is None:
+        self.misses += 1
+    if result is not None:
+      return _as_requested(ticker, result)
+
+    template_values = self.fetch(ticker)
+    body = None
+    if template_values:
+      body = self.put(ticker, template_values)
+    return CachedResult(template_values, 0, False, body)
+
+  def put(self, ticker, template_values, fetched_at=None):
+    """Stores a freshly fetched result for `ticker`.
+
+    A partial result, i.e. one with 'missing_sources', is stored as already
+    expired, so that its next lookup fetches it again.
+
+    Returns:
+      The `EncodedBody` of `template_values`.
+    """
+    key = normalize_ticker(ticker)
+    if fetched_at is None:
+      fetched_at = self.clock()
+      if template_values.get('missing_sources'):
+        fetched_at -= self.ttl
+    body = encode_stock_data(template_values)
+    with self._lock:
+      self._entries[key] = (fetched_at, template_values, body)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+    return body
+
+  def invalidate(self, ticker):
+    with self._lock:
+      self._entries.pop(normalize_ticker(ticker), None)
+
+  def age_of(self, ticker):
+    """Returns the age in seconds of the cached result, or None if absent."""
+    with self._lock:
+      entry = self._entries.get(normalize_ticker(ticker))
+    return None if entry is None else self.clock() - entry[0]
+
+  def join(self, timeout=None):
+    """Waits for the background refreshes in progress. Returns False on a timeout."""
+    with self._lock:
+      refreshes = list(self._refreshing.values())
+    _, not_done = wait(refreshes, timeout=timeout)
+    return not not_done
+
+  def _start_refresh(self, key, ticker):
+    # Must be called with `self._lock` held.
+    if key in self._refreshing:
+      return
+    self.refreshes += 1
+    self._refreshing[key] = self._executor.submit(self._refresh, key, ticker)
+
+  def _refresh(self, key, ticker):
+    try:
+      template_values = self.fetch(ticker)
+      if template_values:
+        self.put(ticker, template_values)
+    except Exception as e:
+      logger.warning(f'Background refresh failed for {ticker}: {e}')
+    finally:
+      with self._lock:
+        self._refreshing.pop(key, None)
+
+  def get_stats(self):
+    with self._lock:
+      return {
+        'entries' : len(self._entries),
+        'hits' : self.hits,
+        'stale_hits' : self.stale_hits,
+        'misses' : self.misses,
+        'refreshes' : self.refreshes,
+        'refreshing' : len(self._refreshing),
+      }
@@ -0,0 +1,276 @@
+"""NumPy-backed, whole-universe versions of the Rule #1 calculations.
+
+Every function mirrors its scalar counterpart in `RuleOneInvestingCalculations`
+but takes array-likes with one row per company, and produces bit-for-bit the
+same floats. Missing inputs may be given as None or NaN. Wherever a scalar
+function would return None, the batch version returns NaN in that row (see
+`to_optional_list` to convert back).
+"""
+
+import numpy as np
+
+import isthisstockgood.RuleOneInvestingCalculations as RuleOne
+
+
+def _as_array(values):
+  """Converts an array-like (possibly containing None) to a float64 array."""
+  return np.array(values, dtype=np.float64, ndmin=1)
+
+
+def _is_truthy(values):
+  """Mirrors the scalar `if not value` checks, treating NaN as None."""
+  return (values != 0) & ~np.isnan(values)
+
+
+def _mask(values, valid):
+  return np.where(valid, values, np.nan)
+
+
+def to_optional_list(values):
+  """Converts a result array to (nested) lists, mapping NaN back to None."""
+  values = np.asarray(values, dtype=np.float64)
+  return np.where(np.isnan(values), None, values).tolist()
+
+
+def conservative_growth_rate(analyst_growth_rates, historical_growth_rates):
+  """
+  Returns the smaller of the analyst and historical growth rates, converted
+  from percentages to decimals (as `DataFetcher` does for a single company).
+  """
+  analyst = _as_array(analyst_growth_rates)
+  historical = _as_array(historical_growth_rates)
+  return np.minimum(analyst, historical) / 100.0
+
+
+def calculate_future_eps(current_eps, estimated_growth_rate, time_horizon=10):
+  """Batch version of `RuleOne.calculate_future_eps`."""
+  eps = _as_array(current_eps)
+  growth_rate = _as_array(estimated_growth_rate)
+  valid = _is_truthy(eps) & _is_truthy(growth_rate)
+  # `float_power` matches `math.pow` exactly, unlike the SIMD `np.power`.
+  with np.errstate(all='ignore'):
+    future_eps = eps * np.float_power(1.0 + growth_rate, time_horizon)
+  return _mask(future_eps, valid)
+
+
+def calculate_future_pe(estimated_growth_rate, historical_low_pe, historical_high_pe):
+  """Batch version of `RuleOne.calculate_future_pe`."""
+  growth_rate = _as_array(estimated_growth_rate)
+  low_pe = _as_array(historical_low_pe)
+  high_pe = _as_array(historical_high_pe)
+  valid = _is_truthy(growth_rate) & _is_truthy(low_pe) & _is_truthy(high_pe)
+  future_pe_one = (low_pe + high_pe) / 2.0
+  future_pe_two = 2.0 * (growth_rate * 100.0)
+  # Python's `min` keeps the first argument on ties, and so does this.
+  conservative_future_pe = np.where(future_pe_two < future_pe_one, future_pe_two, future_pe_one)
+  return _mask(conservative_future_pe, valid)
+
+
+def calculate_estimated_future_price(future_eps, future_pe):
+  """Batch version of `RuleOne.calculate_estimated_future_price`."""
+  eps = _as_array(future_eps)
+  pe = _as_array(future_pe)
+  return _mask(eps * pe, _is_truthy(eps) & _is_truthy(pe))
+
+
+def calculate_sticker_price(future_price, time_horizon=10, rate_of_return=0.15):
+  """Batch version of `RuleOne.calculate_sticker_price`."""
+  price = _as_array(future_price)
+  with np.errstate(all='ignore'):
+    target_growth_rate = np.float_power(1.0 + _as_array(rate_of_return), time_horizon)
+    sticker_price = price / target_growth_rate
+  return _mask(sticker_price, _is_truthy(price))
+
+
+def calculate_margin_of_safety(sticker_price, margin_of_safety=0.5):
+  """Batch version of `RuleOne.calculate_margin_of_safety`."""
+  price = _as_array(sticker_price)
+  return _mask(price * (1 - _as_array(margin_of_safety)), _is_truthy(price))
+
+
+def margin_of_safety_price(current_eps, estimated_growth_rate,
+                           historical_low_pe, historical_high_pe):
+  """
+  Batch version of `RuleOne.margin_of_safety_price`.
+
+  Returns:
+    A `(margin_of_safety_prices, sticker_prices)` tuple of arrays.
+  """
+  eps = _as_array(current_eps)
+  growth_rate = _as_array(estimated_growth_rate)
+  low_pe = _as_array(historical_low_pe)
+  high_pe = _as_array(historical_high_pe)
+  valid = _is_truthy(eps) & _is_truthy(growth_rate) & _is_truthy(low_pe) & _is_truthy(high_pe)
+
+  future_eps = calculate_future_eps(eps, growth_rate)
+  future_pe = calculate_future_pe(growth_rate, low_pe, high_pe)
+  future_price = calculate_estimated_future_price(future_eps, future_pe)
+  sticker_price = _mask(calculate_sticker_price(future_price), valid)
+  margin_of_safety = calculate_margin_of_safety(sticker_price)
+  return margin_of_safety, sticker_price
+
+
+def payback_time(market_cap, net_income, estimated_growth_rate, max_years=None):
+  """
+  Batch version of `RuleOne.payback_time`.
+
+  Uses the same closed-form geometric series solution, only falling back to
+  the year-by-year loop for rows whose market cap sits within floating point
+  noise of a year boundary. Rows with missing (None/NaN) or infinite inputs,
+  or a non-positive income or growth rate, return -1 like the scalar
+  function, as do rows whose payback exceeds `max_years`.
+
+  Returns:
+    An int64 array with the number of years for each company.
+  """
+  market_cap = _as_array(market_cap)
+  net_income = _as_array(net_income)
+  growth_rate = _as_array(estimated_growth_rate)
+  market_cap, net_income, growth_rate = np.broadcast_arrays(market_cap, net_income, growth_rate)
+
+  years = np.zeros(market_cap.shape, dtype=np.int64)
+  missing = ~np.isfinite(market_cap) | ~np.isfinite(net_income) | ~np.isfinite(growth_rate)
+  # The scalar loop only runs while the payback is below the market cap, and
+  # then rejects non-positive incomes or growth rates on its first iteration.
+  needs_payback = ~missing & (market_cap > 0)
+  invalid = needs_payback & ((net_income <= 0) | (growth_rate <= 0))
+  years[missing | invalid] = -1
+
+  rows = np.flatnonzero(needs_payback & ~invalid)
+  target = market_cap[rows]
+  income = net_income[rows]
+  rates = growth_rate[rows]
+  with np.errstate(all='ignore'):
+    log_growth = np.log1p(rates)
+    ratio = target * rates / (income * (1.0 + rates))
+    estimate = np.maximum(1.0, np.ceil(np.log1p(ratio) / log_growth))
+
+    def cumulative_payback(count):
+      return income * (1.0 + rates) * np.expm1(count * log_growth) / rates
+
+    previous_total = np.where(estimate > 1, cumulative_payback(estimate - 1), 0.0)
+    total = cumulative_payback(estimate)
+    tolerance = np.maximum(RuleOne._PAYBACK_TIME_TOLERANCE, 8 * estimate * np.finfo(np.float64).eps) * target
+    ambiguous = ~np.isfinite(estimate) | (log_growth <= 0) | (estimate > 2 ** 53) \
+        | ~np.isfinite(total) | (np.abs(total - target) <= tolerance) \
+        | ((estimate > 1) & (np.abs(previous_total - target) <= tolerance)) \
+        | ~(previous_total < target) | ~(total >= target)
+
+  resolved = rows[~ambiguous]
+  years[resolved] = estimate[~ambiguous].astype(np.int64)
+  if max_years is not None:
+    years[resolved[years[resolved] > max_years]] = -1
+
+  years[rows[ambiguous]] = _payback_time_iterative(
+      market_cap[rows[ambiguous]], net_income[rows[ambiguous]],
+      growth_rate[rows[ambiguous]], max_years)
+  return years
+
+
+def _payback_time_iterative(market_cap, net_income, estimated_growth_rate, max_years=None):
+  """The exact year-by-year loop, vectorized over rows that need a payback."""
+  years = np.zeros(market_cap.shape, dtype=np.int64)
+  active = np.arange(market_cap.size)
+  yearly_income = net_income.copy()
+  total_payback = np.zeros(market_cap.shape)
+  target = market_cap
+  rates = estimated_growth_rate
+  while active.size:
+    if max_years is not None and years[active[0]] >= max_years:
+      years[active] = -1
+      break
+    # Identical operation order to the scalar loop, so rounding matches.
+    yearly_income += (yearly_income * rates)
+    total_payback += yearly_income
+    years[active] += 1
+    remaining = total_payback < target
+    active = active[remaining]
+    yearly_income = yearly_income[remaining]
+    total_payback = total_payback[remaining]
+    target = target[remaining]
+    rates = rates[remaining]
+  return years
+
+
+def calculate_ten_cap_price(free_cash_flow_per_share):
+  """Batch version of `RuleOne.calculate_ten_cap_price`."""
+  return 10 * _as_array(free_cash_flow_per_share)
+
+
+def valuations(current_eps, estimated_growth_rate, historical_low_pe,
+               historical_high_pe, market_cap, net_income,
+               free_cash_flow_per_share):
+  """
+  Computes every Rule #1 valuation for a whole universe in one call.
+
+  Args:
+    current_eps: Trailing twelve month EPS per company.
+    estimated_growth_rate: Conservative growth rate per company, as a decimal.
+    historical_low_pe: 5-year low PE ratio per company.
+    historical_high_pe: 5-year high PE ratio per company.
+    market_cap: Market capitalization per company.
+    net_income: TTM net income per company.
+    free_cash_flow_per_share: Most recent free cash flow per share.
+
+  Returns:
+    A dictionary of arrays keyed by 'sticker_price', 'margin_of_safety_price',
+    'payback_time' and 'ten_cap_price'.
+  """
+  margin_of_safety, sticker_price = margin_of_safety_price(
+      current_eps, estimated_growth_rate, historical_low_pe, historical_high_pe)
+  return {
+    'sticker_price' : sticker_price,
+    'margin_of_safety_price' : margin_of_safety,
+    'payback_time' : payback_time(market_cap, net_income, estimated_growth_rate),
+    'ten_cap_price' : calculate_ten_cap_price(free_cash_flow_per_share),
+  }
+
+
+def sensitivity_grid(current_eps, historical_low_pe, historical_high_pe,
+                     market_cap, net_income, estimated_growth_rates,
+                     rates_of_return=(0.15,), time_horizons=(10,),
+                     margins_of_safety=(0.5,)):
+  """
+  Evaluates the sticker price, margin of safety price and payback time of one
+  company over every combination of valuation assumptions in a single pass.
+
+  Each cell matches calling the scalar functions with those assumptions, e.g.
+  `calculate_sticker_price(calculate_estimated_future_price(
+  calculate_future_eps(eps, g, t), calculate_future_pe(g, low, high)), t, r)`.
+
+  Args:
+    current_eps: The current (TTM) Earnings Per Share of the company.
+    historical_low_pe: The 5-year low PE ratio.
+    historical_high_pe: The 5-year high PE ratio.
+    market_cap: The current market capitalization.
+    net_income: The TTM net income.
+    estimated_growth_rates: Growth rates (decimals) to evaluate.
+    rates_of_return: Desired minimum rates of return to evaluate.
+    time_horizons: Time horizons, in years, to evaluate.
+    margins_of_safety: Margins of safety (e.g. 0.5 for 50%) to evaluate.
+
+  Returns:
+    A dictionary with:
+      'sticker_price': An array of shape (growth, rate, horizon).
+      'margin_of_safety_price': An array of shape
+          (growth, rate, horizon, margin).
+      'payback_time': An int64 array of shape (growth,).
+  """
+  growth_rates = _as_array(estimated_growth_rates)[:, None, None]
+  rates = _as_array(rates_of_return)[None, :, None]
+  horizons = _as_array(time_horizons)[None, None, :]
+  margins = _as_array(margins_of_safety)
+
+  eps = _as_array(current_eps)
+  low_pe = _as_array(historical_low_pe)
+  high_pe = _as_array(historical_high_pe)
+  future_eps = calculate_future_eps(eps, growth_rates, time_horizon=horizons)
+  future_pe = calculate_future_pe(growth_rates, low_pe, high_pe)
+  future_price = calculate_estimated_future_price(future_eps, future_pe)
+  sticker_price = calculate_sticker_price(future_price, time_horizon=horizons, rate_of_return=rates)
+  margin_of_safety = calculate_margin_of_safety(sticker_price[..., None], margin_of_safety=margins)
+  return {
+    'sticker_price' : sticker_price,
+    'margin_of_safety_price' : margin_of_safety,
+    'payback_time' : payback_time(market_cap, net_income, growth_rates.ravel()),
+  }
@@ -2,6 +2,7 @@
 
 from __future__ import division
 import math
+import sys
 #import numpy as np
 
 
@@ -69,7 +70,12 @@ def max_position_size(share_price, trade_volume):
   return max_position,max_shares
 
 
-def payback_time(market_cap, net_income, estimated_growth_rate):
+# Relative distance between the market cap and a closed-form cumulative
+# payback below which `payback_time` re-checks the year with the exact loop.
+_PAYBACK_TIME_TOLERANCE = 1e-9
+
+
+def payback_time(market_cap, net_income, estimated_growth_rate, max_years=None):
   """
   Determine the amount of years to get your money back if you were to buy the
   entire company at the current market cap given the TTM net income and
@@ -79,18 +85,78 @@ def payback_time(market_cap, net_income, estimated_growth_rate):
   calculation. Basically its the summation of each years future value (FV
   function on excel).
 
+  The yearly incomes form a geometric series, so the number of years is solved
+  in closed form rather than by adding up one year at a time:
+
+    payback(n) = net_income * (1 + r) * ((1 + r)^n - 1) / r
+    n = ceil(log(1 + market_cap * r / (net_income * (1 + r))) / log(1 + r))
+
+  When the market cap is within floating point noise of a year boundary, the
+  year is settled with the original loop so the result always matches it.
+
   Args:
    market_cap: The current market capitalization for the company.
    net_income: The trailing twelve month (TTM) net income for the company.
    estimated_growth_rate: A conservative estimated growth rate. (Typically the
        minimum of a professional growth estimate and the historical growth rate
        of equity/book-value-per-share.)
+   max_years: An optional maximum horizon. Payback times beyond it are treated
+       as invalid.
 
   Returns:
     Returns the number of years (rounded up) for how many years are needed to
     receive a 100% return on your investment based on the company's income. If
-    any of the inputs are invalid, returns -1.
+    any of the inputs are invalid, including NaN or infinite, or the payback
+    exceeds `max_years`, returns -1.
   """
+  # Missing (NaN) or infinite inputs are invalid, as in `RuleOneBatch.payback_time`.
+  if not math.isfinite(market_cap) or not math.isfinite(net_income) \
+     or not math.isfinite(estimated_growth_rate):
+    return -1
+  if market_cap <= 0:
+    return 0
+  if net_income <= 0 or estimated_growth_rate <= 0:
+    return -1
+
+  years = _payback_time_closed_form(market_cap, net_income, estimated_growth_rate)
+  if years is None:
+    return _payback_time_iterative(market_cap, net_income, estimated_growth_rate, max_years)
+  if max_years is not None and years > max_years:
+    return -1
+  return years
+
+
+def _cumulative_payback(net_income, estimated_growth_rate, years):
+  """The closed-form total income received over `years` years."""
+  growth = math.expm1(years * math.log1p(estimated_growth_rate))
+  return net_income * (1.0 + estimated_growth_rate) * growth / estimated_growth_rate
+
+
+def _payback_time_closed_form(market_cap, net_income, estimated_growth_rate):
+  """Returns the payback years, or None if the year boundary is ambiguous."""
+  ratio = market_cap * estimated_growth_rate / (net_income * (1.0 + estimated_growth_rate))
+  log_growth = math.log1p(estimated_growth_rate)
+  if log_growth <= 0 or not math.isfinite(ratio):
+    return None
+  years = max(1, math.ceil(math.log1p(ratio) / log_growth))
+  # The loop accumulates a little rounding error every year, so widen the
+  # tolerance for very long horizons.
+  tolerance = max(_PAYBACK_TIME_TOLERANCE, 8 * years * sys.float_info.epsilon)
+  for candidate in (years - 1, years):
+    if candidate < 1:
+      continue
+    total = _cumulative_payback(net_income, estimated_growth_rate, candidate)
+    if not math.isfinite(total) or abs(total - market_cap) <= tolerance * market_cap:
+      return None
+  below = years <= 1 or _cumulative_payback(net_income, estimated_growth_rate, years - 1) < market_cap
+  above = _cumulative_payback(net_income, estimated_growth_rate, years) >= market_cap
+  if below and above:
+    return years
+  return None
+
+
+def _payback_time_iterative(market_cap, net_income, estimated_growth_rate, max_years=None):
+  """The original year-by-year summation, kept as the reference implementation."""
   yearly_income = net_income
   total_payback = 0
   years = 0
@@ -98,6 +164,9 @@ def payback_time(market_cap, net_income, estimated_growth_rate):
     if yearly_income <= 0 or estimated_growth_rate <= 0:
       years = -1
       break;
+    if max_years is not None and years >= max_years:
+      years = -1
+      break;
     yearly_income += (yearly_income * estimated_growth_rate)
     total_payback += yearly_income
     years += 1
@@ -255,6 +324,22 @@ def calculate_margin_of_safety(sticker_price, margin_of_safety=0.5):
     return None
   return sticker_price * (1 - margin_of_safety)
 
+def calculate_ten_cap_price(free_cash_flow_per_share):
+  """
+  Calculates the "10 cap" price of a stock, which is the price that would
+  yield a 10% return from the owner earnings (free cash flow) alone.
+
+  Args:
+    free_cash_flow_per_share: The most recent free cash flow per share.
+
+  Returns:
+    The ten cap price, or None if the free cash flow is unavailable.
+  """
+  if free_cash_flow_per_share is None:
+    return None
+  return 10 * free_cash_flow_per_share
+
+
 def calculate_roic(net_income, cash, long_term_debt, stockholder_equity):
   return (
     net_income
@@ -0,0 +1,232 @@
+"""Range queries over the Big 5 numbers and valuations of a whole universe.
+
+The `Screener` reads a `FundamentalsStore` and precomputes one sorted index per
+metric, so a query such as "ROIC >= 10% over 5 years, every growth rate >= 10%
+and the price below the margin of safety price" is a few binary searches
+and never fetches anything upstream.
+
+Metrics:
+  <number>_<period>: The Big 5 numbers per period, where <number> is 'roic'
+      (average ROIC), 'eps', 'sales', 'equity' or 'cash' (the growth rates in
+      percent), and <period> is '1y', '3y', '5y' or 'max'.
+  <number>_min: The weakest of the periods above, e.g. `eps_min >= 10` means
+      every EPS growth rate is at least 10%.
+  Valuations: 'sticker_price', 'margin_of_safety_price', 'payback_time' and
+      'ten_cap_price', the raw 'current_price', 'market_cap' and
+      'debt_equity_ratio', and the ratios 'price_to_mos',
+      'price_to_sticker' and 'price_to_ten_cap' of the current price to
+      those prices (below 1 means the price is below them).
+
+A company lacking the data for a metric never matches a filter on it.
+"""
+
+import os
+import time
+from threading import Lock
+
+import numpy as np
+
+from isthisstockgood.FundamentalsStore import FundamentalsTable, current_generation
+
+DEFAULT_RELOAD_INTERVAL = 60
+
+PERIODS = ('1y', '3y', '5y', 'max')
+# The growth rate columns of the Big 5 numbers, by metric prefix.
+GROWTH_RATE_COLUMNS = {
+  'eps' : 'eps_growth_rates',
+  'sales' : 'revenue_growth_rates',
+  'equity' : 'equity_growth_rates',
+  'cash' : 'free_cash_flow_growth_rates',
+}
+# The minimum history each ROIC average needs, as in `MSNMoney`.
+_ROIC_AVERAGE_YEARS = {'1y' : (1, 2), '3y' : (3, 3), '5y' : (5, 5), 'max' : (None, 6)}
+
+METRICS = tuple(
+  f'{number}_{period}'
+  for number in ('roic',) + tuple(GROWTH_RATE_COLUMNS)
+  for period in PERIODS + ('min',)
+) + (
+  'sticker_price', 'margin_of_safety_price', 'payback_time', 'ten_cap_price',
+  'current_price', 'market_cap', 'debt_equity_ratio',
+  'price_to_mos', 'price_to_sticker', 'price_to_ten_cap',
+)
+
+
+def _roic_averages(roic):
+  """Averages the right-aligned ROIC series over each period, in percent.
+
+  `MSNMoney.roic_averages` averages the revenue per share instead, so these are
+  recomputed from the stored ROIC series. The 'max' average covers every year
+  the store keeps.
+  """
+  present = ~np.isnan(roic)
+  counts = np.count_nonzero(present, axis=1)
+  averages = {}
+  for period, (years, minimum) in _ROIC_AVERAGE_YEARS.items():
+    window = present[:, -years:] if years else present
+    values = np.where(window, roic[:, -window.shape[1]:], 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      average = values.sum(axis=1) / np.count_nonzero(window, axis=1)
+    averages[period] = np.where(counts >= minimum, np.round(average, 2), np.nan)
+  return averages
+
+
+def _ratio(numerator, denominator):
+  with np.errstate(divide='ignore', invalid='ignore'):
+    return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+def compute_metrics(table):
+  """Returns an array per entry of `METRICS`, with one value (or NaN) per row of `table`."""
+  metrics = {}
+  roic = _roic_averages(np.asarray(table.columns['roic']))
+  for period in PERIODS:
+    metrics[f'roic_{period}'] = roic[period]
+  for number, column in GROWTH_RATE_COLUMNS.items():
+    values = np.asarray(table.columns[column])
+    for index, period in enumerate(PERIODS):
+      metrics[f'{number}_{period}'] = values[:, index]
+  for number in ('roic',) + tuple(GROWTH_RATE_COLUMNS):
+    periods = np.column_stack([metrics[f'{number}_{period}'] for period in PERIODS])
+    present = ~np.isnan(periods)
+    metrics[f'{number}_min'] = np.where(
+        present.any(axis=1), np.min(np.where(present, periods, np.inf), axis=1), np.nan)
+
+  valuations = table.valuations()
+  for name, values in valuations.items():
+    metrics[name] = np.asarray(values, dtype=np.float64)
+  # `payback_time` is -1 for invalid inputs, which are screened as missing.
+  metrics['payback_time'] = np.where(
+      metrics['payback_time'] < 0, np.nan, metrics['payback_time'])
+  for name in ('current_price', 'market_cap', 'debt_equity_ratio'):
+    metrics[name] = np.asarray(table.columns[name], dtype=np.float64)
+  price = metrics['current_price']
+  metrics['price_to_mos'] = _ratio(price, metrics['margin_of_safety_price'])
+  metrics['price_to_sticker'] = _ratio(price, metrics['sticker_price'])
+  metrics['price_to_ten_cap'] = _ratio(price, metrics['ten_cap_price'])
+  return metrics
+
+
+class ScreenerIndex:
+  """Sorted indexes over the metrics of one `FundamentalsTable` generation."""
+
+  def __init__(self, table):
+    self.table = table
+    self.generation = table.generation
+    self.metrics = compute_metrics(table)
+    self._sorted = {}
+    for name, values in self.metrics.items():
+      rows = np.flatnonzero(~np.isnan(values))
+      order = rows[np.argsort(values[rows], kind='stable')]
+      self._sorted[name] = (values[order], order)
+    self._ticker_rank = np.empty(len(table), dtype=np.intp)
+    self._ticker_rank[np.argsort(np.array(table.tickers, dtype=object), kind='stable')] = \
+        np.arange(len(table))
+
+  def __len__(self):
+    return len(self.table)
+
+  def rows_between(self, metric, low=None, high=None):
+    """Returns the rows whose `metric` lies in `[low, high]`, with None as an open end."""
+    values, order = self._sorted[metric]
+    start = 0 if low is None else np.searchsorted(values, low, side='left')
+    end = len(values) if high is None else np.searchsorted(values, high, side='right')
+    return order[start:end]
+
+  def screen(self, filters, sort=None, descending=False, limit=None):
+    """Returns the rows matching every `metric : (low, high)` filter.
+
+    Returns:
+      A `(count, rows)` tuple, where `count` is the number of matches and
+      `rows` the first `limit` of them, ordered by the `sort` metric (with
+      missing values last) or else by ticker.
+    """
+    matches = None
+    # Start from the narrowest range, so later filters only test a few rows.
+    for rows in sorted((self.rows_between(metric, *bounds) for metric, bounds in filters.items()),
+                       key=len):
+      if matches is None:
+        matches = np.sort(rows)
+      else:
+        matches = matches[np.isin(matches, rows, assume_unique=True)]
+      if not len(matches):
+        break
+    if matches is None:
+      matches = np.arange(len(self.table))
+
+    if sort:
+      values = self.metrics[sort][matches]
+      keys = -values if descending else values
+      matches = matches[np.argsort(np.where(np.isnan(keys), np.inf, keys), kind='stable')]
+    else:
+      matches = matches[np.argsort(self._ticker_rank[matches])]
+    return len(matches), matches[:limit] if limit is not None else matches
+
+  def describe(self, row, metrics=METRICS):
+    """Returns the ticker, name, industry and `metrics` of a row, with None for NaN."""
+    result = {
+      'ticker' : self.table.tickers[row],
+      'name' : self.table.names[row],
+      'industry' : self.table.industries[row],
+    }
+    for name in metrics:
+      value = self.metrics[name][row]
+      result[name] = None if np.isnan(value) else float(value)
+    return result
+
+
+class Screener:
+  """Screens the fundamentals stored at `path`, following new generations.
+
+  Args:
+    path: A `FundamentalsStore` directory.
+    reload_interval: At most how often, in seconds, to check for a newer
+        generation. The indexes are only rebuilt when there is one.
+    clock: A function returning the current time in seconds.
+  """
+
+  def __init__(self, path, reload_interval=DEFAULT_RELOAD_INTERVAL, clock=time.time):
+    self.path = path
+    self.reload_interval = reload_interval
+    self.clock = clock
+    self._index = None
+    self._checked_at = None
+    self._lock = Lock()
+
+  def index(self):
+    """Returns the `ScreenerIndex` of the latest generation, or None if the store is empty."""
+    with self._lock:
+      now = self.clock()
+      if self._checked_at is not None and now - self._checked_at < self.reload_interval:
+        return self._index
+      self._checked_at = now
+      generation = current_generation(self.path)
+      if generation is not None and (self._index is None or self._index.generation != generation):
+        # Loads the generation just read, which the next flush still keeps.
+        self._index = ScreenerIndex(FundamentalsTable.load(os.path.join(self.path, generation)))
+      return self._index
+
+  def screen(self, filters, sort=None, descending=False, limit=None):
+    """Screens the latest generation (see `ScreenerIndex.screen`).
+
+    Returns:
+      A dictionary with the 'count' of matches, the 'generation' screened and
+      the described 'results'.
+
+    Raises:
+      ValueError: if a filter or the sort refers to an unknown metric.
+    """
+    unknown = sorted(set(filters) - set(METRICS))
+    if sort and sort not in METRICS:
+      unknown.append(sort)
+    if unknown:
+      raise ValueError(f'Unknown metrics: {", ".join(unknown)}')
+    index = self.index()
+    if index is None:
+      return {'count' : 0, 'generation' : None, 'results' : []}
+    count, rows = index.screen(filters, sort=sort, descending=descending, limit=limit)
+    return {
+      'count' : count,
+      'generation' : index.generation,
+      'results' : [index.describe(row) for row in rows],
+    }
@@ -0,0 +1,116 @@
+"""Encodes the `fetchDataForTickerSymbol` results served by the Flask app.
+
+The template values are encoded by a fixed schema rather than by rendering a
+template: each key is coerced to its JSON type and the 'null' placeholders of
+`computeTemplateValues` become real nulls, so a response is valid JSON for
+any input. `JSONBackend.dumps` does the encoding, with `orjson` when it is
+installed.
+
+An `EncodedBody` carries its content hash, so that the `ResultCache` encodes
+each result once and every request serving it reuses the same bytes and
+ETag.
+"""
+
+import hashlib
+import math
+import numbers
+from collections import namedtuple
+
+from isthisstockgood.JSONBackend import dumps
+
+STRING = 'string'
+NUMBER = 'number'
+NUMBER_LIST = 'number_list'
+STRING_LIST = 'string_list'
+
+# The keys of a stock data response, in order, and their JSON types. Missing
+# lists are empty and every other missing value is null.
+STOCK_DATA_SCHEMA = (
+  ('ticker', STRING),
+  ('name', STRING),
+  ('description', STRING),
+  ('roic', NUMBER_LIST),
+  ('eps', NUMBER_LIST),
+  ('sales', NUMBER_LIST),
+  ('equity', NUMBER_LIST),
+  ('cash', NUMBER_LIST),
+  ('total_debt', NUMBER),
+  ('free_cash_flow', NUMBER),
+  ('debt_payoff_time', NUMBER),
+  ('debt_equity_ratio', NUMBER),
+  ('margin_of_safety_price', NUMBER),
+  ('current_price', NUMBER),
+  ('sticker_price', NUMBER),
+  ('payback_time', NUMBER),
+  ('ten_cap_price', NUMBER),
+  ('average_volume', NUMBER),
+  ('missing_sources', STRING_LIST),
+)
+
+# The placeholder `computeTemplateValues` uses for values it could not compute.
+NULL_PLACEHOLDER = 'null'
+
+# `data` is the encoded UTF-8 JSON, `etag` the hex SHA-256 of it.
+EncodedBody = namedtuple('EncodedBody', ['data', 'etag'])
+
+
+def _string(value):
+  if value is None or value == NULL_PLACEHOLDER:
+    return None
+  return value if isinstance(value, str) else str(value)
+
+
+def _number(value):
+  value_type = type(value)
+  if value_type is int:
+    return value
+  if value_type is float:
+    return value if math.isfinite(value) else None
+  if value is None or value == NULL_PLACEHOLDER:
+    return None
+  # The `numbers` ABCs are slow, so they only catch e.g. NumPy scalars.
+  if isinstance(value, numbers.Integral):
+    return int(value)
+  if isinstance(value, numbers.Real):
+    value = float(value)
+    return value if math.isfinite(value) else None
+  raise TypeError(f'Expected a number, got {value!r}')
+
+
+def _number_list(values):
+  return [_number(value) for value in values] if values else []
+
+
+def _string_list(values):
+  return [_string(value) for value in values] if values else []
+
+
+_COERCIONS = {
+  STRING : _string,
+  NUMBER : _number,
+  NUMBER_LIST : _number_list,
+  STRING_LIST : _string_list,
+}
+# The schema with its coercion functions, resolved once.
+_COMPILED_SCHEMA = tuple((key, _COERCIONS[kind]) for key, kind in STOCK_DATA_SCHEMA)
+
+
+def stock_data(template_values):
+  """Returns the JSON-ready dictionary of the `STOCK_DATA_SCHEMA` keys of `template_values`."""
+  get = template_values.get
+  return {key : coerce(get(key)) for key, coerce in _COMPILED_SCHEMA}
+
+
+def encode(data):
+  """Encodes `data` into an `EncodedBody`."""
+  encoded = dumps(data)
+  return EncodedBody(encoded, hashlib.sha256(encoded).hexdigest())
+
+
+def encode_stock_data(template_values):
+  """Encodes the template values of a ticker into an `EncodedBody`."""
+  return encode(stock_data(template_values))
+
+
+def encode_error(message):
+  return encode({'error' : message})
@@ -0,0 +1,316 @@
+"""A process-wide, pooled HTTP session shared by every `DataFetcher`."""
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+from requests_futures.sessions import FuturesSession
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool, PoolManager
+from urllib3.connection import HTTPConnection, HTTPSConnection
+
+from isthisstockgood.Metrics import get_metrics
+from isthisstockgood.RateLimiter import HostGuard, UpstreamUnavailable
+from isthisstockgood.Timers import Timers
+
+# The `time.perf_counter` timings of a request, attached to its response as
+# `response.timings` while metrics are enabled. `connect` is the seconds spent
+# opening a connection (0 for a reused one) and `headers_at` is when the
+# response headers were received.
+RequestTimings = namedtuple('RequestTimings', ['sent_at', 'connect', 'headers_at'])
+
+# Connections are opened on the thread sending the request, so the adapter
+# reads their connect time from here.
+_connect_timing = threading.local()
+
+
+class PoolStats:
+  """Thread-safe counters describing how often host connection pools are reused.
+
+  A "hit" is a request that was served by an already existing keep-alive pool
+  for its host, while a "miss" required a brand new pool (and therefore a new
+  TCP/TLS handshake).
+  """
+
+  def __init__(self):
+    self._lock = Lock()
+    self.requests = 0
+    self.rejected = 0
+    self.delayed = 0
+    self.pool_hits = 0
+    self.pool_misses = 0
+
+  def record_request(self):
+    with self._lock:
+      self.requests += 1
+
+  def record_rejection(self):
+    with self._lock:
+      self.rejected += 1
+
+  def record_delay(self):
+    with self._lock:
+      self.delayed += 1
+
+  def record_pool_lookup(self, created):
+    with self._lock:
+      if created:
+        self.pool_misses += 1
+      else:
+        self.pool_hits += 1
+
+  def as_dict(self):
+    with self._lock:
+      return {
+        'requests' : self.requests,
+        'rejected' : self.rejected,
+        'delayed' : self.delayed,
+        'pool_hits' : self.pool_hits,
+        'pool_misses' : self.pool_misses,
+      }
+
+
+class _TimedConnectionMixin:
+  """Adds the time spent in `connect` (DNS, TCP and TLS) to `_connect_timing`."""
+
+  def connect(self):
+    start = time.perf_counter()
+    try:
+      super().connect()
+    finally:
+      _connect_timing.seconds = getattr(_connect_timing, 'seconds', 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+  pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+  pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+  ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+  ConnectionCls = _TimedHTTPSConnection
+
+
+class _CountingPoolManager(PoolManager):
+  """A `PoolManager` that reports host pool hits and misses to `PoolStats`."""
+
+  def __init__(self, stats, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.pool_classes_by_scheme = {
+      'http' : _TimedHTTPConnectionPool,
+      'https' : _TimedHTTPSConnectionPool,
+    }
+    self._stats = stats
+    self._created = False
+    self._lookup_lock = Lock()
+
+  def _new_pool(self, scheme, host, port, request_context=None):
+    self._created = True
+    return super()._new_pool(scheme, host, port, request_context=request_context)
+
+  def connection_from_pool_key(self, pool_key, request_context=None):
+    # Serialize lookups so the created flag is attributed to this request.
+    with self._lookup_lock:
+      self._created = False
+      pool = super().connection_from_pool_key(pool_key, request_context=request_context)
+      self._stats.record_pool_lookup(self._created)
+    return pool
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+  """An `HTTPAdapter` whose connection pools are tracked by `PoolStats`."""
+
+  def __init__(self, stats, **kwargs):
+    self._stats = stats
+    super().__init__(**kwargs)
+
+  def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+    self._pool_connections = connections
+    self._pool_maxsize = maxsize
+    self._pool_block = block
+    self.poolmanager = _CountingPoolManager(
+      self._stats,
+      num_pools=connections,
+      maxsize=maxsize,
+      block=block,
+      **pool_kwargs
+    )
+
+  def send(self, request, **kwargs):
+    if not get_metrics().enabled:
+      return super().send(request, **kwargs)
+    _connect_timing.seconds = 0.0
+    sent_at = time.perf_counter()
+    response = super().send(request, **kwargs)
+    # Unless streamed, requests reads the body after this returns.
+    response.timings = RequestTimings(sent_at, _connect_timing.seconds, time.perf_counter())
+    return response
+
+
+class SessionPool:
+  """Shares one `FuturesSession`, worker pool and per-host keep-alive pools.
+
+  Args:
+    max_workers: The size of the global worker pool that executes requests
+        (and their response hooks).
+    pool_connections: The number of distinct hosts to keep connection pools
+        for.
+    pool_maxsize: The maximum number of keep-alive connections per host.
+    adapter_class: Optional `CountingHTTPAdapter` subclass to mount instead,
+        e.g. to replay recorded responses (see `Replay`).
+    timeout: The default `(connect, read)` timeout in seconds of a request.
+    host_guard: The `HostGuard` rate limiting requests and tracking failures
+        per host. Defaults to one with the default limits.
+  """
+
+  DEFAULT_MAX_WORKERS = 32
+  DEFAULT_POOL_CONNECTIONS = 16
+  DEFAULT_POOL_MAXSIZE = 16
+  DEFAULT_TIMEOUT = (3.05, 10)
+
+  def __init__(self, max_workers=DEFAULT_MAX_WORKERS,
+               pool_connections=DEFAULT_POOL_CONNECTIONS,
+               pool_maxsize=DEFAULT_POOL_MAXSIZE, adapter_class=None,
+               timeout=DEFAULT_TIMEOUT, host_guard=None):
+    self.max_workers = max_workers
+    self.pool_connections = pool_connections
+    self.pool_maxsize = pool_maxsize
+    self.timeout = timeout
+    self.host_guard = host_guard if host_guard is not None else HostGuard()
+    self.stats = PoolStats()
+    self.executor = ThreadPoolExecutor(
+      max_workers=max_workers,
+      thread_name_prefix='IsThisStockGood-http'
+    )
+    self.session = FuturesSession(executor=self.executor)
+    # Holds requests waiting for a token, so that they do not hold a worker.
+    self._timers = Timers('IsThisStockGood-http-delays')
+    adapter_class = adapter_class or CountingHTTPAdapter
+    adapter = adapter_class(
+      self.stats,
+      pool_connections=pool_connections,
+      pool_maxsize=pool_maxsize
+    )
+    self.session.mount('https://', adapter)
+    self.session.mount('http://', adapter)
+
+  def get(self, url, user_agent=None, **kwargs):
+    """Issues an asynchronous GET and returns its `Future`.
+
+    A request over the rate of its host is sent once the `host_guard` has a
+    token for it, if that is within the connect timeout. A request the
+    `host_guard` rejects is not sent, and its `Future` fails right away with
+    `UpstreamUnavailable` (without running any hooks).
+
+    Args:
+      url: The URL to fetch.
+      user_agent: Optional User-Agent header for this request only, so that
+          callers can keep rotating agents while sharing the session.
+      **kwargs: Forwarded to `FuturesSession.get` (e.g. `hooks`).
+    """
+    host = urlparse(url).hostname
+    timeout = kwargs.setdefault('timeout', self.timeout)
+    max_wait = timeout[0] if isinstance(timeout, tuple) else timeout
+    reason, delay = self.host_guard.reserve(host, max_wait=max_wait or 0.0)
+    if reason:
+      self.stats.record_rejection()
+      future = Future()
+      future.set_exception(UpstreamUnavailable(host, reason))
+      return future
+
+    if user_agent:
+      headers = dict(kwargs.pop('headers', None) or {})
+      headers['User-Agent'] = user_agent
+      kwargs['headers'] = headers
+    self.stats.record_request()
+    if delay:
+      self.stats.record_delay()
+      future = Future()
+      # Admitted, so it is sent (and its outcome recorded) even if the caller
+      # gives up, just like a request already on a worker.
+      future.set_running_or_notify_cancel()
+      self._timers.schedule(delay, lambda: self._send_later(future, url, kwargs))
+    else:
+      future = self.session.get(url, **kwargs)
+    future.add_done_callback(lambda future: self._record_outcome(host, future))
+    return future
+
+  def _send_later(self, future, url, kwargs):
+    # Runs on the timer thread, so only hands the request to a worker.
+    try:
+      sent = self.session.get(url, **kwargs)
+    except Exception as e:
+      # E.g. the executor was shut down by `close`.
+      future.set_exception(e)
+      return
+    sent.add_done_callback(lambda sent: _copy_outcome(sent, future))
+
+  def is_available(self, url):
+    """Returns whether requests to the host of `url` are currently let through."""
+    return self.host_guard.allows(urlparse(url).hostname)
+
+  def _record_outcome(self, host, future):
+    error = future.exception()
+    if error is None:
+      status_code = future.result().status_code
+      success = status_code < 500 and status_code != 429
+    else:
+      # Anything else was raised by a response hook, after the host answered.
+      success = not isinstance(error, RequestException)
+    self.host_guard.record(host, success)
+
+  def get_stats(self):
+    stats = self.stats.as_dict()
+    stats.update({
+      'max_workers' : self.max_workers,
+      'pool_connections' : self.pool_connections,
+      'pool_maxsize' : self.pool_maxsize,
+      'hosts' : self.host_guard.get_stats(),
+    })
+    return stats
+
+  def close(self):
+    self.session.close()
+    self.executor.shutdown(wait=False)
+
+
+def _copy_outcome(source, target):
+  error = source.exception()
+  if error is None:
+    target.set_result(source.result())
+  else:
+    target.set_exception(error)
+
+
+_session_pool = None
+_session_pool_lock = Lock()
+
+
+def get_session_pool():
+  """Returns the process-wide `SessionPool`, creating it on first use."""
+  global _session_pool
+  with _session_pool_lock:
+    if _session_pool is None:
+      _session_pool = SessionPool()
+    return _session_pool
+
+
+def configure_session_pool(**kwargs):
+  """Replaces the process-wide `SessionPool` with one using `kwargs` sizes."""
+  global _session_pool
+  with _session_pool_lock:
+    previous = _session_pool
+    _session_pool = SessionPool(**kwargs)
+  if previous:
+    previous.close()
+  return _session_pool
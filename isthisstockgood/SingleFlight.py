@@ -0,0 +1,54 @@
+"""Collapses concurrent calls for the same key into one in-flight execution."""
+
+from concurrent.futures import Future
+from threading import Lock
+
+
+class SingleFlight:
+  """Runs at most one call per key at a time and shares its outcome.
+
+  The first caller for a key executes the function, and every caller that
+  arrives while it is still running waits for and receives the same result
+  (or exception) instead of starting its own execution.
+  """
+
+  def __init__(self):
+    self._lock = Lock()
+    self._in_flight = {}
+    self.executions = 0
+    self.collapsed = 0
+
+  def do(self, key, fn, *args, **kwargs):
+    with self._lock:
+      future = self._in_flight.get(key)
+      if future is not None:
+        self.collapsed += 1
+        leader = False
+      else:
+        future = Future()
+        self._in_flight[key] = future
+        self.executions += 1
+        leader = True
+
+    if not leader:
+      return future.result()
+
+    try:
+      result = fn(*args, **kwargs)
+    except BaseException as e:
+      future.set_exception(e)
+      raise
+    else:
+      future.set_result(result)
+      return result
+    finally:
+      with self._lock:
+        del self._in_flight[key]
+
+  def get_stats(self):
+    with self._lock:
+      return {
+        'executions' : self.executions,
+        'collapsed' : self.collapsed,
+        'in_flight' : len(self._in_flight),
+      }
@@ -0,0 +1,348 @@
+"""A tiered TTL cache for parsed data source results.
+
+Parsed results are cached per data kind (e.g. MSN key ratios or the Yahoo
+analyst growth rate) in an in-process LRU tier, backed by an optional SQLite
+tier that survives restarts. Each kind has its own time-to-live, since quotes
+go stale in seconds while fundamentals only change quarterly.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from array import array
+from collections import OrderedDict
+from threading import Lock
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# Time-to-live, in seconds, for each kind of cached data.
+DEFAULT_TTLS = {
+  'msn_quotes' : MINUTE,
+  'msn_ratios' : 3 * DAY,
+  'msn_annual_report' : 7 * DAY,
+  'yahoo_analysis' : DAY,
+  'zacks_analysis' : DAY,
+}
+
+# Used for any kind without an entry in `DEFAULT_TTLS`.
+DEFAULT_TTL = HOUR
+
+# How long, in seconds, past its TTL an entry is kept as a fallback for when
+# its upstream is unavailable.
+DEFAULT_MAX_STALE = 7 * DAY
+
+DEFAULT_MAX_MEMORY_BYTES = 32 * 1024 * 1024
+
+
+def _encode_default(value):
+  # Metric series are parsed into compact `array('d')` columns.
+  if isinstance(value, array):
+    return value.tolist()
+  raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+class CacheStats:
+  """Thread-safe hit/miss/eviction counters for a single cache tier."""
+
+  def __init__(self):
+    self._lock = Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.expirations = 0
+    self.stale_hits = 0
+
+  def record(self, name, count=1):
+    with self._lock:
+      setattr(self, name, getattr(self, name) + count)
+
+  def as_dict(self):
+    with self._lock:
+      return {
+        'hits' : self.hits,
+        'misses' : self.misses,
+        'evictions' : self.evictions,
+        'expirations' : self.expirations,
+        'stale_hits' : self.stale_hits,
+      }
+
+
+class MemoryTier:
+  """An LRU of encoded values, evicting least recently used entries by size.
+
+  Expired entries are kept for `max_stale` more seconds, but only returned
+  when asked for with `allow_stale`.
+  """
+
+  def __init__(self, max_bytes=DEFAULT_MAX_MEMORY_BYTES, clock=time.time, max_stale=0):
+    self.max_bytes = max_bytes
+    self.clock = clock
+    self.max_stale = max_stale
+    self.stats = CacheStats()
+    self._entries = OrderedDict()  # key -> (expires_at, encoded)
+    self._size = 0
+    self._lock = Lock()
+
+  @property
+  def size(self):
+    return self._size
+
+  def __len__(self):
+    return len(self._entries)
+
+  def get(self, key, allow_stale=False):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        self.stats.record('misses')
+        return None
+      expires_at, encoded = entry
+      now = self.clock()
+      if expires_at <= now:
+        if expires_at + self.max_stale <= now:
+          self._remove(key)
+        elif allow_stale:
+          self._entries.move_to_end(key)
+          self.stats.record('stale_hits')
+          return entry
+        self.stats.record('expirations')
+        self.stats.record('misses')
+        return None
+      self._entries.move_to_end(key)
+      self.stats.record('hits')
+      return entry
+
+  def put(self, key, expires_at, encoded):
+    size = len(encoded)
+    with self._lock:
+      if key in self._entries:
+        self._remove(key)
+      if size > self.max_bytes:
+        return
+      self._entries[key] = (expires_at, encoded)
+      self._size += size
+      while self._size > self.max_bytes:
+        oldest = next(iter(self._entries))
+        self._remove(oldest)
+        self.stats.record('evictions')
+
+  def expire(self, key, expires_at):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None and entry[0] > expires_at:
+        self._entries[key] = (expires_at, entry[1])
+
+  def delete(self, key):
+    with self._lock:
+      if key in self._entries:
+        self._remove(key)
+
+  def _remove(self, key):
+    _, encoded = self._entries.pop(key)
+    self._size -= len(encoded)
+
+
+class SQLiteTier:
+  """A persistent tier storing encoded values in a local SQLite database.
+
+  Expired rows are kept for `max_stale` more seconds, as in `MemoryTier`.
+  """
+
+  def __init__(self, path, clock=time.time, max_stale=0):
+    self.path = path
+    self.clock = clock
+    self.max_stale = max_stale
+    self.stats = CacheStats()
+    self._lock = Lock()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    self._connection = sqlite3.connect(path, check_same_thread=False)
+    with self._lock, self._connection:
+      self._connection.execute(
+        'CREATE TABLE IF NOT EXISTS source_cache ('
+        'key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)'
+      )
+
+  def get(self, key, allow_stale=False):
+    with self._lock:
+      row = self._connection.execute(
+        'SELECT expires_at, value FROM source_cache WHERE key = ?', (key,)
+      ).fetchone()
+      if row is None:
+        self.stats.record('misses')
+        return None
+      now = self.clock()
+      if row[0] <= now:
+        if row[0] + self.max_stale <= now:
+          with self._connection:
+            self._connection.execute('DELETE FROM source_cache WHERE key = ?', (key,))
+        elif allow_stale:
+          self.stats.record('stale_hits')
+          return row[0], row[1]
+        self.stats.record('expirations')
+        self.stats.record('misses')
+        return None
+    self.stats.record('hits')
+    return row[0], row[1]
+
+  def put(self, key, expires_at, encoded):
+    with self._lock, self._connection:
+      self._connection.execute(
+        'INSERT OR REPLACE INTO source_cache (key, expires_at, value) VALUES (?, ?, ?)',
+        (key, expires_at, encoded)
+      )
+
+  def expire(self, key, expires_at):
+    with self._lock, self._connection:
+      self._connection.execute(
+        'UPDATE source_cache SET expires_at = ? WHERE key = ? AND expires_at > ?',
+        (expires_at, key, expires_at)
+      )
+
+  def delete(self, key):
+    with self._lock, self._connection:
+      self._connection.execute('DELETE FROM source_cache WHERE key = ?', (key,))
+
+  def purge_expired(self):
+    """Deletes every row past its stale period and returns how many were removed."""
+    with self._lock, self._connection:
+      cursor = self._connection.execute(
+        'DELETE FROM source_cache WHERE expires_at <= ?', (self.clock() - self.max_stale,)
+      )
+    self.stats.record('evictions', cursor.rowcount)
+    return cursor.rowcount
+
+  def close(self):
+    with self._lock:
+      self._connection.close()
+
+
+class SourceCache:
+  """Caches parsed source data in a memory LRU in front of an optional disk tier.
+
+  Args:
+    path: Optional SQLite file for the persistent tier. Only the memory tier is
+        used when omitted.
+    max_memory_bytes: Size limit of the memory tier, measured in encoded bytes.
+    ttls: Optional overrides of `DEFAULT_TTLS`, keyed by data kind.
+    max_stale: Seconds past their TTL that entries are kept, to be served by
+        `get(..., allow_stale=True)` when their upstream is unavailable.
+    clock: A function returning the current time in seconds.
+  """
+
+  def __init__(self, path=None, max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES,
+               ttls=None, max_stale=DEFAULT_MAX_STALE, clock=time.time):
+    self.clock = clock
+    self.ttls = dict(DEFAULT_TTLS)
+    self.ttls.update(ttls or {})
+    self.memory = MemoryTier(max_bytes=max_memory_bytes, clock=clock, max_stale=max_stale)
+    self.disk = SQLiteTier(path, clock=clock, max_stale=max_stale) if path else None
+
+  @staticmethod
+  def _key(kind, ticker):
+    return f'{kind}:{ticker.upper()}'
+
+  def ttl_for(self, kind):
+    return self.ttls.get(kind, DEFAULT_TTL)
+
+  def get(self, kind, ticker, allow_stale=False):
+    """Returns the cached value for `kind` and `ticker`, or None if absent or expired.
+
+    With `allow_stale`, an expired value is returned for up to `max_stale`
+    seconds past its TTL.
+    """
+    key = SourceCache._key(kind, ticker)
+    entry = self.memory.get(key, allow_stale=allow_stale)
+    if entry is None and self.disk:
+      entry = self.disk.get(key, allow_stale=allow_stale)
+      if entry is not None:
+        # Promote disk hits so the next lookup is served from memory.
+        self.memory.put(key, *entry)
+    if entry is None:
+      return None
+    return json.loads(entry[1])
+
+  def put(self, kind, ticker, value, ttl=None):
+    """Caches a JSON serializable `value` for `kind` and `ticker`.
+
+    Arrays are stored, and restored, as lists.
+    """
+    key = SourceCache._key(kind, ticker)
+    ttl = self.ttl_for(kind) if ttl is None else ttl
+    expires_at = self.clock() + ttl
+    encoded = json.dumps(value, separators=(',', ':'), default=_encode_default)
+    self.memory.put(key, expires_at, encoded)
+    if self.disk:
+      self.disk.put(key, expires_at, encoded)
+
+  def expire(self, kind, ticker):
+    """Expires the value for `kind` and `ticker` now.
+
+    Unlike `invalidate`, the value is kept for `max_stale` seconds, so it is
+    still the fallback if its refetch fails.
+    """
+    key = SourceCache._key(kind, ticker)
+    now = self.clock()
+    self.memory.expire(key, now)
+    if self.disk:
+      self.disk.expire(key, now)
+
+  def invalidate(self, kind, ticker):
+    key = SourceCache._key(kind, ticker)
+    self.memory.delete(key)
+    if self.disk:
+      self.disk.delete(key)
+
+  def get_fields(self, kind, ticker, target, allow_stale=False):
+    """Restores cached attributes onto `target`. Returns True on a cache hit."""
+    fields = self.get(kind, ticker, allow_stale=allow_stale)
+    if fields is None:
+      return False
+    for name, value in fields.items():
+      setattr(target, name, value)
+    return True
+
+  def put_fields(self, kind, ticker, source, field_names):
+    """Caches the `field_names` attributes of a parsed `source` object."""
+    self.put(kind, ticker, {name : getattr(source, name) for name in field_names})
+
+  def get_stats(self):
+    stats = {
+      'memory' : self.memory.stats.as_dict(),
+      'memory_entries' : len(self.memory),
+      'memory_bytes' : self.memory.size,
+    }
+    if self.disk:
+      stats['disk'] = self.disk.stats.as_dict()
+    return stats
+
+  def close(self):
+    if self.disk:
+      self.disk.close()
+
+
+_source_cache = None
+_source_cache_lock = Lock()
+
+
+def get_source_cache():
+  """Returns the process-wide `SourceCache`, creating a memory-only one on first use."""
+  global _source_cache
+  with _source_cache_lock:
+    if _source_cache is None:
+      _source_cache = SourceCache()
+    return _source_cache
+
+
+def configure_source_cache(**kwargs):
+  """Replaces the process-wide `SourceCache`, e.g. to enable the SQLite tier."""
+  global _source_cache
+  with _source_cache_lock:
+    previous = _source_cache
+    _source_cache = SourceCache(**kwargs)
+  if previous:
+    previous.close()
+  return _source_cache
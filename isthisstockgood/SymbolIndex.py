@@ -0,0 +1,137 @@
+"""A persistent ticker symbol -> MSN `SecId` index.
+
+Resolving a symbol through the MSN autosuggest endpoint costs a full network
+round trip before any financial data can be requested. The mapping never
+changes in practice, so every resolution is remembered here (optionally in a
+SQLite file) and the index can be bulk-loaded from a CSV or JSON file.
+"""
+
+import csv
+import json
+import os
+import sqlite3
+from threading import Lock
+
+
+class SymbolIndex:
+  """Maps upper-cased ticker symbols to `(sec_id, description)` tuples.
+
+  Args:
+    path: Optional SQLite file that persists resolutions across restarts.
+  """
+
+  def __init__(self, path=None):
+    self.path = path
+    self.hits = 0
+    self.misses = 0
+    self._entries = {}
+    self._lock = Lock()
+    self._connection = None
+    if path:
+      directory = os.path.dirname(os.path.abspath(path))
+      os.makedirs(directory, exist_ok=True)
+      self._connection = sqlite3.connect(path, check_same_thread=False)
+      with self._connection:
+        self._connection.execute(
+          'CREATE TABLE IF NOT EXISTS msn_symbols ('
+          'symbol TEXT PRIMARY KEY, sec_id TEXT NOT NULL, description TEXT NOT NULL)'
+        )
+      rows = self._connection.execute('SELECT symbol, sec_id, description FROM msn_symbols')
+      for symbol, sec_id, description in rows:
+        self._entries[symbol] = (sec_id, description)
+
+  def __len__(self):
+    return len(self._entries)
+
+  def lookup(self, symbol):
+    """Returns `(sec_id, description)` for `symbol`, or None if it is unknown."""
+    with self._lock:
+      entry = self._entries.get(symbol.upper())
+      if entry is None:
+        self.misses += 1
+      else:
+        self.hits += 1
+      return entry
+
+  def add(self, symbol, sec_id, description=''):
+    self.add_many([(symbol, sec_id, description)])
+
+  def add_many(self, entries):
+    """Adds `(symbol, sec_id, description)` tuples, skipping empty ids."""
+    rows = [
+      (symbol.upper(), sec_id, description or '')
+      for symbol, sec_id, description in entries
+      if symbol and sec_id
+    ]
+    with self._lock:
+      for symbol, sec_id, description in rows:
+        self._entries[symbol] = (sec_id, description)
+      if self._connection and rows:
+        with self._connection:
+          self._connection.executemany(
+            'INSERT OR REPLACE INTO msn_symbols (symbol, sec_id, description) VALUES (?, ?, ?)',
+            rows
+          )
+    return len(rows)
+
+  def load_file(self, path):
+    """Bulk-loads entries and returns how many were added.
+
+    Supports CSV files with `symbol,sec_id[,description]` rows (an optional
+    header row is skipped), and JSON files holding either a list of
+    `{"symbol", "sec_id", "description"}` objects or a `{symbol: sec_id}` map.
+    """
+    if path.endswith('.json'):
+      with open(path, encoding='utf8') as f:
+        data = json.load(f)
+      if isinstance(data, dict):
+        entries = [(symbol, sec_id, '') for symbol, sec_id in data.items()]
+      else:
+        entries = [
+          (item.get('symbol'), item.get('sec_id'), item.get('description', ''))
+          for item in data
+        ]
+    else:
+      entries = []
+      with open(path, encoding='utf8', newline='') as f:
+        for row in csv.reader(f):
+          if len(row) < 2 or row[0].strip().lower() == 'symbol':
+            continue
+          description = row[2].strip() if len(row) > 2 else ''
+          entries.append((row[0].strip(), row[1].strip(), description))
+    return self.add_many(entries)
+
+  def get_stats(self):
+    with self._lock:
+      return {'entries' : len(self._entries), 'hits' : self.hits, 'misses' : self.misses}
+
+  def close(self):
+    if self._connection:
+      self._connection.close()
+
+
+_symbol_index = None
+_symbol_index_lock = Lock()
+
+
+def get_symbol_index():
+  """Returns the process-wide `SymbolIndex`, creating a memory-only one on first use."""
+  global _symbol_index
+  with _symbol_index_lock:
+    if _symbol_index is None:
+      _symbol_index = SymbolIndex()
+    return _symbol_index
+
+
+def configure_symbol_index(path=None, preload=None):
+  """Replaces the process-wide `SymbolIndex`, optionally bulk-loading `preload`."""
+  global _symbol_index
+  index = SymbolIndex(path=path)
+  if preload:
+    index.load_file(preload)
+  with _symbol_index_lock:
+    previous = _symbol_index
+    _symbol_index = index
+  if previous:
+    previous.close()
+  return index
@@ -0,0 +1,58 @@
+"""Runs callbacks after a delay without holding a thread per callback."""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from threading import Lock
+
+logger = logging.getLogger("IsThisStockGood")
+
+
+class Timers:
+  """Runs callbacks after a delay, all on one background thread.
+
+  Callbacks should be quick (e.g. hand work to an executor), since a slow one
+  delays every callback due after it.
+
+  Args:
+    name: The name of the background thread, started on first use.
+  """
+
+  def __init__(self, name='IsThisStockGood-timers'):
+    self.name = name
+    self._heap = []
+    self._counter = itertools.count()
+    self._lock = Lock()
+    self._wakeup = threading.Condition(self._lock)
+    self._thread = None
+
+  def schedule(self, delay, callback):
+    """Runs `callback` in `delay` seconds. Returns a handle for `cancel`."""
+    entry = [time.monotonic() + delay, next(self._counter), callback]
+    with self._lock:
+      heapq.heappush(self._heap, entry)
+      if self._thread is None:
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+      self._wakeup.notify()
+    return entry
+
+  @staticmethod
+  def cancel(entry):
+    entry[2] = None
+
+  def _run(self):
+    while True:
+      with self._lock:
+        while not self._heap or self._heap[0][0] > time.monotonic():
+          self._wakeup.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+        callback = heapq.heappop(self._heap)[2]
+      if callback is None:
+        continue
+      try:
+        callback()
+      except Exception as e:
+        # The thread runs every timer, so one failure must not stop the others.
+        logger.warning(f'{self.name} timer failed: {e}')
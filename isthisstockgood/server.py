@@ -1,6 +1,40 @@
 import logging
+import math
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date
-from flask import Flask, request, render_template, json
+from flask import Flask, g, request, render_template, json, stream_with_context
+import isthisstockgood.RuleOneBatchCalculations as RuleOneBatch
+from isthisstockgood.DataFetcher import SourcesUnavailable
+from isthisstockgood.Profiler import is_valid_request_id
+from isthisstockgood.ResultCache import CachedResult, ResultCache, DEFAULT_TTL, DEFAULT_MAX_STALE
+from isthisstockgood.Serializer import encode_error, encode_stock_data
+
+# Upper bound on the number of symbols accepted by a single `/api/tickers` call.
+MAX_BATCH_TICKERS = 500
+
+# Upper bound on the number of cells in a single sensitivity grid.
+MAX_SENSITIVITY_CELLS = 20000
+
+# Number of results `/api/screen` returns by default, and at most.
+DEFAULT_SCREEN_LIMIT = 100
+MAX_SCREEN_LIMIT = 1000
+
+# The endpoints a `SamplingProfiler` passed to `create_app` profiles.
+PROFILED_ENDPOINTS = ('search', 'api_ticker', 'api_sensitivity')
+
+# Default assumptions evaluated by `/api/ticker/<ticker>/sensitivity`.
+DEFAULT_RATES_OF_RETURN = [0.10, 0.12, 0.15, 0.20]
+DEFAULT_TIME_HORIZONS = [5, 10]
+DEFAULT_MARGINS_OF_SAFETY = [0.5]
+DEFAULT_GROWTH_RATE_OFFSETS = [-0.05, -0.025, 0, 0.025, 0.05]
+
+# Encoded once, as they never change.
+INVALID_TICKER_BODY = encode_error('Invalid ticker symbol')
+UPSTREAM_UNAVAILABLE_ERROR = 'Upstream data sources are unavailable, please try again later'
+UPSTREAM_UNAVAILABLE_BODY = encode_error(UPSTREAM_UNAVAILABLE_ERROR)
+
+logger = logging.getLogger("IsThisStockGood")
 
 
 def get_logger():
@@ -16,23 +50,350 @@ def get_logger():
 
     return logger
 
-def create_app(fetchDataForTickerSymbol):
+def _parse_batch_tickers(req):
+    """Extracts the de-duplicated list of ticker symbols from a batch request.
+
+    Accepts either a JSON body of the form `{"tickers": ["AAPL", ...]}` or a
+    comma separated `tickers` form/query value.
+    """
+    tickers = None
+    body = req.get_json(silent=True)
+    if isinstance(body, dict):
+      tickers = body.get('tickers')
+    elif isinstance(body, list):
+      tickers = body
+    if tickers is None:
+      raw = req.values.get('tickers', '')
+      tickers = raw.split(',')
+    if not isinstance(tickers, list):
+      return None
+
+    symbols = []
+    seen = set()
+    for ticker in tickers:
+      if not isinstance(ticker, str):
+        continue
+      ticker = ticker.strip()
+      if not ticker or ticker.upper() in seen:
+        continue
+      seen.add(ticker.upper())
+      symbols.append(ticker)
+    return symbols
+
+
+def _render_ndjson_line(ticker, result, error=None):
+    """Renders a single ticker result as one compact line of JSON."""
+    if error:
+      return json.dumps({'ticker' : ticker, 'error' : error}) + '\n'
+    return _result_body(result).data + b'\n'
+
+
+def _result_body(result):
+    """Returns the `EncodedBody` of a `CachedResult` with template values."""
+    return result.body or encode_stock_data(result.template_values)
+
+
+def _parse_float_list(req, name, default):
+    """Parses a comma separated list of finite numbers, raising ValueError if malformed."""
+    raw = req.args.get(name)
+    if not raw:
+      return default
+    values = [float(value) for value in raw.split(',') if value.strip()]
+    # 'nan' and 'inf' parse, but would be written as invalid JSON.
+    if not all(math.isfinite(value) for value in values):
+      raise ValueError(f'{name} must be finite numbers')
+    return values
+
+
+def _parse_screen_filters(req):
+    """Parses `metric=low:high` query values, where either bound may be omitted.
+
+    Raises:
+      ValueError: if a range is malformed.
+    """
+    filters = {}
+    for metric, raw in req.args.items():
+      if metric in ('sort', 'order', 'limit'):
+        continue
+      low, separator, high = raw.partition(':')
+      if not separator:
+        raise ValueError(f'{metric} must be a low:high range')
+      filters[metric] = (float(low) if low.strip() else None, float(high) if high.strip() else None)
+    return filters
+
+
+def _default_growth_rates(estimated_growth_rate):
+    if not estimated_growth_rate:
+      return [0.05, 0.10, 0.15, 0.20]
+    rates = [round(estimated_growth_rate + offset, 4) for offset in DEFAULT_GROWTH_RATE_OFFSETS]
+    return [rate for rate in rates if rate > 0]
+
+
+def create_app(fetchDataForTickerSymbol, max_batch_workers=8,
+               stale_while_revalidate=False, result_ttl=DEFAULT_TTL,
+               max_stale=DEFAULT_MAX_STALE, result_cache=None,
+               fetchFundamentalsForTickerSymbol=None, screener=None,
+               refresh_scheduler=None, metrics=None, profiler=None,
+               hedger=None):
+    """Creates the Flask app.
+
+    Args:
+      fetchDataForTickerSymbol: Function returning the template values for a
+          ticker symbol, or None if it is invalid.
+      max_batch_workers: Number of tickers `/api/tickers` evaluates at once.
+      stale_while_revalidate: If True, results are cached for `result_ttl`
+          seconds and expired ones are served (for up to `max_stale` more
+          seconds) while a background refresh runs.
+      result_cache: An optional, already configured `ResultCache` to use
+          instead, e.g. one that is shared with a background refresher.
+      fetchFundamentalsForTickerSymbol: Optional function returning the raw
+          valuation inputs for a ticker. Enables the sensitivity grid API.
+      screener: An optional `Screener` over stored fundamentals. Enables the
+          `/api/screen` range queries.
+      refresh_scheduler: An optional `RefreshScheduler` that keeps the
+          `result_cache` warm. Lookups count towards the popularity of the
+          tickers it watches.
+      metrics: Optional `Metrics` to expose on `/metrics` (in the Prometheus
+          text format) and `/metrics/traces` (the recent lookup traces).
+      profiler: An optional `SamplingProfiler` to sample the stacks of the
+          `PROFILED_ENDPOINTS` with. Every response then carries an
+          `X-Request-ID` header (a valid incoming one is kept), and the
+          profiles it keeps are served on `/profiles/<request id>`.
+      hedger: The `Hedger` of the lookups, whose per-source stats are
+          exposed on `/metrics/hedging`.
+    """
     app = Flask(__name__)
 
+    if result_cache is None and stale_while_revalidate:
+      result_cache = ResultCache(fetchDataForTickerSymbol, ttl=result_ttl, max_stale=max_stale)
+    app.extensions['result_cache'] = result_cache
+
+    if profiler:
+      @app.before_request
+      def start_profiling():
+        request_id = request.headers.get('X-Request-ID')
+        g.request_id = request_id if is_valid_request_id(request_id) else uuid.uuid4().hex
+        if request.endpoint in PROFILED_ENDPOINTS:
+          g.profile = profiler.start(g.request_id, name=request.path)
+
+      @app.after_request
+      def add_request_id(response):
+        response.headers['X-Request-ID'] = g.request_id
+        return response
+
+      @app.teardown_request
+      def stop_profiling(exception):
+        profile = g.pop('profile', None)
+        if profile is not None:
+          profiler.stop(profile)
+
+    def lookup(ticker):
+      if refresh_scheduler:
+        refresh_scheduler.record_lookup(ticker)
+      if result_cache:
+        return result_cache.get(ticker)
+      return CachedResult(fetchDataForTickerSymbol(ticker), 0, False)
+
+    def add_age_headers(response, result):
+      if result_cache and result.template_values:
+        response.headers['Age'] = str(int(result.age))
+        if result.stale:
+          response.headers['X-Data-Stale'] = 'true'
+      return response
+
+    def lookup_response(ticker):
+      """Looks up `ticker` and returns its response.
+
+      A lookup that failed because its sources are unavailable is a 503, so
+      that clients can tell it apart from an invalid ticker and retry.
+      """
+      try:
+        result = lookup(ticker)
+      except SourcesUnavailable as e:
+        logger.warning(str(e))
+        return app.response_class(
+          response=UPSTREAM_UNAVAILABLE_BODY.data,
+          status=503,
+          headers={'Retry-After' : '30'},
+          mimetype='application/json'
+        )
+      return result_response(result)
+
+    def result_response(result):
+      """Returns the JSON response of a lookup, or a 304 if the client has it already."""
+      body = _result_body(result) if result.template_values else INVALID_TICKER_BODY
+      response = app.response_class(
+        response=body.data,
+        status=200,
+        mimetype='application/json'
+      )
+      response.set_etag(body.etag)
+      add_age_headers(response, result)
+      # Only GET and HEAD requests are conditional.
+      return response.make_conditional(request)
+
     @app.route('/api/ticker/nvda')
     def api_ticker():
-      template_values = fetchDataForTickerSymbol("NVDA")
+      return lookup_response("NVDA")
+
+    @app.route('/api/ticker/<ticker>/sensitivity')
+    def api_sensitivity(ticker):
+      """Evaluates the valuations over a grid of assumptions for one ticker."""
+      def error(message, status):
+        return app.response_class(
+          response=json.dumps({'error' : message}),
+          status=status,
+          mimetype='application/json'
+        )
+
+      if not fetchFundamentalsForTickerSymbol:
+        return error('Sensitivity analysis is not available', 404)
+      fundamentals = fetchFundamentalsForTickerSymbol(ticker)
+      if not fundamentals:
+        return error('Invalid ticker symbol', 404)
 
-      if not template_values:
-        data = render_template('json/error.json', **{'error' : 'Invalid ticker symbol'})
-      else:
-        data = render_template('json/stock_data.json', **template_values)
+      try:
+        growth_rates = _parse_float_list(request, 'growth_rates',
+                                         _default_growth_rates(fundamentals.get('estimated_growth_rate')))
+        rates_of_return = _parse_float_list(request, 'rates_of_return', DEFAULT_RATES_OF_RETURN)
+        time_horizons = _parse_float_list(request, 'time_horizons', DEFAULT_TIME_HORIZONS)
+        margins_of_safety = _parse_float_list(request, 'margins_of_safety', DEFAULT_MARGINS_OF_SAFETY)
+      except ValueError:
+        return error('Grid values must be comma separated finite numbers', 400)
+      cells = len(growth_rates) * len(rates_of_return) * len(time_horizons) * len(margins_of_safety)
+      if not cells:
+        return error('Every grid axis needs at least one value', 400)
+      if cells > MAX_SENSITIVITY_CELLS:
+        return error(f'Grid is too large (max {MAX_SENSITIVITY_CELLS} cells)', 400)
 
+      grid = RuleOneBatch.sensitivity_grid(
+        fundamentals['ttm_eps'],
+        fundamentals['pe_low'],
+        fundamentals['pe_high'],
+        fundamentals['market_cap'],
+        fundamentals['net_income'],
+        growth_rates,
+        rates_of_return=rates_of_return,
+        time_horizons=time_horizons,
+        margins_of_safety=margins_of_safety
+      )
+      data = {
+        'ticker' : ticker,
+        'fundamentals' : fundamentals,
+        'axes' : {
+          'growth_rates' : growth_rates,
+          'rates_of_return' : rates_of_return,
+          'time_horizons' : time_horizons,
+          'margins_of_safety' : margins_of_safety,
+        },
+        'sticker_price' : RuleOneBatch.to_optional_list(grid['sticker_price']),
+        'margin_of_safety_price' : RuleOneBatch.to_optional_list(grid['margin_of_safety_price']),
+        'payback_time' : grid['payback_time'].tolist(),
+      }
       return app.response_class(
-        response=data,
+        response=json.dumps(data, separators=(',', ':')),
         status=200,
         mimetype='application/json'
-    )
+      )
+
+    @app.route('/api/screen')
+    def api_screen():
+      """Range-filters the whole stored universe, e.g. `?roic_5y=10:&price_to_mos=:1`."""
+      def error(message, status):
+        return app.response_class(
+          response=json.dumps({'error' : message}),
+          status=status,
+          mimetype='application/json'
+        )
+
+      if not screener:
+        return error('Screening is not available', 404)
+      try:
+        filters = _parse_screen_filters(request)
+        limit = int(request.args.get('limit', DEFAULT_SCREEN_LIMIT))
+      except ValueError as e:
+        return error(f'Invalid screen: {e}', 400)
+      if not 0 <= limit <= MAX_SCREEN_LIMIT:
+        return error(f'limit must be between 0 and {MAX_SCREEN_LIMIT}', 400)
+      try:
+        data = screener.screen(
+          filters,
+          sort=request.args.get('sort'),
+          descending=request.args.get('order', 'asc') == 'desc',
+          limit=limit
+        )
+      except ValueError as e:
+        return error(str(e), 400)
+      return app.response_class(
+        response=json.dumps(data, separators=(',', ':')),
+        status=200,
+        mimetype='application/json'
+      )
+
+    @app.route('/metrics')
+    def metrics_text():
+      if not metrics:
+        return app.response_class(response='Metrics are not available\n', status=404,
+                                  mimetype='text/plain')
+      return app.response_class(
+        response=metrics.render(),
+        status=200,
+        mimetype='text/plain; version=0.0.4'
+      )
+
+    @app.route('/metrics/traces')
+    def metrics_traces():
+      """Returns the recent lookup traces, newest first, optionally of one `ticker`."""
+      if not metrics:
+        return app.response_class(
+          response=json.dumps({'error' : 'Metrics are not available'}),
+          status=404,
+          mimetype='application/json'
+        )
+      traces = metrics.recent_traces(request.args.get('ticker'))
+      return app.response_class(
+        response=json.dumps([trace.as_dict() for trace in traces], separators=(',', ':')),
+        status=200,
+        mimetype='application/json'
+      )
+
+    @app.route('/metrics/hedging')
+    def metrics_hedging():
+      """Returns how many requests of each source were hedged, and how many hedges won."""
+      if not hedger:
+        return app.response_class(
+          response=json.dumps({'error' : 'Hedging stats are not available'}),
+          status=404,
+          mimetype='application/json'
+        )
+      return app.response_class(
+        response=json.dumps(hedger.get_stats(), separators=(',', ':')),
+        status=200,
+        mimetype='application/json'
+      )
+
+    @app.route('/profiles')
+    def list_profiles():
+      """Lists the kept profiles, newest first."""
+      if not profiler:
+        return app.response_class(
+          response=json.dumps({'error' : 'Profiling is not available'}),
+          status=404,
+          mimetype='application/json'
+        )
+      return app.response_class(
+        response=json.dumps(profiler.profiles(), separators=(',', ':')),
+        status=200,
+        mimetype='application/json'
+      )
+
+    @app.route('/profiles/<request_id>')
+    def get_profile(request_id):
+      """Returns the collapsed stacks sampled during a request."""
+      profile = profiler.get(request_id) if profiler else None
+      if profile is None:
+        return app.response_class(response='Profile not found\n', status=404, mimetype='text/plain')
+      return app.response_class(response=profile, status=200, mimetype='text/plain')
 
     @app.route('/api')
     def api():
@@ -43,6 +404,55 @@ def create_app(fetchDataForTickerSymbol):
         mimetype='application/json'
     )
 
+    @app.route('/api/tickers', methods=['GET', 'POST'])
+    def api_tickers():
+      """Evaluates many tickers at once, streaming NDJSON as each one finishes."""
+      tickers = _parse_batch_tickers(request)
+      if not tickers:
+        return app.response_class(
+          response=json.dumps({'error' : 'No ticker symbols provided'}),
+          status=400,
+          mimetype='application/json'
+        )
+      if len(tickers) > MAX_BATCH_TICKERS:
+        return app.response_class(
+          response=json.dumps({'error' : f'Too many ticker symbols (max {MAX_BATCH_TICKERS})'}),
+          status=400,
+          mimetype='application/json'
+        )
+
+      def generate():
+        executor = ThreadPoolExecutor(max_workers=min(max_batch_workers, len(tickers)))
+        try:
+          futures = {
+            executor.submit(lookup, ticker) : ticker
+            for ticker in tickers
+          }
+          for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+              result = future.result()
+            except SourcesUnavailable as e:
+              logger.warning(f'Batch fetch failed for {ticker}: {e}')
+              yield _render_ndjson_line(ticker, None, error=UPSTREAM_UNAVAILABLE_ERROR)
+              continue
+            except Exception as e:
+              logger.warning(f'Batch fetch failed for {ticker}: {e}')
+              yield _render_ndjson_line(ticker, None, error='Failed to fetch ticker data')
+              continue
+            if not result.template_values:
+              yield _render_ndjson_line(ticker, None, error='Invalid ticker symbol')
+              continue
+            yield _render_ndjson_line(ticker, result)
+        finally:
+          executor.shutdown(wait=False, cancel_futures=True)
+
+      return app.response_class(
+        response=stream_with_context(generate()),
+        status=200,
+        mimetype='application/x-ndjson'
+      )
+
     @app.route('/')
     def homepage():
       if request.environ['HTTP_HOST'].endswith('.appspot.com'):  #Redirect the appspot url to the custom url
@@ -59,10 +469,6 @@ def create_app(fetchDataForTickerSymbol):
       if request.environ['HTTP_HOST'].endswith('.appspot.com'):  #Redirect the appspot url to the custom url
         return '<meta http-equiv="refresh" content="0; url=http://isthisstockgood.com" />'
 
-      ticker = request.values.get('ticker')
-      template_values = fetchDataForTickerSymbol(ticker)
-      if not template_values:
-        return render_template('json/error.json', **{'error' : 'Invalid ticker symbol'})
-      return render_template('json/stock_data.json', **template_values)
+      return lookup_response(request.values.get('ticker'))
 
     return app
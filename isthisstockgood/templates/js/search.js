@@ -47,8 +47,10 @@ $(document).ready(function() {
     let posting = $.post(path, { ticker: $ticker } );
 
     posting.fail(function(response) {
+    // Errors the server explains, e.g. unavailable upstream sources, carry a message.
+    let error = response.responseJSON && response.responseJSON['error'];
     $.snackbar({
-          content: `There was an error. Code ${response.status}`,
+          content: error || `There was an error. Code ${response.status}`,
           style: 'toast',
           timeout: 3500
         });
@@ -57,8 +59,8 @@ $(document).ready(function() {
         return;
     })
     // Update the HTML with the results.
-    posting.done(function(json_data) {
-      data = JSON.parse(json_data);
+    // The response is served as application/json, so jQuery has parsed it already.
+    posting.done(function(data) {
       if (data['error']) {
         $.snackbar({
           content: data['error'],
@@ -1,8 +1,16 @@
-from isthisstockgood.DataFetcher import fetchDataForTickerSymbol
+from isthisstockgood.DataFetcher import fetchDataForTickerSymbol, fetchFundamentalsForTickerSymbol
+from isthisstockgood.Hedging import get_hedger
+from isthisstockgood.Metrics import configure_metrics
 from isthisstockgood.server import create_app
 
 # Expose `app` object at the module level, as expected by App Engine
-app = create_app(fetchDataForTickerSymbol)
+app = create_app(
+  fetchDataForTickerSymbol,
+  stale_while_revalidate=True,
+  fetchFundamentalsForTickerSymbol=fetchFundamentalsForTickerSymbol,
+  metrics=configure_metrics(enabled=True),
+  hedger=get_hedger()
+)
 
 if __name__ == '__main__':
   app.run(host='127.0.0.1', port=8080, debug=True)
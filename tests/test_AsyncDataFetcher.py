@@ -0,0 +1,163 @@
+"""Tests for the AsyncDataFetcher.py asyncio pipeline."""
+
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from functools import partial
+from urllib.parse import quote
+
+from isthisstockgood.Active.MSNMoney import MSNMoney
+from isthisstockgood.AsyncDataFetcher import (
+  AsyncDataFetcher, _create_client_session, aiohttp, fetchDataForTickerSymbolAsync
+)
+from isthisstockgood.DataFetcher import SourcesUnavailable, _fetchDataForTickerSymbol
+from isthisstockgood.FundamentalsStore import configure_fundamentals_store, get_fundamentals_store
+from isthisstockgood.Hedging import Hedger
+from isthisstockgood.Replay import (
+  RecordingStore, ReplayAdapter, ReplayServer, build_synthetic_recordings
+)
+from isthisstockgood.SessionPool import SessionPool
+from isthisstockgood.SourceCache import SourceCache
+from isthisstockgood.SymbolIndex import SymbolIndex, configure_symbol_index
+
+
+class _FakeStreamReader:
+
+  def __init__(self, body):
+    self._body = body.encode('utf8')
+
+  async def iter_chunked(self, size):
+    for start in range(0, len(self._body), size):
+      yield self._body[start:start + size]
+
+
+class _FakeResponse:
+
+  def __init__(self, status, body):
+    self.status = status
+    self.charset = 'utf-8'
+    self.content = _FakeStreamReader(body)
+    self._body = body
+
+  async def text(self):
+    return self._body
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self, *args):
+    return False
+
+
+class _FakeSession:
+  """Serves canned bodies keyed by URL, recording every requested URL."""
+
+  def __init__(self, responses):
+    self.responses = responses
+    self.requested = []
+
+  def get(self, url, **kwargs):
+    self.requested.append(url)
+    status, body = self.responses.get(url, (404, ''))
+    return _FakeResponse(status, body)
+
+
+class _ReplaySession:
+  """Sends the requests of an `aiohttp` session to a `ReplayServer`, like `ReplayAdapter`."""
+
+  def __init__(self, session, server_url):
+    self.session = session
+    self.server_url = server_url.rstrip('/')
+
+  def get(self, url, **kwargs):
+    return self.session.get(f'{self.server_url}/replay?url={quote(url, safe="")}', **kwargs)
+
+
+class AsyncDataFetcherTest(unittest.TestCase):
+
+  def test_zacks_growth_rate_is_parsed(self):
+    fetcher = AsyncDataFetcher('MSFT', None, symbol_index=SymbolIndex())
+    fetcher.session = _FakeSession({
+      'https://www.zacks.com/stock/quote/MSFT/detailed-earning-estimates' :
+          (200, '<td>Next 5 Years</td>\n<td>14.50%</td>\n'),
+    })
+    asyncio.run(fetcher.fetch_zacks_analysis())
+    self.assertEqual(fetcher.zacks_analysis.five_year_growth_rate, 14.5)
+
+  def test_msn_follow_up_requests_use_resolved_stock_id(self):
+    msn = MSNMoney('MSFT')
+    autocomplete = json.dumps({
+      'data' : {
+        'stocks' : [json.dumps({'RT00S' : 'MSFT', 'SecId' : 'a1xzim', 'Description' : 'Software'})]
+      }
+    })
+    session = _FakeSession({msn.get_ticker_autocomplete_url() : (200, autocomplete)})
+    fetcher = AsyncDataFetcher('MSFT', session, symbol_index=SymbolIndex())
+    asyncio.run(fetcher.fetch_msn_money_data())
+
+    self.assertEqual(fetcher.msn_money.description, 'Software')
+    self.assertIn(msn.get_key_ratios_url('a1xzim'), session.requested)
+    self.assertIn(msn.get_quotes_url('a1xzim'), session.requested)
+    self.assertIn(msn.get_annual_statements_url('a1xzim'), session.requested)
+
+  def test_failed_source_is_left_unparsed(self):
+    session = _FakeSession({})
+    fetcher = AsyncDataFetcher('MSFT', session, symbol_index=SymbolIndex())
+    asyncio.run(fetcher.fetch_all())
+    self.assertIsNone(fetcher.zacks_analysis.five_year_growth_rate)
+    self.assertIsNone(fetcher.yahoo_finance_analysis.five_year_growth_rate)
+    self.assertEqual(fetcher.msn_money.name, '')
+
+  def test_lookup_without_msn_money_is_invalid(self):
+    with tempfile.TemporaryDirectory() as directory:
+      configure_fundamentals_store(os.path.join(directory, 'fundamentals'), flush_every=None)
+      try:
+        self.assertIsNone(asyncio.run(fetchDataForTickerSymbolAsync('NOPE', session=_FakeSession({}))))
+        self.assertEqual(get_fundamentals_store().pending(), 0)
+
+        configure_symbol_index()
+        session = _FakeSession({
+          recording.url : (recording.status, recording.body)
+          for recording in build_synthetic_recordings(['MSFT'])
+        })
+        template_values = asyncio.run(fetchDataForTickerSymbolAsync('MSFT', session=session))
+        self.assertEqual(template_values['missing_sources'], [])
+        self.assertGreater(template_values['sticker_price'], 0)
+        self.assertEqual(get_fundamentals_store().pending(), 1)
+      finally:
+        configure_fundamentals_store(None)
+        configure_symbol_index()
+
+  @unittest.skipIf(aiohttp is None, 'requires the optional aiohttp dependency')
+  def test_pipelines_agree_on_unavailable_and_unknown_tickers(self):
+    # The async pipeline resolves stock ids with the process-wide index.
+    self.addCleanup(configure_symbol_index)
+    store = RecordingStore()
+    store.add_many(build_synthetic_recordings(['MSFT']))
+
+    def run_sync(server, ticker):
+      session_pool = SessionPool(max_workers=4, adapter_class=partial(ReplayAdapter, server_url=server.url))
+      try:
+        return _fetchDataForTickerSymbol(
+          ticker, deadline=None, session_pool=session_pool, cache=SourceCache(max_memory_bytes=0),
+          symbol_index=SymbolIndex(), hedger=Hedger(max_in_flight=0))
+      finally:
+        session_pool.close()
+
+    async def run_async(server, ticker):
+      async with _create_client_session() as session:
+        return await fetchDataForTickerSymbolAsync(ticker, session=_ReplaySession(session, server.url))
+
+    with ReplayServer(store, failure_rate=1.0) as server:
+      with self.assertRaises(SourcesUnavailable) as sync_error:
+        run_sync(server, 'MSFT')
+      with self.assertRaises(SourcesUnavailable) as async_error:
+        asyncio.run(run_async(server, 'MSFT'))
+    self.assertEqual(async_error.exception.sources, sync_error.exception.sources)
+
+    with ReplayServer(store) as server:
+      self.assertIsNone(run_sync(server, 'NOPE'))
+      self.assertIsNone(asyncio.run(run_async(server, 'NOPE')))
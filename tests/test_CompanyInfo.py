@@ -0,0 +1,77 @@
+"""Tests for the CompanyInfo.py fundamentals snapshots."""
+
+
+import unittest
+
+from isthisstockgood.Active.MSNMoney import MSNMoney
+from isthisstockgood.Active.YahooFinance import YahooFinanceAnalysis
+from isthisstockgood.Active.Zacks import Zacks
+from isthisstockgood.CompanyInfo import CompanyFundamentals, select_five_year_growth_rate
+from isthisstockgood.DataFetcher import computeTemplateValues
+from isthisstockgood.Replay import build_synthetic_recordings
+
+
+def _parse_sources(ticker):
+  bodies = {recording.url : recording.body for recording in build_synthetic_recordings([ticker])}
+  msn_money = MSNMoney(ticker)
+  stock_id = msn_money.extract_stock_id(bodies[msn_money.get_ticker_autocomplete_url()])
+  msn_money.parse_ratios_data(bodies[msn_money.get_key_ratios_url(stock_id)])
+  msn_money.parse_quotes_data(bodies[msn_money.get_quotes_url(stock_id)])
+  msn_money.parse_annual_report_data(bodies[msn_money.get_annual_statements_url(stock_id)])
+  yahoo_finance_analysis = YahooFinanceAnalysis(ticker)
+  yahoo_finance_analysis.parse_analyst_five_year_growth_rate(bodies[yahoo_finance_analysis.url])
+  zacks_analysis = Zacks(ticker)
+  zacks_analysis.five_year_growth_rate = zacks_analysis.get_growth_rate(bodies[zacks_analysis.url])
+  return msn_money, yahoo_finance_analysis, zacks_analysis
+
+
+class CompanyFundamentalsTest(unittest.TestCase):
+
+  def test_template_values_match_the_sources(self):
+    sources = _parse_sources('MSFT')
+    fundamentals = CompanyFundamentals.from_msn_money(*sources)
+    self.assertEqual(fundamentals.to_template_values(), computeTemplateValues('MSFT', *sources))
+
+  def test_falls_back_to_zacks_growth_rate(self):
+    msn_money, _, zacks_analysis = _parse_sources('MSFT')
+    fundamentals = CompanyFundamentals.from_msn_money(msn_money, None, zacks_analysis)
+    self.assertEqual(fundamentals.five_year_growth_rate, zacks_analysis.five_year_growth_rate)
+    self.assertEqual(fundamentals.to_template_values(),
+                     computeTemplateValues('MSFT', msn_money, None, zacks_analysis))
+
+  def test_series_are_slices_of_one_array(self):
+    fundamentals = CompanyFundamentals(
+      'DUMMY', eps=[1.0, 2.0], eps_growth_rates=None, quarterly_eps=[0.5], name='Dummy')
+    self.assertEqual(fundamentals.eps.tolist(), [1.0, 2.0])
+    self.assertIsNone(fundamentals.eps_growth_rates)
+    self.assertEqual(fundamentals.quarterly_eps.tolist(), [0.5])
+    self.assertIsNone(fundamentals.roic)
+    self.assertIsNone(fundamentals.market_cap)
+    self.assertFalse(hasattr(fundamentals, '__dict__'))
+
+  def test_series_past_65535_values(self):
+    fundamentals = CompanyFundamentals(
+      'DUMMY', eps=[1.0] * 70000, quarterly_eps=[0.5, 0.25])
+    self.assertEqual(len(fundamentals.eps), 70000)
+    self.assertEqual(fundamentals.quarterly_eps.tolist(), [0.5, 0.25])
+
+  def test_unknown_fields_are_rejected(self):
+    with self.assertRaises(TypeError):
+      CompanyFundamentals('DUMMY', price_to_book=1.0)
+
+  def test_keeps_requested_ticker(self):
+    msn_money, yahoo_finance_analysis, zacks_analysis = _parse_sources('MSFT')
+    fundamentals = CompanyFundamentals.from_msn_money(
+      msn_money, yahoo_finance_analysis, zacks_analysis, ticker='msft')
+    self.assertEqual(fundamentals.to_template_values()['ticker'], 'msft')
+
+
+class SelectFiveYearGrowthRateTest(unittest.TestCase):
+
+  def test_prefers_yahoo_then_zacks(self):
+    _, yahoo_finance_analysis, zacks_analysis = _parse_sources('MSFT')
+    self.assertEqual(select_five_year_growth_rate(yahoo_finance_analysis, zacks_analysis),
+                     yahoo_finance_analysis.five_year_growth_rate)
+    self.assertEqual(select_five_year_growth_rate(None, zacks_analysis),
+                     zacks_analysis.five_year_growth_rate)
+    self.assertEqual(select_five_year_growth_rate(None, None), 0)
@@ -0,0 +1,140 @@
+"""Tests for the FundamentalsStore.py columnar store."""
+
+
+import math
+import os
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from isthisstockgood.Active.MSNMoney import MSNMoney
+from isthisstockgood.Active.YahooFinance import YahooFinanceAnalysis
+from isthisstockgood.Active.Zacks import Zacks
+from isthisstockgood.CompanyInfo import CompanyFundamentals
+from isthisstockgood.DataFetcher import computeTemplateValues, recordFundamentals
+from isthisstockgood.FundamentalsStore import (
+  FundamentalsStore, FundamentalsTable, configure_fundamentals_store, get_fundamentals_store, open_fundamentals
+)
+from isthisstockgood.Replay import build_synthetic_recordings, synthetic_tickers
+
+
+def _parse_all_sources(tickers):
+  bodies = {recording.url : recording.body for recording in build_synthetic_recordings(tickers)}
+  for ticker in tickers:
+    msn_money = MSNMoney(ticker)
+    stock_id = msn_money.extract_stock_id(bodies[msn_money.get_ticker_autocomplete_url()])
+    msn_money.parse_ratios_data(bodies[msn_money.get_key_ratios_url(stock_id)])
+    msn_money.parse_quotes_data(bodies[msn_money.get_quotes_url(stock_id)])
+    msn_money.parse_annual_report_data(bodies[msn_money.get_annual_statements_url(stock_id)])
+    yahoo_finance_analysis = YahooFinanceAnalysis(ticker)
+    yahoo_finance_analysis.parse_analyst_five_year_growth_rate(bodies[yahoo_finance_analysis.url])
+    yield ticker, (msn_money, yahoo_finance_analysis, None)
+
+
+class FundamentalsStoreTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.directory.name, 'fundamentals')
+
+  def tearDown(self):
+    self.directory.cleanup()
+
+  def test_nothing_flushed(self):
+    store = FundamentalsStore(self.path)
+    self.assertIsNone(open_fundamentals(self.path))
+    self.assertIsNone(store.flush())
+    self.assertEqual(len(store), 0)
+
+  def test_series_are_right_aligned(self):
+    store = FundamentalsStore(self.path, max_years=4, max_quarters=2)
+    store.upsert(CompanyFundamentals(
+      'abc', name='ABC', eps=[1.0, 2.0, 3.0, 4.0, 5.0, 6.0], quarterly_eps=[0.5], market_cap=10))
+    table = store.flush()
+    self.assertEqual(table.columns['eps'].tolist(), [[3.0, 4.0, 5.0, 6.0]])
+    self.assertTrue(math.isnan(table.columns['quarterly_eps'][0, 0]))
+    self.assertEqual(table.latest('quarterly_eps').tolist(), [0.5])
+    fields = table.get('ABC')
+    self.assertEqual(fields['quarterly_eps'], [0.5])
+    self.assertEqual(fields['market_cap'], 10.0)
+    self.assertIsNone(fields['pe_low'])
+    self.assertEqual(fields['name'], 'ABC')
+
+  def test_upserts_replace_rows_and_survive_reopening(self):
+    clock = lambda: 1000.0
+    store = FundamentalsStore(self.path, flush_every=None, clock=clock)
+    store.upsert(CompanyFundamentals('A', market_cap=1.0))
+    store.upsert(CompanyFundamentals('B', market_cap=2.0))
+    first = store.flush()
+    store.upsert(CompanyFundamentals('a', market_cap=3.0))
+    store.upsert(CompanyFundamentals('C', market_cap=4.0))
+    self.assertEqual(store.pending(), 2)
+    store.flush()
+
+    # The previous generation is still readable through its mappings.
+    self.assertEqual(first.columns['market_cap'].tolist(), [1.0, 2.0])
+    table = open_fundamentals(self.path)
+    self.assertIsInstance(table.columns['market_cap'], np.memmap)
+    self.assertEqual(table.tickers, ['A', 'B', 'C'])
+    self.assertEqual(table.columns['market_cap'].tolist(), [3.0, 2.0, 4.0])
+    self.assertEqual(table.columns['updated_at'].tolist(), [1000.0] * 3)
+    self.assertEqual(len(FundamentalsStore(self.path)), 3)
+
+  def test_keeps_the_previous_generation(self):
+    store = FundamentalsStore(self.path, flush_every=None)
+    for ticker in ('A', 'B', 'C'):
+      store.upsert(CompanyFundamentals(ticker))
+      store.flush()
+    generations = sorted(entry for entry in os.listdir(self.path) if entry.startswith('gen-'))
+    self.assertEqual(generations, ['gen-000002', 'gen-000003'])
+    self.assertEqual(len(FundamentalsTable.load(os.path.join(self.path, 'gen-000002'))), 2)
+
+  def test_flushes_automatically(self):
+    store = FundamentalsStore(self.path, flush_every=2)
+    self.addCleanup(store.close)
+    flush, flushed_on = store.flush, []
+    store.flush = lambda: flushed_on.append(threading.current_thread().name) or flush()
+    store.upsert(CompanyFundamentals('A'))
+    self.assertTrue(store.join(5))
+    self.assertIsNone(open_fundamentals(self.path))
+    store.upsert(CompanyFundamentals('B'))
+    # The flush runs in the background, off the thread of the upsert.
+    self.assertTrue(store.join(5))
+    self.assertEqual(len(open_fundamentals(self.path)), 2)
+    self.assertTrue(flushed_on[0].startswith('IsThisStockGood-fundamentals'))
+    self.assertEqual(store.get_stats(), {'upserts' : 2, 'flushes' : 1, 'pending' : 0, 'tickers' : 2})
+
+  def test_valuations_match_template_values(self):
+    store = FundamentalsStore(self.path)
+    expected = {}
+    for ticker, sources in _parse_all_sources(synthetic_tickers(20)):
+      store.upsert(CompanyFundamentals.from_msn_money(*sources, ticker=ticker))
+      expected[ticker] = computeTemplateValues(ticker, *sources)
+    table = store.flush()
+
+    valuations = table.valuations()
+    for ticker, template_values in expected.items():
+      row = table.row_of(ticker)
+      for key in ('margin_of_safety_price', 'sticker_price', 'payback_time'):
+        value = template_values[key]
+        if value == 'null':
+          self.assertTrue(math.isnan(valuations[key][row]) or valuations[key][row] == -1)
+        else:
+          self.assertAlmostEqual(valuations[key][row], value, places=9, msg=(ticker, key))
+      self.assertAlmostEqual(round(valuations['ten_cap_price'][row], 2),
+                             template_values['ten_cap_price'])
+
+  def test_data_fetcher_feeds_configured_store(self):
+    self.assertIsNone(get_fundamentals_store())
+    configure_fundamentals_store(self.path, flush_every=None)
+    try:
+      (ticker, sources), = _parse_all_sources(['MSFT'])
+      recordFundamentals(ticker, *sources)
+      self.assertEqual(get_fundamentals_store().pending(), 1)
+    finally:
+      configure_fundamentals_store(None)
+    table = open_fundamentals(self.path)
+    self.assertEqual(table.tickers, ['MSFT'])
+    self.assertEqual(table.get('MSFT')['name'], sources[0].name)
@@ -0,0 +1,140 @@
+"""Tests for the Hedging.py hedged requests."""
+
+
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+
+from isthisstockgood.Hedging import Hedger, LatencyWindow
+
+
+class _Response:
+
+  def __init__(self, name):
+    self.name = name
+    self.closed = False
+
+  def close(self):
+    self.closed = True
+
+
+class _ControlledSessionPool:
+  """Returns futures that the test completes, running their hook like requests does."""
+
+  def __init__(self):
+    self.attempts = []
+    self._lock = threading.Lock()
+    self._sent = threading.Condition(self._lock)
+
+  def get(self, url, hooks=None, **kwargs):
+    future = Future()
+    with self._lock:
+      self.attempts.append((future, hooks['response'], kwargs))
+      self._sent.notify_all()
+    return future
+
+  def wait_for_attempts(self, count, timeout=5):
+    with self._sent:
+      return self._sent.wait_for(lambda: len(self.attempts) >= count, timeout=timeout)
+
+  def answer(self, index, response):
+    future, hook, _ = self.attempts[index]
+    future.set_result(hook(response) or response)
+
+  def fail(self, index, error):
+    self.attempts[index][0].set_exception(error)
+
+
+class LatencyWindowTest(unittest.TestCase):
+
+  def test_percentile(self):
+    window = LatencyWindow(size=100)
+    self.assertIsNone(window.percentile(95))
+    for latency in range(1, 101):
+      window.add(latency / 1000)
+    self.assertEqual(window.percentile(95), 0.095)
+    self.assertEqual(window.percentile(50), 0.05)
+    self.assertIsNone(window.percentile(95, min_samples=101))
+    window.add(1.0)
+    self.assertEqual(len(window), 100)
+    self.assertEqual(window.percentile(100), 1.0)
+
+
+class HedgerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.session_pool = _ControlledSessionPool()
+    self.parsed = []
+
+  def _hedger(self, **kwargs):
+    hedger = Hedger(min_samples=1, min_delay=0.01, **kwargs)
+    hedger.latencies('msn_quotes').add(0.01)
+    return hedger
+
+  def _hook(self, response, *args, **kwargs):
+    self.parsed.append(response.name)
+
+  def test_fast_requests_are_not_hedged(self):
+    hedger = self._hedger()
+    future = hedger.get(self.session_pool, 'msn_quotes', 'http://quotes', self._hook, stream=False)
+    self.session_pool.answer(0, _Response('primary'))
+    self.assertEqual(future.result().name, 'primary')
+    time.sleep(0.05)
+    self.assertEqual(len(self.session_pool.attempts), 1)
+    self.assertEqual(hedger.get_stats()['sources']['msn_quotes']['hedged'], 0)
+
+  def test_first_answer_wins_and_is_parsed_once(self):
+    hedger = self._hedger()
+    future = hedger.get(self.session_pool, 'msn_quotes', 'http://quotes', self._hook, stream=True)
+    self.assertTrue(self.session_pool.wait_for_attempts(2))
+    self.assertEqual(self.session_pool.attempts[1][2], {'stream' : True})
+    self.session_pool.answer(1, _Response('hedge'))
+    self.assertEqual(future.result().name, 'hedge')
+
+    late = _Response('primary')
+    self.session_pool.answer(0, late)
+    self.assertEqual(self.parsed, ['hedge'])
+    self.assertTrue(late.closed)
+    stats = hedger.get_stats()
+    self.assertEqual(stats['in_flight'], 0)
+    source_stats = stats['sources']['msn_quotes']
+    # Both answers were added to the latencies, which moved the delay.
+    self.assertGreaterEqual(source_stats.pop('delay'), 0.01)
+    self.assertEqual(source_stats, {'requests' : 1, 'hedged' : 1, 'hedges_won' : 1, 'capped' : 0})
+
+  def test_a_failed_attempt_waits_for_the_other(self):
+    hedger = self._hedger()
+    future = hedger.get(self.session_pool, 'msn_quotes', 'http://quotes', self._hook)
+    self.assertTrue(self.session_pool.wait_for_attempts(2))
+    self.session_pool.fail(0, ConnectionError('reset'))
+    self.assertFalse(future.done())
+    self.session_pool.answer(1, _Response('hedge'))
+    self.assertEqual(future.result().name, 'hedge')
+
+  def test_fails_when_every_attempt_failed(self):
+    hedger = self._hedger()
+    future = hedger.get(self.session_pool, 'msn_quotes', 'http://quotes', self._hook)
+    self.session_pool.fail(0, ConnectionError('reset'))
+    with self.assertRaises(ConnectionError):
+      future.result()
+    time.sleep(0.05)
+    # The failure cancelled the hedge.
+    self.assertEqual(len(self.session_pool.attempts), 1)
+
+  def test_hedges_in_flight_are_capped(self):
+    hedger = self._hedger(max_in_flight=1)
+    hedger.get(self.session_pool, 'msn_quotes', 'http://quotes/1', self._hook)
+    self.assertTrue(self.session_pool.wait_for_attempts(2))
+    hedger.get(self.session_pool, 'msn_quotes', 'http://quotes/2', self._hook)
+    time.sleep(0.05)
+    self.assertEqual(len(self.session_pool.attempts), 3)
+    self.assertEqual(hedger.get_stats()['sources']['msn_quotes']['capped'], 1)
+
+  def test_sources_need_enough_latencies(self):
+    hedger = Hedger(min_samples=2)
+    hedger.latencies('yahoo_analysis').add(0.5)
+    self.assertIsNone(hedger.delay('yahoo_analysis'))
+    hedger.latencies('yahoo_analysis').add(0.01)
+    self.assertEqual(hedger.delay('yahoo_analysis'), 0.5)
+    self.assertIsNone(Hedger(max_in_flight=0, min_samples=1).delay('yahoo_analysis'))
@@ -0,0 +1,76 @@
+"""Tests for the JSONBackend.py pluggable decoder."""
+
+
+import json
+import unittest
+
+import isthisstockgood.JSONBackend as JSONBackend
+from isthisstockgood.Active.MSNMoney import MSNMoney
+from isthisstockgood.Replay import build_synthetic_recordings
+
+
+class JSONBackendTest(unittest.TestCase):
+
+  def setUp(self):
+    self.previous = JSONBackend.get_json_backend()
+
+  def tearDown(self):
+    JSONBackend.configure_json_backend(self.previous)
+
+  def test_unknown_backend_is_rejected(self):
+    with self.assertRaises(ValueError):
+      JSONBackend.configure_json_backend('yaml')
+
+  def test_loads_members_matches_full_decode(self):
+    documents = [
+      {'displayName' : 'A', 'industry' : 'B', 'companyMetrics' : [{'roic' : 1.5}]},
+      {'companyMetrics' : [], 'industryMetrics' : [{'roic' : 2}], 'industry' : None},
+      {'displayName' : 'Only a name'},
+      # Nested duplicates of a key force a full decode.
+      {'companyMetrics' : [{'industry' : 'x'}, {'industry' : 'y'}], 'industry' : 'z'},
+      {'displayName' : 'Escaped \\"industry\\": "quotes"', 'industry' : 'C'},
+    ]
+    names = ('displayName', 'industry', 'companyMetrics')
+    for backend in JSONBackend.AVAILABLE_BACKENDS:
+      JSONBackend.configure_json_backend(backend)
+      for document in documents:
+        expected = {name : document[name] for name in names if name in document}
+        for content in (json.dumps(document), json.dumps(document, indent=2).encode('utf8')):
+          self.assertEqual(JSONBackend.loads_members(content, names), expected, (backend, content))
+
+  def test_dumps_is_compact_utf8(self):
+    data = {'name' : 'Société Générale', 'prices' : [1.5, 2], 'missing' : None}
+    for backend in JSONBackend.AVAILABLE_BACKENDS:
+      JSONBackend.configure_json_backend(backend)
+      self.assertEqual(JSONBackend.dumps(data),
+                       '{"name":"Société Générale","prices":[1.5,2],"missing":null}'.encode('utf8'))
+
+  def test_dumps_decodes_to_the_same_values_on_every_backend(self):
+    data = {'market_cap' : 1e16, 'eps' : [1e-05, 0.1, -2.5e300], 'shares' : 10 ** 12}
+    for backend in JSONBackend.AVAILABLE_BACKENDS:
+      JSONBackend.configure_json_backend(backend)
+      self.assertEqual(json.loads(JSONBackend.dumps(data)), data, backend)
+
+  def test_loads_members_of_non_object(self):
+    for backend in JSONBackend.AVAILABLE_BACKENDS:
+      JSONBackend.configure_json_backend(backend)
+      self.assertEqual(JSONBackend.loads_members('[1, 2]', ('a',)), {})
+
+  def test_msn_parsers_agree_across_backends(self):
+    recordings = {
+      recording.url : recording.body.encode('utf8')
+      for recording in build_synthetic_recordings(['MSFT'])
+    }
+    results = []
+    for backend in JSONBackend.AVAILABLE_BACKENDS:
+      JSONBackend.configure_json_backend(backend)
+      msn_money = MSNMoney('MSFT')
+      stock_id = msn_money.extract_stock_id(recordings[msn_money.get_ticker_autocomplete_url()])
+      self.assertTrue(msn_money.parse_ratios_data(recordings[msn_money.get_key_ratios_url(stock_id)]))
+      msn_money.parse_quotes_data(recordings[msn_money.get_quotes_url(stock_id)])
+      msn_money.parse_annual_report_data(recordings[msn_money.get_annual_statements_url(stock_id)])
+      results.append(vars(msn_money))
+    self.assertTrue(results[0]['name'])
+    self.assertGreater(results[0]['last_year_net_income'], 0)
+    for result in results[1:]:
+      self.assertEqual(result, results[0])
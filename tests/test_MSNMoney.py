@@ -64,3 +64,29 @@ class MSNMoneyTest(unittest.TestCase):
     self.assertEqual(msn.pe_high, None)
     # PE Low is 1.5, cause 0.5 isn't in last 5 years
     self.assertEqual(msn.pe_low, None)
+
+  def test_extract_metric_columns_splits_periods_in_one_pass(self):
+    msn = MSNMoney('DUMMY')
+    payload = {
+      'companyMetrics' : [
+        {'fiscalPeriodType' : 'Annual', 'earningsPerShare' : 1.5, 'roic' : 10},
+        {'fiscalPeriodType' : 'Q1', 'earningsPerShare' : 0.5, 'debtToEquityRatio' : 40.0},
+        {'fiscalPeriodType' : 'Annual', 'earningsPerShare' : 2.0, 'roic' : None},
+        {'fiscalPeriodType' : 'TTM', 'earningsPerShare' : 99.0},
+        {'fiscalPeriodType' : 'Q2', 'earningsPerShare' : 0.75},
+      ]
+    }
+    annual, quarterly = msn._extract_metric_columns(payload)
+    self.assertEqual(list(annual['earningsPerShare']), [1.5, 2.0])
+    # Missing and null values are skipped in their column.
+    self.assertEqual(list(annual['roic']), [10.0])
+    self.assertEqual(list(annual['priceToEarningsRatio']), [])
+    self.assertEqual(list(quarterly['earningsPerShare']), [0.5, 0.75])
+    self.assertEqual(list(quarterly['debtToEquityRatio']), [40.0])
+
+  def test_extract_metric_columns_without_periods(self):
+    annual, quarterly = MSNMoney('DUMMY')._extract_metric_columns({
+      'companyMetrics' : [{'fiscalPeriodType' : 'Annual', 'roic' : 1.0}]
+    })
+    self.assertEqual(list(annual['roic']), [1.0])
+    self.assertIsNone(quarterly)
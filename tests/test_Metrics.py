@@ -0,0 +1,138 @@
+"""Tests for the Metrics.py timing spans and Prometheus metrics."""
+
+
+import unittest
+from functools import partial
+
+from isthisstockgood.DataFetcher import _runDataFetcher
+from isthisstockgood.Hedging import Hedger
+from isthisstockgood.Metrics import (
+  Counter, Histogram, Metrics, configure_metrics, get_metrics
+)
+from isthisstockgood.Replay import (
+  ReplayAdapter, ReplayServer, RecordingStore, build_synthetic_recordings, synthetic_tickers
+)
+from isthisstockgood.SessionPool import SessionPool
+from isthisstockgood.SourceCache import SourceCache
+from isthisstockgood.SymbolIndex import SymbolIndex
+
+
+class _FakeClock:
+
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+
+class MetricsTest(unittest.TestCase):
+
+  def test_histogram_renders_cumulative_buckets(self):
+    histogram = Histogram('latency_seconds', 'Latency.', ('source',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, 'msn')
+    histogram.observe(0.1, 'msn')
+    histogram.observe(5.0, 'msn')
+    self.assertEqual(histogram.count('msn'), 3)
+    self.assertEqual(histogram.render(), [
+      '# HELP latency_seconds Latency.',
+      '# TYPE latency_seconds histogram',
+      'latency_seconds_bucket{source="msn",le="0.1"} 2',
+      'latency_seconds_bucket{source="msn",le="1.0"} 2',
+      'latency_seconds_bucket{source="msn",le="+Inf"} 3',
+      'latency_seconds_sum{source="msn"} 5.15',
+      'latency_seconds_count{source="msn"} 3',
+    ])
+
+  def test_counter_escapes_label_values(self):
+    counter = Counter('requests_total', 'Requests.', ('outcome',))
+    counter.inc('say "hi"\n')
+    counter.inc('say "hi"\n', amount=2)
+    self.assertEqual(counter.render()[-1], 'requests_total{outcome="say \\"hi\\"\\n"} 3')
+
+  def test_trace_spans_are_relative_to_its_start(self):
+    metrics = Metrics(enabled=True)
+    clock = _FakeClock()
+    trace = metrics.start_trace('MSFT')
+    trace.clock = clock
+    trace.started_at = clock()
+    trace.stage('msn_quotes', 'ttfb', 1000.5, 1001.0)
+    clock.now = 1002.0
+    with trace.span('compute', step=1):
+      clock.now = 1002.25
+    self.assertEqual(trace.finish(), 2.25)
+
+    self.assertEqual(metrics.recent_traces('MSFT'), [trace])
+    self.assertEqual(metrics.recent_traces('AAPL'), [])
+    self.assertEqual(trace.as_dict()['spans'], [
+      {'name' : 'msn_quotes.ttfb', 'start' : 0.5, 'duration' : 0.5},
+      {'name' : 'compute', 'start' : 2.0, 'duration' : 0.25, 'step' : 1},
+    ])
+    self.assertEqual(metrics.stage_seconds.count('msn_quotes', 'ttfb'), 1)
+    self.assertEqual(metrics.lookup_seconds.count(), 1)
+
+  def test_disabled_metrics_do_not_trace(self):
+    self.assertFalse(get_metrics().enabled)
+    self.assertIsNone(Metrics().start_trace('MSFT'))
+
+
+class PipelineMetricsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tickers = synthetic_tickers(2)
+    self.store = RecordingStore()
+    self.store.add_many(build_synthetic_recordings(self.tickers))
+    self.metrics = configure_metrics(enabled=True)
+
+  def tearDown(self):
+    configure_metrics()
+
+  def _run(self, server, ticker):
+    session_pool = SessionPool(max_workers=4, adapter_class=partial(ReplayAdapter, server_url=server.url))
+    try:
+      return _runDataFetcher(
+        ticker,
+        session_pool=session_pool,
+        cache=SourceCache(max_memory_bytes=0),
+        symbol_index=SymbolIndex(),
+        hedger=Hedger(max_in_flight=0)
+      )
+    finally:
+      session_pool.close()
+
+  def test_every_request_is_traced(self):
+    with ReplayServer(self.store) as server:
+      data_fetcher = self._run(server, self.tickers[0])
+    self.assertIsNotNone(data_fetcher.msn_money.current_price)
+
+    trace = data_fetcher.trace
+    self.assertEqual(self.metrics.recent_traces(), [trace])
+    span_names = {span.name for span in trace.spans}
+    for source in ('msn_autosuggest', 'msn_ratios', 'msn_quotes', 'msn_annual_report',
+                   'yahoo_analysis'):
+      for stage in ('queue', 'ttfb', 'body', 'parse'):
+        self.assertIn(f'{source}.{stage}', span_names)
+        self.assertEqual(self.metrics.stage_seconds.count(source, stage), 1)
+      self.assertEqual(self.metrics.requests.value(source, '200'), 1)
+    # The streamed Zacks body is read by its parser.
+    self.assertIn('zacks_analysis.parse', span_names)
+    self.assertNotIn('zacks_analysis.body', span_names)
+    # The first request to the replay server opened a connection.
+    self.assertTrue(any(span.name.endswith('.connect') for span in trace.spans))
+    for span in trace.spans:
+      self.assertGreaterEqual(span.start, 0)
+      self.assertGreaterEqual(span.duration, 0)
+
+    text = self.metrics.render()
+    self.assertIn('# TYPE isthisstockgood_upstream_stage_seconds histogram', text)
+    self.assertIn('isthisstockgood_upstream_stage_seconds_count{source="msn_quotes",stage="parse"} 1',
+                  text)
+    self.assertIn('isthisstockgood_lookup_seconds_count 1', text)
+
+  def test_disabled_metrics_skip_timing(self):
+    configure_metrics()
+    with ReplayServer(self.store) as server:
+      data_fetcher = self._run(server, self.tickers[1])
+    self.assertIsNone(data_fetcher.trace)
+    self.assertIsNotNone(data_fetcher.msn_money.current_price)
+    self.assertEqual(self.metrics.stage_seconds.count('msn_quotes', 'parse'), 0)
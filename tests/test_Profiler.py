@@ -0,0 +1,99 @@
+"""Tests for the Profiler.py sampling profiler."""
+
+
+import os
+import tempfile
+import threading
+import unittest
+
+from isthisstockgood.Profiler import (
+  KEPT_SAMPLED, KEPT_SLOW, SamplingProfiler, is_valid_request_id
+)
+
+
+class _FakeClock:
+
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+
+def _busy_in_parser(started, done):
+  started.set()
+  done.wait()
+
+
+class SamplingProfilerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.clock = _FakeClock()
+    # A long interval, so that only the explicit `sample` calls count.
+    self.profiler = SamplingProfiler(self.directory.name, threshold=1.0, interval=60,
+                                     max_profiles=2, clock=self.clock)
+
+  def tearDown(self):
+    self.profiler.close()
+    self.directory.cleanup()
+
+  def test_keeps_slow_requests(self):
+    fast = self.profiler.start('fast')
+    self.clock.now += 0.5
+    self.assertIsNone(self.profiler.stop(fast))
+    self.assertIsNone(self.profiler.get('fast'))
+
+    slow = self.profiler.start('slow', name='/search')
+    self.profiler.sample()
+    self.profiler.sample()
+    self.clock.now += 2
+    metadata = self.profiler.stop(slow)
+    self.assertEqual(metadata['reason'], KEPT_SLOW)
+    self.assertEqual(metadata['duration'], 2)
+    self.assertGreaterEqual(metadata['samples'], 2)
+    self.assertEqual(self.profiler.profiles(), [metadata])
+
+    profile = self.profiler.get('slow')
+    stack, count = profile.splitlines()[-1].rsplit(' ', 1)
+    self.assertTrue(stack.startswith('request;'))
+    self.assertIn('test_keeps_slow_requests (test_Profiler.py:', stack)
+    self.assertEqual(int(count), 2)
+
+  def test_samples_busy_workers(self):
+    started, done = threading.Event(), threading.Event()
+    worker = threading.Thread(target=_busy_in_parser, args=(started, done),
+                              name='IsThisStockGood-http_0')
+    worker.start()
+    started.wait()
+    try:
+      session = self.profiler.start('request')
+      self.profiler.sample()
+    finally:
+      done.set()
+      worker.join()
+    self.assertTrue(any(stack.startswith('worker;') and '_busy_in_parser' in stack
+                        for stack in session.samples))
+
+  def test_sample_rate_and_eviction(self):
+    self.profiler.sample_rate = 1.0
+    for request_id in ('a', 'b', 'c'):
+      metadata = self.profiler.stop(self.profiler.start(request_id))
+      self.assertEqual(metadata['reason'], KEPT_SAMPLED)
+    self.assertEqual([profile['request_id'] for profile in self.profiler.profiles()], ['c', 'b'])
+    self.assertIsNone(self.profiler.get('a'))
+    self.assertEqual(sorted(os.listdir(self.directory.name)), ['b.collapsed', 'c.collapsed'])
+
+  def test_background_sampling(self):
+    profiler = SamplingProfiler(self.directory.name, threshold=0, interval=0.001)
+    try:
+      session = profiler.start('background')
+      threading.Event().wait(0.05)
+      self.assertGreater(profiler.stop(session)['samples'], 0)
+    finally:
+      profiler.close()
+
+  def test_request_ids(self):
+    self.assertTrue(is_valid_request_id('4f3c-a.b_1'))
+    for request_id in (None, '', '..', '../etc', 'a/b', 'x' * 65):
+      self.assertFalse(is_valid_request_id(request_id))
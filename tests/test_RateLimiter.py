@@ -0,0 +1,130 @@
+"""Tests for the RateLimiter.py token bucket."""
+
+
+import unittest
+
+from isthisstockgood.RateLimiter import (
+  CIRCUIT_OPEN, RATE_LIMITED, CircuitBreaker, HostGuard, TokenBucket
+)
+
+
+class _FakeClock:
+
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+
+class TokenBucketTest(unittest.TestCase):
+
+  def test_refills_at_rate_up_to_burst(self):
+    clock = _FakeClock()
+    bucket = TokenBucket(2, burst=3, clock=clock)
+    self.assertEqual(bucket.available(), 3)
+    for _ in range(3):
+      self.assertTrue(bucket.try_acquire())
+    self.assertFalse(bucket.try_acquire())
+    self.assertAlmostEqual(bucket.delay(), 0.5)
+    clock.now += 0.5
+    self.assertTrue(bucket.try_acquire())
+    clock.now += 100
+    self.assertEqual(bucket.available(), 3)
+
+  def test_reserves_tokens_ahead_of_time(self):
+    clock = _FakeClock()
+    bucket = TokenBucket(10, burst=1, clock=clock)
+    self.assertEqual(bucket.reserve(max_wait=1), 0.0)
+    self.assertAlmostEqual(bucket.reserve(max_wait=1), 0.1)
+    # The next token is already promised to the previous reservation.
+    self.assertIsNone(bucket.reserve(max_wait=0.15))
+    self.assertAlmostEqual(bucket.reserve(max_wait=0.2), 0.2)
+    clock.now += 0.35
+    self.assertEqual(bucket.reserve(), 0.0)
+
+  def test_refunds_unused_tokens(self):
+    clock = _FakeClock()
+    bucket = TokenBucket(10, burst=2, clock=clock)
+    self.assertTrue(bucket.try_acquire(2))
+    bucket.refund()
+    self.assertEqual(bucket.available(), 1)
+    bucket.refund(5)
+    self.assertEqual(bucket.available(), 2)
+
+  def test_default_burst(self):
+    self.assertEqual(TokenBucket(0.5).burst, 1)
+    self.assertEqual(TokenBucket(10).burst, 10)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.clock = _FakeClock()
+    self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=self.clock)
+
+  def test_opens_after_consecutive_failures(self):
+    self.breaker.record_failure()
+    self.breaker.record_success()
+    self.breaker.record_failure()
+    self.assertTrue(self.breaker.allow())
+    self.breaker.record_failure()
+    self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+    self.assertFalse(self.breaker.allow())
+    self.assertEqual(self.breaker.trips, 1)
+
+  def test_half_open_trial(self):
+    self.breaker.record_failure()
+    self.breaker.record_failure()
+    self.clock.now += 30
+    self.assertTrue(self.breaker.allows())
+    self.assertTrue(self.breaker.allow())
+    self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+    # Only one trial at a time.
+    self.assertFalse(self.breaker.allow())
+    self.breaker.record_failure()
+    self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+    self.clock.now += 30
+    self.assertTrue(self.breaker.allow())
+    self.breaker.record_success()
+    self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+    self.assertTrue(self.breaker.allow())
+
+
+class HostGuardTest(unittest.TestCase):
+
+  def test_rejections_per_host(self):
+    clock = _FakeClock()
+    guard = HostGuard(rate=1, burst=2, failure_threshold=1, clock=clock,
+                      overrides={'unlimited.com' : {'rate' : None}})
+    self.assertIsNone(guard.acquire('a.com'))
+    self.assertIsNone(guard.acquire('a.com'))
+    self.assertEqual(guard.acquire('a.com'), RATE_LIMITED)
+    for _ in range(10):
+      self.assertIsNone(guard.acquire('unlimited.com'))
+    guard.record('b.com', False)
+    self.assertFalse(guard.allows('b.com'))
+    self.assertEqual(guard.acquire('b.com'), CIRCUIT_OPEN)
+    self.assertEqual(guard.reserve('a.com', max_wait=1.0), (None, 1.0))
+    stats = guard.get_stats()
+    self.assertEqual(stats['a.com'][RATE_LIMITED], 1)
+    self.assertEqual(stats['b.com'][CIRCUIT_OPEN], 1)
+    self.assertEqual(stats['b.com']['state'], CircuitBreaker.OPEN)
+
+  def test_rejected_trial_returns_its_token(self):
+    clock = _FakeClock()
+    guard = HostGuard(rate=1, burst=2, failure_threshold=1, reset_timeout=10, clock=clock)
+    bucket, breaker = guard._host('a.com')
+    guard.record('a.com', False)
+    clock.now += 10
+    allows = breaker.allows
+
+    def allows_then_lose_the_trial():
+      # Another request starts the half open trial right after this check.
+      result = allows()
+      breaker.allow()
+      return result
+
+    breaker.allows = allows_then_lose_the_trial
+    self.assertEqual(guard.reserve('a.com'), (CIRCUIT_OPEN, 0.0))
+    self.assertEqual(bucket.available(), 2)
@@ -0,0 +1,162 @@
+"""Tests for the RefreshScheduler.py watchlist refresher."""
+
+
+import threading
+import unittest
+
+from isthisstockgood.RefreshScheduler import FUNDAMENTALS, QUOTES, RefreshScheduler
+from isthisstockgood.ResultCache import ResultCache
+
+
+class _FakeClock:
+
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+
+class _RecordingSourceCache:
+
+  def __init__(self):
+    self.expired = []
+
+  def expire(self, kind, ticker):
+    self.expired.append((kind, ticker))
+
+
+class _Fetch:
+
+  def __init__(self):
+    self.calls = []
+    self.release = threading.Event()
+    self.release.set()
+    self.invalid = set()
+
+  def __call__(self, ticker):
+    self.release.wait(5)
+    self.calls.append(ticker)
+    if ticker in self.invalid:
+      return None
+    return {'ticker' : ticker, 'version' : len(self.calls)}
+
+
+class RefreshSchedulerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.clock = _FakeClock()
+    self.fetch = _Fetch()
+    self.source_cache = _RecordingSourceCache()
+    self.result_cache = ResultCache(self.fetch, ttl=300, clock=self.clock)
+
+  def _scheduler(self, watchlist, **kwargs):
+    kwargs.setdefault('host_rate', 1000)
+    kwargs.setdefault('host_burst', 1000)
+    scheduler = RefreshScheduler(
+      self.fetch, self.result_cache, watchlist=watchlist, source_cache=self.source_cache,
+      quotes_interval=60, fundamentals_interval=3600, retry_interval=30, clock=self.clock,
+      **kwargs)
+    self.addCleanup(scheduler.stop)
+    return scheduler
+
+  def _run(self, scheduler):
+    started = scheduler.run_pending()
+    self.assertTrue(scheduler.join(5))
+    return started
+
+  def test_refreshes_into_result_cache(self):
+    scheduler = self._scheduler(['msft', 'AAPL'])
+    self.assertEqual(self._run(scheduler), 2)
+    self.assertEqual(sorted(self.fetch.calls), ['AAPL', 'MSFT'])
+    result = self.result_cache.get('msft')
+    self.assertFalse(result.stale)
+    # Stored as refreshed, but served as requested.
+    self.assertEqual(result.template_values['ticker'], 'msft')
+    self.assertEqual(len(self.fetch.calls), 2)
+    self.assertEqual(
+      sorted(kind for kind, ticker in self.source_cache.expired if ticker == 'MSFT'),
+      sorted(FUNDAMENTALS.source_kinds))
+    self.assertEqual(scheduler.get_stats()['refreshes'], 2)
+
+  def test_quotes_refresh_on_their_own_cadence(self):
+    scheduler = self._scheduler(['MSFT'])
+    self._run(scheduler)
+    self.clock.now += 59
+    self.assertEqual(self._run(scheduler), 0)
+    self.clock.now += 1
+    self.source_cache.expired.clear()
+    self.assertEqual(self._run(scheduler), 1)
+    self.assertEqual(self.source_cache.expired, [('msn_quotes', 'MSFT')])
+    self.clock.now += 3600
+    self.source_cache.expired.clear()
+    self._run(scheduler)
+    self.assertEqual(len(self.source_cache.expired), len(FUNDAMENTALS.source_kinds))
+
+  def test_lookups_count_as_quote_refreshes(self):
+    scheduler = self._scheduler(['MSFT'])
+    self._run(scheduler)
+    self.clock.now += 50
+    self.result_cache.put('MSFT', {'ticker' : 'MSFT'})
+    self.clock.now += 50
+    self.assertEqual(self._run(scheduler), 0)
+
+  def test_most_urgent_refreshes_start_first(self):
+    scheduler = self._scheduler({'A' : 1, 'B' : 1, 'C' : 5}, max_workers=1)
+    self._run(scheduler)
+    self._run(scheduler)
+    self._run(scheduler)
+    # Never refreshed tickers tie, so the most popular one goes first.
+    self.assertEqual(self.fetch.calls[0], 'C')
+
+    self.fetch.calls.clear()
+    self.clock.now += 120
+    # A is four times overdue, B and C twice. C is more popular than A.
+    scheduler._watched['A'].refreshed_at[QUOTES.name] = self.clock.now - 240
+    for ticker in ('C', 'B', 'A'):
+      self.result_cache.invalidate(ticker)
+    for _ in range(3):
+      self._run(scheduler)
+    self.assertEqual(self.fetch.calls, ['C', 'A', 'B'])
+
+  def test_record_lookup_raises_popularity(self):
+    scheduler = self._scheduler({'A' : 1})
+    scheduler.record_lookup('a')
+    scheduler.record_lookup('UNWATCHED')
+    self.assertEqual(scheduler.watchlist(), {'A' : 2})
+
+  def test_failures_are_retried_later(self):
+    self.fetch.invalid.add('BAD')
+    scheduler = self._scheduler(['BAD'])
+    self._run(scheduler)
+    self.assertEqual(self._run(scheduler), 0)
+    self.clock.now += 30
+    self.assertEqual(self._run(scheduler), 1)
+    self.assertEqual(scheduler.get_stats()['failures'], 2)
+    self.assertIsNone(self.result_cache.age_of('BAD'))
+
+  def test_respects_host_concurrency(self):
+    self.fetch.release.clear()
+    scheduler = self._scheduler(['A', 'B', 'C'], host_concurrency=1)
+    self.assertEqual(scheduler.run_pending(), 1)
+    self.assertEqual(scheduler.run_pending(), 0)
+    self.assertEqual(scheduler.get_stats()['running_per_host']['www.zacks.com'], 1)
+    self.fetch.release.set()
+    self.assertTrue(scheduler.join(5))
+    self.assertEqual(scheduler.run_pending(), 1)
+
+  def test_respects_host_rate_limit(self):
+    scheduler = self._scheduler(['A', 'B', 'C'], host_rate=0.001, host_burst=2)
+    self.assertEqual(self._run(scheduler), 2)
+    self.assertEqual(self._run(scheduler), 0)
+    self.assertGreater(scheduler.get_stats()['rate_limited'], 0)
+
+  def test_background_thread(self):
+    scheduler = self._scheduler(['A'], tick=0.01)
+    scheduler.start()
+    for _ in range(500):
+      if self.result_cache.age_of('A') is not None:
+        break
+      threading.Event().wait(0.01)
+    scheduler.stop()
+    self.assertEqual(self.fetch.calls, ['A'])
@@ -0,0 +1,211 @@
+"""Tests for the Replay.py offline record/replay harness."""
+
+
+import os
+import tempfile
+import time
+import unittest
+from functools import partial
+from urllib.parse import urlparse
+
+from isthisstockgood.Active.MSNMoney import MSNMoney
+from isthisstockgood.Active.YahooFinance import YahooFinanceAnalysis
+from isthisstockgood.Active.Zacks import Zacks
+from isthisstockgood.DataFetcher import (
+  SourcesUnavailable,
+  _fetchDataForTickerSymbol,
+  _runDataFetcher,
+  computeTemplateValues,
+  fetchFundamentalsForTickerSymbol,
+)
+from isthisstockgood.FundamentalsStore import configure_fundamentals_store
+from isthisstockgood.Hedging import Hedger
+from isthisstockgood.RateLimiter import HostGuard
+from isthisstockgood.Replay import (
+  Recording,
+  ReplayAdapter,
+  ReplayServer,
+  RecordingStore,
+  build_synthetic_recordings,
+  synthetic_tickers,
+)
+from isthisstockgood.SessionPool import SessionPool
+from isthisstockgood.SourceCache import DAY, SourceCache
+from isthisstockgood.SymbolIndex import SymbolIndex
+
+
+class _FakeClock:
+
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+
+class ReplayTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tickers = synthetic_tickers(3)
+    self.store = RecordingStore()
+    self.store.add_many(build_synthetic_recordings(self.tickers))
+
+  def _run(self, server, ticker, cache=None, host_guard=None, deadline=None,
+           fetch=_runDataFetcher):
+    session_pool = SessionPool(
+      max_workers=4,
+      adapter_class=partial(ReplayAdapter, server_url=server.url),
+      host_guard=host_guard
+    )
+    try:
+      return fetch(
+        ticker,
+        deadline=deadline,
+        session_pool=session_pool,
+        cache=cache or SourceCache(max_memory_bytes=0),
+        symbol_index=SymbolIndex(),
+        # No hedges, so that every source is requested exactly once.
+        hedger=Hedger(max_in_flight=0)
+      )
+    finally:
+      session_pool.close()
+
+  def _template_values(self, ticker, data_fetcher):
+    return computeTemplateValues(
+      ticker,
+      data_fetcher.msn_money,
+      data_fetcher.yahoo_finance_analysis,
+      data_fetcher.zacks_analysis
+    )
+
+  def test_synthetic_tickers_are_distinct(self):
+    tickers = synthetic_tickers(1000)
+    self.assertEqual(len(set(tickers)), 1000)
+
+  def test_full_pipeline_runs_offline(self):
+    with ReplayServer(self.store) as server:
+      for ticker in self.tickers:
+        data_fetcher = self._run(server, ticker)
+        template_values = computeTemplateValues(
+          ticker,
+          data_fetcher.msn_money,
+          data_fetcher.yahoo_finance_analysis,
+          data_fetcher.zacks_analysis
+        )
+        self.assertEqual(template_values['name'], f'{ticker} Corp.')
+        self.assertGreater(template_values['sticker_price'], 0)
+        self.assertGreater(template_values['payback_time'], 0)
+        self.assertGreater(data_fetcher.msn_money.last_year_net_income, 0)
+      self.assertEqual(server.get_stats()['misses'], 0)
+
+  def test_failure_injection(self):
+    with ReplayServer(self.store, failure_rate=1.0) as server:
+      data_fetcher = self._run(server, self.tickers[0])
+      self.assertIsNone(data_fetcher.yahoo_finance_analysis.five_year_growth_rate)
+      self.assertIsNone(data_fetcher.zacks_analysis.five_year_growth_rate)
+      self.assertEqual(server.get_stats()['failures'], server.get_stats()['requests'])
+
+  def test_deadline_leaves_out_late_sources(self):
+    ticker = self.tickers[0]
+    zacks_host = urlparse(Zacks(ticker).url).hostname
+    elapsed = []
+
+    def timed_fetch(*args, **kwargs):
+      start = time.perf_counter()
+      data_fetcher = _runDataFetcher(*args, **kwargs)
+      elapsed.append(time.perf_counter() - start)
+      return data_fetcher
+
+    with ReplayServer(self.store, host_latency={zacks_host : 1.0}) as server:
+      data_fetcher = self._run(server, ticker, deadline=0.5, fetch=timed_fetch)
+      self.assertLess(elapsed[0], 1.0)
+      self.assertEqual(data_fetcher.missing_sources(), ['zacks_analysis'])
+      # The late response is discarded once it arrives.
+      time.sleep(0.7)
+      self.assertIsNone(data_fetcher.zacks_analysis.five_year_growth_rate)
+    self.assertGreater(self._template_values(ticker, data_fetcher)['sticker_price'], 0)
+
+  def test_partial_results_compute_what_they_can(self):
+    ticker = self.tickers[0]
+    quotes_host = urlparse(MSNMoney.QUOTES_URL).hostname
+    with ReplayServer(self.store, host_latency={quotes_host : 1.0}) as server:
+      template_values = self._run(server, ticker, deadline=0.5, fetch=_fetchDataForTickerSymbol)
+    self.assertEqual(template_values['missing_sources'], ['msn_quotes', 'msn_annual_report'])
+    self.assertGreater(template_values['ten_cap_price'], 0)
+    self.assertGreater(template_values['margin_of_safety_price'], 0)
+    for key in ('current_price', 'payback_time', 'free_cash_flow', 'debt_payoff_time'):
+      self.assertEqual(template_values[key], 'null')
+
+  def test_page_without_estimate_is_not_missing(self):
+    ticker = self.tickers[0]
+    url = YahooFinanceAnalysis(ticker).url
+    self.store.add(Recording(url, 200, '<html><body><p>No estimates</p></body></html>'))
+    with ReplayServer(self.store) as server:
+      template_values = self._run(server, ticker, fetch=_fetchDataForTickerSymbol)
+    # Zacks supplied the growth rate, and nothing failed.
+    self.assertEqual(template_values['missing_sources'], [])
+    self.assertGreater(template_values['sticker_price'], 0)
+
+  def test_failed_msn_money_is_unavailable(self):
+    with ReplayServer(self.store, failure_rate=1.0) as server:
+      with self.assertRaises(SourcesUnavailable) as context:
+        self._run(server, self.tickers[0], fetch=_fetchDataForTickerSymbol)
+    self.assertEqual(context.exception.sources, ['msn_autosuggest'])
+
+  def test_unknown_ticker_is_invalid(self):
+    with ReplayServer(self.store) as server:
+      self.assertIsNone(self._run(server, 'NOPE', fetch=_fetchDataForTickerSymbol))
+    template_values = computeTemplateValues('ABC', MSNMoney('ABC'), None, None)
+    self.assertEqual(template_values['ten_cap_price'], 'null')
+    self.assertEqual(template_values['margin_of_safety_price'], 'null')
+
+  def test_open_circuit_falls_back_to_zacks(self):
+    ticker = self.tickers[0]
+    host_guard = HostGuard(failure_threshold=1)
+    host_guard.record('finance.yahoo.com', False)
+    with ReplayServer(self.store) as server:
+      data_fetcher = self._run(server, ticker, host_guard=host_guard)
+    self.assertIsNone(data_fetcher.yahoo_finance_analysis.five_year_growth_rate)
+    self.assertIsNotNone(data_fetcher.zacks_analysis.five_year_growth_rate)
+    self.assertGreater(self._template_values(ticker, data_fetcher)['sticker_price'], 0)
+    self.assertEqual(host_guard.get_stats()['finance.yahoo.com']['circuit_open'], 1)
+    self.assertEqual(server.get_stats()['requests'], 5)
+
+  def test_failing_upstream_falls_back_to_stale_cache(self):
+    ticker = self.tickers[0]
+    clock = _FakeClock()
+    cache = SourceCache(max_stale=30 * DAY, clock=clock)
+    with ReplayServer(self.store) as server:
+      expected = self._template_values(ticker, self._run(server, ticker, cache=cache))
+    clock.now += 8 * DAY
+    with ReplayServer(self.store, failure_rate=1.0) as server:
+      data_fetcher = self._run(server, ticker, cache=cache)
+    self.assertEqual(self._template_values(ticker, data_fetcher), expected)
+    self.assertEqual(cache.get_stats()['memory']['stale_hits'], 5)
+    self.assertEqual(data_fetcher.fetched_kinds, set())
+
+  def test_valuation_inputs_are_read_from_the_fundamentals_store(self):
+    ticker = self.tickers[0]
+    with tempfile.TemporaryDirectory() as directory:
+      store = configure_fundamentals_store(directory, flush_every=None)
+      self.addCleanup(configure_fundamentals_store, None)
+      with ReplayServer(self.store) as server:
+        fetched = self._run(server, ticker, fetch=fetchFundamentalsForTickerSymbol)
+        requests = server.get_stats()['requests']
+        self.assertEqual(store.pending(), 1)
+        self.assertEqual(self._run(server, ticker, fetch=fetchFundamentalsForTickerSymbol), fetched)
+        store.flush()
+        self.assertEqual(self._run(server, ticker, fetch=fetchFundamentalsForTickerSymbol), fetched)
+        self.assertEqual(server.get_stats()['requests'], requests)
+        self.assertGreater(fetched['estimated_growth_rate'], 0)
+        # Too old, so fetched again.
+        self._run(server, ticker, fetch=partial(fetchFundamentalsForTickerSymbol, max_age=0))
+        self.assertGreater(server.get_stats()['requests'], requests)
+
+  def test_store_round_trips_through_directory(self):
+    with tempfile.TemporaryDirectory() as directory:
+      RecordingStore(directory).add_many(build_synthetic_recordings(self.tickers[:1]))
+      self.assertEqual(len(os.listdir(directory)), 6)
+      store = RecordingStore(directory)
+      url = build_synthetic_recordings(self.tickers[:1])[0].url
+      self.assertEqual(store.get(url).body, self.store.get(url).body)
@@ -0,0 +1,119 @@
+"""Tests for the ResultCache.py stale-while-revalidate cache."""
+
+
+import json
+import threading
+import unittest
+
+from isthisstockgood.ResultCache import ResultCache
+
+
+class _FakeClock:
+
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+
+class _CountingFetch:
+
+  def __init__(self):
+    self.calls = 0
+    self.release = threading.Event()
+    self.release.set()
+
+  def __call__(self, ticker):
+    self.release.wait(5)
+    self.calls += 1
+    return {'ticker' : ticker, 'version' : self.calls}
+
+
+class ResultCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.clock = _FakeClock()
+    self.fetch = _CountingFetch()
+    self.cache = ResultCache(self.fetch, ttl=60, max_stale=600, clock=self.clock)
+
+  def _wait_for_refresh(self):
+    self.assertTrue(self.cache.join(5))
+
+  def test_fresh_results_are_served_from_cache(self):
+    first = self.cache.get('msft')
+    second = self.cache.get('msft')
+    self.assertEqual(self.fetch.calls, 1)
+    self.assertFalse(first.stale)
+    self.assertIs(first.template_values, second.template_values)
+    # The body is encoded once, and reused by every hit.
+    self.assertEqual(json.loads(first.body.data)['ticker'], 'msft')
+    self.assertIs(first.body, second.body)
+
+  def test_hits_echo_the_requested_ticker(self):
+    first = self.cache.get('msft')
+    second = self.cache.get('MSFT')
+    self.assertEqual(self.fetch.calls, 1)
+    self.assertEqual(second.template_values['ticker'], 'MSFT')
+    self.assertEqual(json.loads(second.body.data)['ticker'], 'MSFT')
+    self.assertNotEqual(first.body.etag, second.body.etag)
+    # The cached entry itself keeps the casing it was fetched with.
+    self.assertEqual(self.cache.get('msft').template_values['ticker'], 'msft')
+
+  def test_partial_results_are_refreshed_on_next_lookup(self):
+    self.cache.put('MSFT', {'ticker' : 'MSFT', 'missing_sources' : ['msn_quotes']})
+    self.assertEqual(self.cache.age_of('MSFT'), 60)
+    result = self.cache.get('MSFT')
+    self.assertTrue(result.stale)
+    self._wait_for_refresh()
+    self.assertEqual(self.fetch.calls, 1)
+    self.assertFalse(self.cache.get('MSFT').stale)
+
+  def test_expired_results_are_served_stale_and_refreshed_once(self):
+    self.cache.get('MSFT')
+    self.clock.now += 120
+
+    self.fetch.release.clear()
+    stale = self.cache.get('MSFT')
+    again = self.cache.get('MSFT')
+    self.assertTrue(stale.stale)
+    self.assertEqual(stale.age, 120)
+    self.assertEqual(again.template_values['version'], 1)
+    self.fetch.release.set()
+    self._wait_for_refresh()
+
+    refreshed = self.cache.get('MSFT')
+    self.assertFalse(refreshed.stale)
+    self.assertEqual(refreshed.template_values['version'], 2)
+    self.assertEqual(self.cache.get_stats()['refreshes'], 1)
+
+  def test_refreshes_run_on_a_bounded_pool(self):
+    cache = ResultCache(self.fetch, ttl=60, max_stale=600, max_refreshes=2, clock=self.clock)
+    tickers = [f'T{index}' for index in range(6)]
+    for ticker in tickers:
+      cache.get(ticker)
+    self.clock.now += 120
+
+    self.fetch.release.clear()
+    threads_before = threading.active_count()
+    for ticker in tickers:
+      self.assertTrue(cache.get(ticker).stale)
+    self.assertLessEqual(threading.active_count() - threads_before, 2)
+    self.assertEqual(cache.get_stats()['refreshing'], 6)
+    self.fetch.release.set()
+    self.assertTrue(cache.join(5))
+    self.assertEqual(cache.get_stats()['refreshing'], 0)
+    self.assertEqual(self.fetch.calls, 12)
+
+  def test_too_old_results_are_fetched_synchronously(self):
+    self.cache.get('MSFT')
+    self.clock.now += 1000
+    result = self.cache.get('MSFT')
+    self.assertFalse(result.stale)
+    self.assertEqual(result.template_values['version'], 2)
+
+  def test_without_stale_while_revalidate_expired_results_are_refetched(self):
+    cache = ResultCache(self.fetch, ttl=60, stale_while_revalidate=False, clock=self.clock)
+    cache.get('MSFT')
+    self.clock.now += 120
+    self.assertEqual(cache.get('MSFT').template_values['version'], 2)
@@ -0,0 +1,70 @@
+"""Tests for the app/RuleOneBatchCalculations.py functions."""
+
+
+import random
+import unittest
+
+import isthisstockgood.RuleOneBatchCalculations as RuleOneBatch
+import isthisstockgood.RuleOneInvestingCalculations as RuleOne
+
+
+class RuleOneBatchCalculationsTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = random.Random(1234)
+    self.rows = [
+      (
+        rng.choice([0, rng.uniform(-5, 20)]),  # eps
+        rng.choice([0, -0.05, rng.uniform(0.001, 0.6)]),  # growth rate
+        rng.choice([0, rng.uniform(1, 40)]),  # low pe
+        rng.uniform(-10, 120),  # high pe
+        rng.choice([0, -5, rng.uniform(1e6, 1e12)]),  # market cap
+        rng.choice([0, -1e6, rng.uniform(1e4, 1e10)]),  # net income
+        rng.uniform(-3, 15),  # free cash flow per share
+      )
+      for _ in range(2000)
+    ]
+    self.rows.append((1.0, -1.0, 10.0, 20.0, 100.0, 10.0, 0.0))  # Zero future EPS.
+    self.rows.append((1.0, 0.1, 10.0, -10.0, 100.0, 10.0, 0.0))  # Zero future PE.
+    self.columns = [list(column) for column in zip(*self.rows)]
+
+  def test_margin_of_safety_price_matches_scalar(self):
+    eps, growth, low_pe, high_pe = self.columns[:4]
+    margin_of_safety, sticker_price = RuleOneBatch.margin_of_safety_price(eps, growth, low_pe, high_pe)
+    margin_of_safety = RuleOneBatch.to_optional_list(margin_of_safety)
+    sticker_price = RuleOneBatch.to_optional_list(sticker_price)
+    for i, row in enumerate(self.rows):
+      expected = RuleOne.margin_of_safety_price(*row[:4])
+      self.assertEqual((margin_of_safety[i], sticker_price[i]), expected, row)
+
+  def test_payback_time_matches_scalar(self):
+    growth, market_cap, net_income = self.columns[1], self.columns[4], self.columns[5]
+    years = RuleOneBatch.payback_time(market_cap, net_income, growth)
+    for i, row in enumerate(self.rows):
+      self.assertEqual(years[i], RuleOne.payback_time(row[4], row[5], row[1]), row)
+
+  def test_payback_time_of_missing_inputs_is_invalid(self):
+    years = RuleOneBatch.payback_time([17680, None], [2115, 2115], [0.12, 0.12])
+    self.assertEqual(list(years), [6, -1])
+
+  def test_payback_time_of_non_finite_inputs_matches_scalar(self):
+    nan, inf = float('nan'), float('inf')
+    rows = [(nan, 2115, 0.12), (17680, nan, 0.12), (17680, 2115, nan),
+            (inf, 2115, 0.12), (-inf, 2115, 0.12), (17680, 2115, inf), (0, nan, nan)]
+    years = RuleOneBatch.payback_time(*zip(*rows))
+    for i, row in enumerate(rows):
+      self.assertEqual(years[i], -1, row)
+      self.assertEqual(RuleOne.payback_time(*row), -1, row)
+
+  def test_ten_cap_price_matches_scalar(self):
+    prices = RuleOneBatch.calculate_ten_cap_price(self.columns[6])
+    for i, row in enumerate(self.rows):
+      self.assertEqual(prices[i], RuleOne.calculate_ten_cap_price(row[6]))
+
+  def test_valuations(self):
+    results = RuleOneBatch.valuations([2.0, None], [0.12, 0.12], [10, 10], [20, 20],
+                                      [17680, 17680], [2115, 2115], [1.5, 1.5])
+    self.assertEqual(list(results['payback_time']), [6, 6])
+    self.assertEqual(RuleOneBatch.to_optional_list(results['sticker_price'])[1], None)
+    self.assertEqual(results['sticker_price'][0], RuleOne.margin_of_safety_price(2.0, 0.12, 10, 20)[1])
+    self.assertEqual(list(results['ten_cap_price']), [15.0, 15.0])
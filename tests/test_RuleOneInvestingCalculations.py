@@ -1,6 +1,7 @@
 """Tests for the app/RuleOneInvestingCalculations.py functions."""
 
 
+import random
 import unittest
 
 import isthisstockgood.RuleOneInvestingCalculations as RuleOne
@@ -62,6 +63,31 @@ class RuleOneInvestingCalculationsTest(unittest.TestCase):
     invalid_years = RuleOne.payback_time(17680, -2115, 0.12)
     self.assertEqual(invalid_years, -1)
 
+  def test_payback_time_matches_iterative_loop(self):
+    rng = random.Random(42)
+    for _ in range(5000):
+      market_cap = rng.uniform(1, 1e13)
+      net_income = rng.uniform(1, 1e10)
+      growth_rate = rng.choice([rng.uniform(0.0005, 0.01), rng.uniform(0.01, 1.0)])
+      self.assertEqual(
+        RuleOne.payback_time(market_cap, net_income, growth_rate),
+        RuleOne._payback_time_iterative(market_cap, net_income, growth_rate)
+      )
+
+  def test_payback_time_on_year_boundaries(self):
+    yearly_income = 2115
+    total_payback = 0
+    for year in range(1, 40):
+      yearly_income += yearly_income * 0.12
+      total_payback += yearly_income
+      self.assertEqual(RuleOne.payback_time(total_payback, 2115, 0.12), year)
+      self.assertEqual(RuleOne.payback_time(total_payback * (1 + 1e-15), 2115, 0.12), year + 1)
+
+  def test_payback_time_max_years(self):
+    self.assertEqual(RuleOne.payback_time(17680, 2115, 0.12, max_years=6), 6)
+    self.assertEqual(RuleOne.payback_time(17680, 2115, 0.12, max_years=5), -1)
+    self.assertEqual(RuleOne.payback_time(0, 2115, 0.12), 0)
+
   def test_rule_one_margin_of_safety_price(self):
     pass
 
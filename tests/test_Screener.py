@@ -0,0 +1,158 @@
+"""Tests for the Screener.py range queries."""
+
+
+import math
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from isthisstockgood.CompanyInfo import CompanyFundamentals
+from isthisstockgood.FundamentalsStore import FundamentalsStore
+from isthisstockgood.Screener import METRICS, Screener, ScreenerIndex
+
+
+def _series(growth_rates):
+  """Returns an annual series whose 1, 3, 5 and max year growth rates are `growth_rates`."""
+  years = (1, 3, 5, 6)[:len(growth_rates)]
+  series = [100.0] * (years[-1] + 1)
+  for period, rate in zip(years, growth_rates):
+    series[-1 - period] = 100.0 / (1 + rate / 100) ** period
+  return series
+
+
+def _company(ticker, growth_rates, roic, price, **fields):
+  series = _series(growth_rates)
+  return CompanyFundamentals(
+    ticker,
+    name=ticker.title(),
+    industry='Software',
+    eps=series,
+    revenue=series,
+    equity=series,
+    roic=roic,
+    current_price=price,
+    quarterly_eps=[1.0, 1.0, 1.0, 1.0],
+    pe_low=10.0,
+    pe_high=20.0,
+    five_year_growth_rate=15.0,
+    free_cash_flow=[value / 50 for value in series],
+    market_cap=1e9,
+    last_year_net_income=1e8,
+    **fields
+  )
+
+
+class _FakeClock:
+
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+
+class ScreenerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.directory.name, 'fundamentals')
+    self.store = FundamentalsStore(self.path, flush_every=None)
+    self.store.upsert_many([
+      _company('GOOD', [20.0, 15.0, 12.0, 11.0], [12.0] * 10, price=10.0),
+      _company('SLOW', [20.0, 15.0, 8.0], [12.0] * 10, price=10.0),
+      _company('PRICEY', [20.0, 15.0, 12.0, 11.0], [12.0] * 10, price=1000.0),
+      _company('LOWROIC', [20.0, 15.0, 12.0, 11.0], [4.0] * 10, price=10.0),
+      _company('NEW', [30.0], [15.0, 16.0], price=10.0),
+      CompanyFundamentals('EMPTY'),
+    ])
+    self.store.flush()
+
+  def tearDown(self):
+    self.directory.cleanup()
+
+  def test_metrics_of_a_row(self):
+    index = Screener(self.path).index()
+    good = index.describe(index.table.row_of('GOOD'))
+    self.assertEqual(set(good), set(METRICS) | {'ticker', 'name', 'industry'})
+    self.assertEqual(good['eps_1y'], 20.0)
+    self.assertEqual(good['sales_max'], 11.0)
+    self.assertEqual(good['cash_min'], 11.0)
+    self.assertEqual(good['roic_5y'], 12.0)
+    self.assertAlmostEqual(good['price_to_mos'], 10.0 / good['margin_of_safety_price'])
+    new = index.describe(index.table.row_of('NEW'))
+    self.assertEqual(new['roic_1y'], 16.0)
+    self.assertIsNone(new['roic_3y'])
+    self.assertIsNone(new['eps_3y'])
+    self.assertEqual(new['eps_min'], 30.0)
+    empty = index.describe(index.table.row_of('EMPTY'))
+    self.assertIsNone(empty['eps_min'])
+    self.assertIsNone(empty['payback_time'])
+
+  def test_undefined_growth_rates_keep_their_period(self):
+    eps = _series([20.0, 15.0, 12.0, 11.0])
+    eps[-4] = 0.0
+    self.store.upsert(CompanyFundamentals('ZERO', eps=eps))
+    self.store.flush()
+    index = Screener(self.path).index()
+    zero = index.describe(index.table.row_of('ZERO'))
+    self.assertEqual((zero['eps_1y'], zero['eps_3y'], zero['eps_5y'], zero['eps_max']),
+                     (20.0, None, 12.0, 11.0))
+    self.assertEqual(zero['eps_min'], 11.0)
+    self.assertEqual(index.table.longest_period('eps_growth_rates')[index.table.row_of('ZERO')], 11.0)
+
+  def test_big_five_and_price_below_margin_of_safety(self):
+    filters = {'roic_1y' : (10, None), 'price_to_mos' : (None, 1)}
+    for number in ('eps', 'sales', 'equity', 'cash'):
+      filters[f'{number}_min'] = (10, None)
+    result = Screener(self.path).screen(filters)
+    self.assertEqual([row['ticker'] for row in result['results']], ['GOOD', 'NEW'])
+    self.assertEqual(result['count'], 2)
+    self.assertEqual(result['generation'], 'gen-000001')
+
+  def test_ranges_are_inclusive(self):
+    screener = Screener(self.path)
+    tickers = lambda result: [row['ticker'] for row in result['results']]
+    self.assertEqual(tickers(screener.screen({'eps_5y' : (12, 12)})), ['GOOD', 'LOWROIC', 'PRICEY'])
+    self.assertEqual(tickers(screener.screen({'eps_5y' : (12.5, None)})), [])
+
+  def test_sort_and_limit(self):
+    screener = Screener(self.path)
+    result = screener.screen({}, sort='roic_1y', descending=True, limit=2)
+    self.assertEqual(result['count'], 6)
+    self.assertEqual([row['ticker'] for row in result['results']], ['NEW', 'GOOD'])
+    result = screener.screen({}, sort='roic_1y')
+    # Companies without the metric come last.
+    self.assertEqual(result['results'][-1]['ticker'], 'EMPTY')
+
+  def test_unknown_metrics_are_rejected(self):
+    with self.assertRaises(ValueError):
+      Screener(self.path).screen({'pe_ratio' : (None, 10)})
+    with self.assertRaises(ValueError):
+      Screener(self.path).screen({}, sort='pe_ratio')
+
+  def test_follows_new_generations(self):
+    clock = _FakeClock()
+    screener = Screener(self.path, reload_interval=10, clock=clock)
+    self.assertEqual(len(screener.index()), 6)
+    self.store.upsert(_company('LATE', [20.0], [12.0], price=10.0))
+    self.store.flush()
+    self.assertEqual(len(screener.index()), 6)
+    clock.now += 10
+    self.assertEqual(len(screener.index()), 7)
+
+  def test_empty_store(self):
+    result = Screener(os.path.join(self.directory.name, 'missing')).screen({'eps_1y' : (0, None)})
+    self.assertEqual(result, {'count' : 0, 'generation' : None, 'results' : []})
+
+  def test_matches_a_linear_scan(self):
+    index = Screener(self.path).index()
+    for metric in METRICS:
+      values = index.metrics[metric]
+      finite = values[~np.isnan(values)]
+      for low in [None] + sorted(set(finite.tolist())):
+        expected = sorted(np.flatnonzero(values >= low) if low is not None
+                          else np.flatnonzero(~np.isnan(values)))
+        self.assertEqual(sorted(index.rows_between(metric, low)), expected, (metric, low))
+        self.assertFalse(any(math.isnan(values[row]) for row in index.rows_between(metric, low)))
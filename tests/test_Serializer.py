@@ -0,0 +1,83 @@
+"""Tests for the Serializer.py response encoding."""
+
+
+import hashlib
+import json
+import unittest
+
+import isthisstockgood.JSONBackend as JSONBackend
+from isthisstockgood.Serializer import (
+  STOCK_DATA_SCHEMA, encode_error, encode_stock_data, stock_data
+)
+
+
+def _template_values(**overrides):
+  template_values = {
+    'ticker' : 'MSFT',
+    'name' : 'Microsoft Corp',
+    'description' : 'Makes "software",\nand\tclouds.',
+    'roic' : [10.5, 12.0],
+    'eps' : [12.5, 11.0, 9.0],
+    'sales' : [],
+    'equity' : [8.0],
+    'cash' : [],
+    'total_debt' : 100,
+    'free_cash_flow' : 'null',
+    'ten_cap_price' : 12.34,
+    'debt_payoff_time' : 'null',
+    'debt_equity_ratio' : -1,
+    'margin_of_safety_price' : 'null',
+    'current_price' : 410.25,
+    'sticker_price' : float('nan'),
+    'payback_time' : 7,
+    'average_volume' : 1000,
+    'missing_sources' : ['zacks_analysis'],
+  }
+  template_values.update(overrides)
+  return template_values
+
+
+class SerializerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.previous = JSONBackend.get_json_backend()
+
+  def tearDown(self):
+    JSONBackend.configure_json_backend(self.previous)
+
+  def test_stock_data_follows_the_schema(self):
+    data = stock_data(_template_values(unused='dropped'))
+    self.assertEqual(list(data), [key for key, _ in STOCK_DATA_SCHEMA])
+    self.assertIsNone(data['free_cash_flow'])
+    self.assertIsNone(data['margin_of_safety_price'])
+    self.assertIsNone(data['sticker_price'])
+    self.assertEqual(data['debt_equity_ratio'], -1)
+    self.assertEqual(data['total_debt'], 100)
+
+  def test_missing_values_are_null_or_empty(self):
+    data = stock_data({'ticker' : 'NEW', 'name' : 'null'})
+    self.assertIsNone(data['name'])
+    self.assertEqual(data['roic'], [])
+    self.assertEqual(data['missing_sources'], [])
+    self.assertIsNone(data['current_price'])
+
+  def test_rejects_non_numbers(self):
+    with self.assertRaises(TypeError):
+      stock_data(_template_values(current_price='410.25'))
+
+  def test_encoding_agrees_across_backends(self):
+    expected = stock_data(_template_values())
+    for backend in JSONBackend.AVAILABLE_BACKENDS:
+      JSONBackend.configure_json_backend(backend)
+      body = encode_stock_data(_template_values())
+      self.assertEqual(body.data, json.dumps(expected, separators=(',', ':')).encode('utf8'), backend)
+      self.assertEqual(body.etag, hashlib.sha256(body.data).hexdigest())
+
+  def test_identical_values_have_identical_bodies(self):
+    first = encode_stock_data(_template_values())
+    self.assertEqual(encode_stock_data(_template_values()), first)
+    self.assertNotEqual(encode_stock_data(_template_values(current_price=411)).etag, first.etag)
+
+  def test_encode_error(self):
+    self.assertEqual(json.loads(encode_error('Invalid ticker symbol').data),
+                     {'error' : 'Invalid ticker symbol'})
@@ -0,0 +1,129 @@
+"""Tests for the SessionPool.py shared HTTP session."""
+
+
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from requests.exceptions import Timeout
+
+from isthisstockgood.RateLimiter import CIRCUIT_OPEN, RATE_LIMITED, HostGuard, UpstreamUnavailable
+from isthisstockgood.SessionPool import SessionPool
+
+
+class _EchoUserAgentHandler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def do_GET(self):
+    if self.path == '/error':
+      self.send_response(503)
+      self.send_header('Content-Length', '0')
+      self.end_headers()
+      return
+    if self.path == '/slow':
+      # The client has given up by then.
+      threading.Event().wait(0.5)
+      self.close_connection = True
+      return
+    body = (self.headers.get('User-Agent') or '').encode('utf8')
+    self.send_response(200)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+
+class SessionPoolTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = ThreadingHTTPServer(('127.0.0.1', 0), _EchoUserAgentHandler)
+    threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+    self.pool = SessionPool(max_workers=2, pool_connections=2, pool_maxsize=2)
+
+  def tearDown(self):
+    self.pool.close()
+    self.server.shutdown()
+    self.server.server_close()
+
+  def test_reuses_host_pool(self):
+    for _ in range(3):
+      self.pool.get(self.url).result()
+    stats = self.pool.get_stats()
+    self.assertEqual(stats['requests'], 3)
+    self.assertEqual(stats['pool_misses'], 1)
+    self.assertEqual(stats['pool_hits'], 2)
+
+  def test_user_agent_is_per_request(self):
+    first = self.pool.get(self.url, user_agent='agent-a').result()
+    second = self.pool.get(self.url, user_agent='agent-b').result()
+    self.assertEqual(first.text, 'agent-a')
+    self.assertEqual(second.text, 'agent-b')
+
+  def test_hooks_run_on_worker_pool(self):
+    seen = []
+    self.pool.get(self.url, hooks={
+      'response' : lambda response, *args, **kwargs: seen.append(response.status_code)
+    }).result()
+    self.assertEqual(seen, [200])
+
+  def test_rejected_requests_fail_fast(self):
+    pool = SessionPool(max_workers=2, host_guard=HostGuard(failure_threshold=2))
+    try:
+      for _ in range(2):
+        self.assertEqual(pool.get(self.url + 'error').result().status_code, 503)
+      future = pool.get(self.url)
+      self.assertTrue(future.done())
+      with self.assertRaises(UpstreamUnavailable) as context:
+        future.result()
+      self.assertEqual(context.exception.reason, CIRCUIT_OPEN)
+      stats = pool.get_stats()
+      self.assertEqual(stats['rejected'], 1)
+      self.assertEqual(stats['hosts']['127.0.0.1']['state'], 'open')
+      self.assertFalse(pool.is_available(self.url))
+    finally:
+      pool.close()
+
+  def test_rate_limited_requests_wait_for_a_token(self):
+    pool = SessionPool(max_workers=2, timeout=(0.15, 1), host_guard=HostGuard(rate=10, burst=1))
+    try:
+      start = time.perf_counter()
+      first, second, third = (pool.get(self.url) for _ in range(3))
+      self.assertEqual(second.result().status_code, 200)
+      self.assertGreaterEqual(time.perf_counter() - start, 0.1)
+      self.assertEqual(first.result().status_code, 200)
+      # The third token would only be there after the connect timeout.
+      with self.assertRaises(UpstreamUnavailable) as context:
+        third.result()
+      self.assertEqual(context.exception.reason, RATE_LIMITED)
+      stats = pool.get_stats()
+      self.assertEqual((stats['requests'], stats['delayed'], stats['rejected']), (2, 1, 1))
+    finally:
+      pool.close()
+
+  def test_delayed_requests_do_not_hold_a_worker(self):
+    host_guard = HostGuard(rate=None, overrides={'127.0.0.1' : {'rate' : 2, 'burst' : 1}})
+    pool = SessionPool(max_workers=1, timeout=(1, 1), host_guard=host_guard)
+    try:
+      pool.get(self.url).result()
+      delayed = pool.get(self.url)
+      # The only worker is free while `delayed` waits for its token.
+      other = pool.get(self.url.replace('127.0.0.1', 'localhost'))
+      self.assertEqual(other.result(timeout=0.4).status_code, 200)
+      self.assertFalse(delayed.done())
+      self.assertEqual(delayed.result(timeout=5).status_code, 200)
+      self.assertEqual(pool.get_stats()['delayed'], 1)
+    finally:
+      pool.close()
+
+  def test_requests_time_out(self):
+    pool = SessionPool(max_workers=2, timeout=(1, 0.05), host_guard=HostGuard(failure_threshold=1))
+    try:
+      with self.assertRaises(Timeout):
+        pool.get(self.url + 'slow').result()
+      self.assertFalse(pool.is_available(self.url))
+    finally:
+      pool.close()
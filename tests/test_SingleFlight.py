@@ -0,0 +1,56 @@
+"""Tests for the SingleFlight.py request coalescing."""
+
+
+import threading
+import time
+import unittest
+
+from isthisstockgood.SingleFlight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+
+  def test_concurrent_callers_share_one_execution(self):
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_fetch(ticker):
+      calls.append(ticker)
+      started.set()
+      release.wait(5)
+      return {'ticker' : ticker}
+
+    results = []
+    def worker():
+      results.append(single_flight.do('MSFT', slow_fetch, 'MSFT'))
+
+    leader = threading.Thread(target=worker)
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in followers:
+      thread.start()
+    deadline = time.time() + 5
+    while single_flight.get_stats()['collapsed'] < 4 and time.time() < deadline:
+      time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+      thread.join(5)
+
+    self.assertEqual(calls, ['MSFT'])
+    self.assertEqual(len(results), 5)
+    self.assertTrue(all(result is results[0] for result in results))
+    self.assertEqual(single_flight.get_stats(), {'executions' : 1, 'collapsed' : 4, 'in_flight' : 0})
+
+  def test_exceptions_are_shared_and_key_is_released(self):
+    single_flight = SingleFlight()
+
+    def failing_fetch():
+      raise ValueError('boom')
+
+    with self.assertRaises(ValueError):
+      single_flight.do('MSFT', failing_fetch)
+    self.assertEqual(single_flight.do('MSFT', lambda: 42), 42)
+    self.assertEqual(single_flight.get_stats()['executions'], 2)
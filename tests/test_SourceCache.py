@@ -0,0 +1,109 @@
+"""Tests for the SourceCache.py tiered cache."""
+
+
+import os
+import tempfile
+import unittest
+from array import array
+from concurrent.futures import Future
+
+from isthisstockgood.DataFetcher import DataFetcher
+from isthisstockgood.SourceCache import SourceCache
+from isthisstockgood.SymbolIndex import SymbolIndex
+
+
+class _FakeClock:
+
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+
+class _RecordingSessionPool:
+
+  def __init__(self):
+    self.urls = []
+
+  def get(self, url, **kwargs):
+    self.urls.append(url)
+    return Future()
+
+
+class SourceCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.clock = _FakeClock()
+
+  def test_entries_expire_per_kind(self):
+    cache = SourceCache(ttls={'msn_quotes' : 10, 'msn_ratios' : 100}, clock=self.clock)
+    cache.put('msn_quotes', 'msft', {'current_price' : 1.0})
+    cache.put('msn_ratios', 'MSFT', {'pe_high' : 30.0})
+    self.clock.now += 50
+    self.assertIsNone(cache.get('msn_quotes', 'MSFT'))
+    self.assertEqual(cache.get('msn_ratios', 'msft'), {'pe_high' : 30.0})
+    stats = cache.get_stats()['memory']
+    self.assertEqual(stats['hits'], 1)
+    self.assertEqual(stats['misses'], 1)
+    self.assertEqual(stats['expirations'], 1)
+
+  def test_arrays_are_cached_as_lists(self):
+    cache = SourceCache()
+    cache.put('msn_ratios', 'A', {'eps' : array('d', [1.5, 2.5])})
+    self.assertEqual(cache.get('msn_ratios', 'A'), {'eps' : [1.5, 2.5]})
+
+  def test_memory_tier_evicts_least_recently_used(self):
+    cache = SourceCache(max_memory_bytes=60, clock=self.clock)
+    cache.put('zacks_analysis', 'A', {'five_year_growth_rate' : 1.0})
+    cache.put('zacks_analysis', 'B', {'five_year_growth_rate' : 2.0})
+    cache.get('zacks_analysis', 'A')
+    cache.put('zacks_analysis', 'C', {'five_year_growth_rate' : 3.0})
+    self.assertIsNotNone(cache.get('zacks_analysis', 'A'))
+    self.assertIsNone(cache.get('zacks_analysis', 'B'))
+    self.assertEqual(cache.get_stats()['memory']['evictions'], 1)
+    self.assertLessEqual(cache.memory.size, 60)
+
+  def test_disk_tier_persists_across_instances(self):
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, 'cache.sqlite3')
+      cache = SourceCache(path=path, clock=self.clock)
+      cache.put('msn_annual_report', 'MSFT', {'total_debt' : 5.0})
+      cache.close()
+
+      cache = SourceCache(path=path, clock=self.clock)
+      self.assertEqual(cache.get('msn_annual_report', 'MSFT'), {'total_debt' : 5.0})
+      self.assertEqual(cache.get_stats()['disk']['hits'], 1)
+      # Promoted into memory, so the second lookup does not touch disk.
+      cache.get('msn_annual_report', 'MSFT')
+      self.assertEqual(cache.get_stats()['disk']['hits'], 1)
+      cache.close()
+
+  def test_expired_entries_are_kept_as_stale_fallbacks(self):
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, 'cache.sqlite3')
+      cache = SourceCache(path=path, max_stale=100, clock=self.clock)
+      cache.put('msn_quotes', 'MSFT', {'current_price' : 1.0})
+      cache.expire('msn_quotes', 'MSFT')
+      cache.expire('msn_ratios', 'MSFT')
+      self.assertIsNone(cache.get('msn_quotes', 'MSFT'))
+      self.assertEqual(cache.get('msn_quotes', 'MSFT', allow_stale=True), {'current_price' : 1.0})
+      cache.memory.delete('msn_quotes:MSFT')
+      self.assertEqual(cache.get('msn_quotes', 'MSFT', allow_stale=True), {'current_price' : 1.0})
+      self.assertIsNone(cache.get('msn_quotes', 'MSFT'))
+      cache.close()
+
+  def test_data_fetcher_skips_cached_sources(self):
+    cache = SourceCache(clock=self.clock)
+    cache.put('yahoo_analysis', 'MSFT', {'five_year_growth_rate' : '12.5'})
+    cache.put('zacks_analysis', 'MSFT', {'five_year_growth_rate' : 11.0})
+    session_pool = _RecordingSessionPool()
+    data_fetcher = DataFetcher('MSFT', session_pool=session_pool, cache=cache, symbol_index=SymbolIndex())
+
+    data_fetcher.fetch_yahoo_finance_analysis()
+    data_fetcher.fetch_zacks_analysis()
+    data_fetcher.fetch_msn_money_data()
+
+    self.assertEqual(data_fetcher.yahoo_finance_analysis.five_year_growth_rate, '12.5')
+    self.assertEqual(data_fetcher.zacks_analysis.five_year_growth_rate, 11.0)
+    self.assertEqual(session_pool.urls, [data_fetcher.msn_money.get_ticker_autocomplete_url()])
@@ -0,0 +1,70 @@
+"""Tests for the SymbolIndex.py MSN stock id index."""
+
+
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import Future
+
+from isthisstockgood.DataFetcher import DataFetcher
+from isthisstockgood.SourceCache import SourceCache
+from isthisstockgood.SymbolIndex import SymbolIndex
+
+
+class _RecordingSessionPool:
+
+  def __init__(self):
+    self.urls = []
+
+  def get(self, url, **kwargs):
+    self.urls.append(url)
+    return Future()
+
+
+class SymbolIndexTest(unittest.TestCase):
+
+  def test_lookup_is_case_insensitive(self):
+    index = SymbolIndex()
+    index.add('msft', 'a6qja2', 'Microsoft')
+    self.assertEqual(index.lookup('MSFT'), ('a6qja2', 'Microsoft'))
+    self.assertIsNone(index.lookup('AAPL'))
+    self.assertEqual(index.get_stats(), {'entries' : 1, 'hits' : 1, 'misses' : 1})
+
+  def test_persists_to_sqlite(self):
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, 'symbols.sqlite3')
+      index = SymbolIndex(path=path)
+      index.add('MSFT', 'a6qja2', 'Microsoft')
+      index.close()
+      self.assertEqual(SymbolIndex(path=path).lookup('MSFT'), ('a6qja2', 'Microsoft'))
+
+  def test_bulk_load_csv_and_json(self):
+    with tempfile.TemporaryDirectory() as directory:
+      csv_path = os.path.join(directory, 'symbols.csv')
+      with open(csv_path, 'w') as f:
+        f.write('symbol,sec_id,description\nMSFT,a6qja2,Microsoft\nAAPL,a1mou2\n')
+      json_path = os.path.join(directory, 'symbols.json')
+      with open(json_path, 'w') as f:
+        json.dump({'NVDA' : 'a2sbbh'}, f)
+
+      index = SymbolIndex()
+      self.assertEqual(index.load_file(csv_path), 2)
+      self.assertEqual(index.load_file(json_path), 1)
+      self.assertEqual(index.lookup('AAPL'), ('a1mou2', ''))
+      self.assertEqual(index.lookup('NVDA'), ('a2sbbh', ''))
+
+  def test_data_fetcher_skips_autosuggest_on_hit(self):
+    index = SymbolIndex()
+    index.add('MSFT', 'a6qja2', 'Microsoft')
+    session_pool = _RecordingSessionPool()
+    data_fetcher = DataFetcher('MSFT', session_pool=session_pool, cache=SourceCache(), symbol_index=index)
+    data_fetcher.fetch_msn_money_data()
+
+    msn_money = data_fetcher.msn_money
+    self.assertEqual(msn_money.description, 'Microsoft')
+    self.assertEqual(session_pool.urls, [
+      msn_money.get_key_ratios_url('a6qja2'),
+      msn_money.get_quotes_url('a6qja2'),
+      msn_money.get_annual_statements_url('a6qja2'),
+    ])
@@ -0,0 +1,41 @@
+"""Tests for the Timers.py delayed callbacks."""
+
+
+import threading
+import unittest
+
+from isthisstockgood.Timers import Timers
+
+
+class TimersTest(unittest.TestCase):
+
+  def test_runs_callbacks_in_order_of_their_deadlines(self):
+    timers = Timers()
+    ran = []
+    done = threading.Event()
+    timers.schedule(0.02, lambda: (ran.append('late'), done.set()))
+    timers.schedule(0, lambda: ran.append('early'))
+    self.assertTrue(done.wait(5))
+    self.assertEqual(ran, ['early', 'late'])
+
+  def test_cancelled_callbacks_do_not_run(self):
+    timers = Timers()
+    ran = []
+    done = threading.Event()
+    entry = timers.schedule(0.01, lambda: ran.append('cancelled'))
+    timers.cancel(entry)
+    timers.schedule(0.05, done.set)
+    self.assertTrue(done.wait(5))
+    self.assertEqual(ran, [])
+
+  def test_failed_callback_does_not_stop_the_timers(self):
+    timers = Timers()
+    ran = threading.Event()
+
+    def fail():
+      raise RuntimeError('boom')
+
+    with self.assertLogs('IsThisStockGood', level='WARNING'):
+      timers.schedule(0, fail)
+      timers.schedule(0.01, ran.set)
+      self.assertTrue(ran.wait(5))
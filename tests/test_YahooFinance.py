@@ -0,0 +1,48 @@
+"""Tests for the YahooFinance.py analysis page parser."""
+
+
+import os
+import unittest
+
+from isthisstockgood.Active.YahooFinance import YahooFinanceAnalysis
+
+_FIXTURE = os.path.join(
+  os.path.dirname(__file__), '..', 'testdata', 'dummy_yahoo_finance_analysis.html')
+
+
+def _parse(content, streaming):
+  analysis = YahooFinanceAnalysis('DUMMY')
+  success = analysis.parse_analyst_five_year_growth_rate(content, streaming=streaming)
+  return success, analysis.five_year_growth_rate
+
+
+class YahooFinanceAnalysisTest(unittest.TestCase):
+
+  def test_parses_fixture_page(self):
+    # The fixture is not valid UTF-8, so decode it the way `requests` would.
+    with open(_FIXTURE, encoding='latin-1') as f:
+      content = f.read()
+    self.assertEqual(_parse(content, streaming=True), (True, '23.70'))
+    self.assertEqual(_parse(content, streaming=False), (True, '23.70'))
+
+  def test_streaming_matches_dom_parsing(self):
+    pages = [
+      '<html><body><p>No estimates</p></body></html>',
+      '<table><tr><td>Next 5 Years (per annum)</td><td>N/A</td>'
+      '<td><span>4.5%</span></td></tr></table>',
+      '<div><span>Next 5 Years (per annum)</span><b>12.25%</b></div>'
+      '<div><span>Next 5 Years (per annum)</span><b>99.00%</b></div>',
+      '<div><span>Next 5 Years (per annum)<i>x</i></span>7%</div><p>8.1%</p>',
+      '<div><span>Next 5 Years (per annum)</span></div>',
+      '<script>var labels = {"next": "Next 5 Years (per annum)", "value": "1%"};</script>'
+      '<div><span>Next 5 Years (per annum)</span><b>6.5%</b></div>',
+      '<div><span>Next 5 Years &#40;per annum&#41;</span><b>6.5%</b></div>',
+    ]
+    for page in pages:
+      self.assertEqual(_parse(page, streaming=True), _parse(page, streaming=False), page)
+
+  def test_streaming_stops_at_first_match_across_chunks(self):
+    filler = '<p>filler</p>' * 5000
+    page = f'<html><body>{filler}<td>Next 5 Years (per annum)</td><td>3.30%</td>{filler}</body></html>'
+    self.assertGreater(len(page), 4 * YahooFinanceAnalysis.STREAMING_CHUNK_SIZE)
+    self.assertEqual(_parse(page, streaming=True), (True, '3.30'))
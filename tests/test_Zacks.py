@@ -0,0 +1,70 @@
+"""Tests for the Zacks.py growth rate scanner."""
+
+
+import io
+import unittest
+
+from requests import Response
+
+from isthisstockgood.Active.Zacks import GrowthRateScanner, Zacks
+
+
+def _chunks(text, size):
+  return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+def _streamed_response(body, status_code=200):
+  response = Response()
+  response.status_code = status_code
+  response.raw = io.BytesIO(body.encode('utf8'))
+  return response
+
+
+class ZacksTest(unittest.TestCase):
+
+  PAGE = (
+    '<table>\n<tr><td>Current Qtr</td></tr>\n<td>5.20%</td>\n'
+    '<td>Next 5 Years</td>\n<td>14.50%</td>\n'
+    '<td>Next 5 Years</td>\n<td>99.00%</td>\n</table>\n'
+  )
+
+  def test_get_growth_rate_returns_first_estimate(self):
+    self.assertEqual(Zacks('MSFT').get_growth_rate(self.PAGE), 14.5)
+
+  def test_scan_handles_every_chunk_boundary(self):
+    for size in range(1, len(self.PAGE) + 1):
+      self.assertEqual(Zacks.scan_growth_rate(_chunks(self.PAGE, size)), 14.5, size)
+
+  def test_missing_label_is_not_found(self):
+    self.assertIsNone(Zacks('MSFT').get_growth_rate('<td>Current Qtr</td>\n<td>5.20%</td>\n'))
+    self.assertIsNone(Zacks('MSFT').get_growth_rate(''))
+
+  def test_label_on_last_line_is_not_found(self):
+    self.assertIsNone(Zacks('MSFT').get_growth_rate('<td>Next 5 Years</td>'))
+
+  def test_non_numeric_estimate_is_not_found(self):
+    self.assertIsNone(Zacks('MSFT').get_growth_rate('Next 5 Years\nNA\n'))
+
+  def test_unterminated_value_line(self):
+    self.assertEqual(Zacks('MSFT').get_growth_rate('Next 5 Years\n7.25%'), 7.25)
+
+  def test_scanner_stops_consuming_after_match(self):
+    scanner = GrowthRateScanner(Zacks.GROWTH_RATE_LABEL)
+    self.assertFalse(scanner.feed('Next 5 Years\n12'))
+    self.assertTrue(scanner.feed('.5%\nrest of the page'))
+    self.assertTrue(scanner.feed('Next 5 Years\n1%\n'))
+    self.assertEqual(scanner.close(), 12.5)
+
+  def test_parse_streamed_response(self):
+    zacks = Zacks('MSFT')
+    body = self.PAGE + 'x' * (10 * Zacks.STREAMING_CHUNK_SIZE)
+    response = _streamed_response(body)
+    self.assertTrue(zacks.parse(response))
+    self.assertEqual(zacks.five_year_growth_rate, 14.5)
+
+  def test_parse_ignores_failed_responses(self):
+    zacks = Zacks('MSFT')
+    response = _streamed_response(self.PAGE, status_code=503)
+    self.assertFalse(zacks.parse(response))
+    self.assertIsNone(zacks.five_year_growth_rate)
+    self.assertTrue(response.raw.closed)
@@ -1,6 +1,14 @@
 import json
+import tempfile
+from concurrent.futures import Future
 from isthisstockgood.server import create_app
-from isthisstockgood.DataFetcher import fetchDataForTickerSymbol
+from isthisstockgood.CompanyInfo import CompanyFundamentals
+from isthisstockgood.DataFetcher import SourcesUnavailable, fetchDataForTickerSymbol
+from isthisstockgood.FundamentalsStore import FundamentalsStore
+from isthisstockgood.Hedging import Hedger
+from isthisstockgood.Metrics import Metrics
+from isthisstockgood.Profiler import SamplingProfiler
+from isthisstockgood.Screener import Screener
 
 
 def test_import_app():
@@ -45,3 +53,240 @@ def test_ten_cap_price_has_two_places_precision():
         price = res.json['ten_cap_price']
 
         assert round(price, 2) == price
+
+def _fake_fetch(ticker):
+    if ticker == 'BAD':
+        return None
+    if ticker == 'BOOM':
+        raise RuntimeError('upstream failure')
+    if ticker == 'DOWN':
+        raise SourcesUnavailable(ticker, ['msn_autosuggest'])
+    return {
+        'ticker' : ticker,
+        'name' : 'Test Co',
+        'description' : 'null',
+        'roic' : [10.0],
+        'eps' : [12.5, 11.0],
+        'sales' : [],
+        'equity' : [],
+        'cash' : [],
+        'total_debt' : 100,
+        'free_cash_flow' : 50,
+        'ten_cap_price' : 12.34,
+        'debt_payoff_time' : 2,
+        'debt_equity_ratio' : 0.5,
+        'margin_of_safety_price' : 'null',
+        'current_price' : 10.0,
+        'sticker_price' : 'null',
+        'payback_time' : 7,
+        'average_volume' : 1000,
+    }
+
+def test_batch_tickers_streams_ndjson():
+    app = create_app(_fake_fetch)
+
+    with app.test_client() as test_client:
+        res = test_client.post('/api/tickers', json={'tickers' : ['AAPL', 'BAD', 'BOOM', 'DOWN', 'aapl']})
+        assert res.status_code == 200
+        assert res.mimetype == 'application/x-ndjson'
+
+        lines = [json.loads(line) for line in res.text.splitlines()]
+        results = {line['ticker'] : line for line in lines}
+        assert len(lines) == 4
+        assert results['AAPL']['ten_cap_price'] == 12.34
+        assert results['AAPL']['margin_of_safety_price'] is None
+        assert results['BAD']['error'] == 'Invalid ticker symbol'
+        assert 'error' in results['BOOM']
+        assert results['DOWN']['error'].startswith('Upstream data sources are unavailable')
+
+def test_unavailable_sources_are_not_an_invalid_ticker():
+    app = create_app(_fake_fetch)
+
+    with app.test_client() as test_client:
+        res = test_client.post('/search', data={'ticker' : 'DOWN'})
+        assert res.status_code == 503
+        assert res.headers['Retry-After'] == '30'
+        assert res.json['error'].startswith('Upstream data sources are unavailable')
+        res = test_client.post('/search', data={'ticker' : 'BAD'})
+        assert res.status_code == 200
+        assert res.json['error'] == 'Invalid ticker symbol'
+
+def test_batch_tickers_requires_symbols():
+    app = create_app(_fake_fetch)
+
+    with app.test_client() as test_client:
+        res = test_client.get('/api/tickers')
+        assert res.status_code == 400
+        res = test_client.get('/api/tickers?tickers=MSFT,GOOG')
+        assert res.status_code == 200
+        assert len(res.text.splitlines()) == 2
+
+def test_search_serves_stale_results_with_age():
+    from isthisstockgood.ResultCache import ResultCache
+
+    now = [1000.0]
+    result_cache = ResultCache(_fake_fetch, ttl=60, clock=lambda: now[0])
+    app = create_app(_fake_fetch, result_cache=result_cache)
+
+    with app.test_client() as test_client:
+        res = test_client.post('/search', data={'ticker' : 'AAPL'})
+        assert res.headers['Age'] == '0'
+        assert 'X-Data-Stale' not in res.headers
+
+        now[0] += 90
+        res = test_client.post('/search', data={'ticker' : 'AAPL'})
+        assert res.headers['Age'] == '90'
+        assert res.headers['X-Data-Stale'] == 'true'
+        assert json.loads(res.text)['ticker'] == 'AAPL'
+
+def test_responses_are_encoded_json_with_etags():
+    from isthisstockgood.ResultCache import ResultCache
+
+    result_cache = ResultCache(_fake_fetch, ttl=60)
+    app = create_app(_fake_fetch, result_cache=result_cache)
+
+    with app.test_client() as test_client:
+        res = test_client.post('/search', data={'ticker' : 'AAPL'})
+        assert res.mimetype == 'application/json'
+        assert res.json['description'] is None
+        assert res.json['sticker_price'] is None
+        assert res.json['missing_sources'] == []
+        assert res.headers['ETag'] == '"' + result_cache.get('AAPL').body.etag + '"'
+
+        res = test_client.get('/api/ticker/nvda')
+        assert res.status_code == 200
+        etag = res.headers['ETag']
+        res = test_client.get('/api/ticker/nvda', headers={'If-None-Match' : etag})
+        assert res.status_code == 304
+        assert res.data == b''
+        assert res.headers['Age'] == '0'
+
+        res = test_client.post('/search', data={'ticker' : 'BAD'})
+        assert res.json == {'error' : 'Invalid ticker symbol'}
+
+def _fake_fundamentals(ticker):
+    if ticker == 'BAD':
+        return None
+    return {
+        'ticker' : ticker,
+        'ttm_eps' : 2.5,
+        'pe_low' : 12.0,
+        'pe_high' : 30.0,
+        'market_cap' : 17680.0,
+        'net_income' : 2115.0,
+        'equity_growth_rate' : 14.0,
+        'analyst_growth_rate' : 12.0,
+        'estimated_growth_rate' : 0.12,
+    }
+
+def test_sensitivity_grid():
+    app = create_app(_fake_fetch, fetchFundamentalsForTickerSymbol=_fake_fundamentals)
+
+    with app.test_client() as test_client:
+        res = test_client.get('/api/ticker/AAPL/sensitivity?growth_rates=0,0.12&rates_of_return=0.15&time_horizons=5,10&margins_of_safety=0.5,0.25')
+        assert res.status_code == 200
+
+        data = res.json
+        assert data['axes']['growth_rates'] == [0.0, 0.12]
+        assert len(data['sticker_price']) == 2
+        assert len(data['sticker_price'][0][0]) == 2
+        assert len(data['margin_of_safety_price'][1][0][1]) == 2
+        assert data['sticker_price'][0][0][0] is None
+        assert data['payback_time'] == [-1, 6]
+        sticker_price = data['sticker_price'][1][0][1]
+        assert data['margin_of_safety_price'][1][0][1] == [sticker_price * 0.5, sticker_price * 0.75]
+
+        assert test_client.get('/api/ticker/BAD/sensitivity').status_code == 404
+        assert test_client.get('/api/ticker/AAPL/sensitivity?growth_rates=abc').status_code == 400
+        for value in ('nan', 'inf', '-inf'):
+            res = test_client.get(f'/api/ticker/AAPL/sensitivity?rates_of_return=0.15,{value}')
+            assert res.status_code == 400
+            assert 'finite' in res.json['error']
+        assert len(test_client.get('/api/ticker/AAPL/sensitivity').json['axes']['growth_rates']) == 5
+
+def test_screen():
+    directory = tempfile.TemporaryDirectory()
+    store = FundamentalsStore(directory.name, flush_every=None)
+    # EPS growing 15% over the last year and 12% a year over three years.
+    store.upsert(CompanyFundamentals('AAPL', eps=[100 / 1.12 ** 3, 100, 100 / 1.15, 100], current_price=1.0))
+    store.upsert(CompanyFundamentals('MSFT', eps=[100 / 1.08, 100], current_price=2.0))
+    store.flush()
+    app = create_app(_fake_fetch, screener=Screener(directory.name))
+
+    with app.test_client() as test_client:
+        res = test_client.get('/api/screen?eps_min=10:&sort=current_price&order=desc')
+        assert res.status_code == 200
+        assert res.json['count'] == 1
+        assert res.json['results'][0]['ticker'] == 'AAPL'
+        assert res.json['results'][0]['eps_3y'] == 12.0
+        assert res.json['results'][0]['cash_1y'] is None
+
+        assert test_client.get('/api/screen?limit=1').json['count'] == 2
+        assert len(test_client.get('/api/screen?limit=1').json['results']) == 1
+        assert test_client.get('/api/screen?eps_min=10').status_code == 400
+        assert test_client.get('/api/screen?eps_min=a:').status_code == 400
+        assert test_client.get('/api/screen?pe=1:').status_code == 400
+        assert test_client.get('/api/screen?limit=5000').status_code == 400
+    assert create_app(_fake_fetch).test_client().get('/api/screen').status_code == 404
+    directory.cleanup()
+
+def test_metrics():
+    metrics = Metrics(enabled=True)
+    trace = metrics.start_trace('AAPL')
+    trace.stage('msn_quotes', 'parse', trace.started_at, trace.started_at + 0.002)
+    trace.finish()
+    app = create_app(_fake_fetch, metrics=metrics)
+
+    with app.test_client() as test_client:
+        res = test_client.get('/metrics')
+        assert res.status_code == 200
+        assert res.mimetype == 'text/plain'
+        assert 'isthisstockgood_upstream_stage_seconds_bucket{source="msn_quotes",stage="parse",le="0.0025"} 1' in res.text
+
+        traces = test_client.get('/metrics/traces?ticker=AAPL').json
+        assert [trace['trace_id'] for trace in traces] == [trace.trace_id]
+        assert traces[0]['spans'][0]['name'] == 'msn_quotes.parse'
+        assert test_client.get('/metrics/traces?ticker=MSFT').json == []
+    assert create_app(_fake_fetch).test_client().get('/metrics').status_code == 404
+
+class _AnsweredSessionPool:
+
+    def get(self, url, hooks=None, **kwargs):
+        future = Future()
+        future.set_result(hooks['response'](url))
+        return future
+
+def test_hedging_stats():
+    hedger = Hedger(min_samples=1)
+    assert hedger.get(_AnsweredSessionPool(), 'zacks_analysis', 'https://zacks', lambda url: url).result() == 'https://zacks'
+    app = create_app(_fake_fetch, hedger=hedger)
+
+    with app.test_client() as test_client:
+        stats = test_client.get('/metrics/hedging').json
+        assert stats['in_flight'] == 0
+        zacks = stats['sources']['zacks_analysis']
+        assert (zacks['requests'], zacks['hedged'], zacks['hedges_won']) == (1, 0, 0)
+        assert zacks['delay'] == 0.1
+    assert create_app(_fake_fetch).test_client().get('/metrics/hedging').status_code == 404
+
+def test_profiles():
+    directory = tempfile.TemporaryDirectory()
+    profiler = SamplingProfiler(directory.name, threshold=0, interval=0.001)
+    app = create_app(_fake_fetch, profiler=profiler)
+
+    with app.test_client() as test_client:
+        res = test_client.post('/search', data={'ticker' : 'AAPL'}, headers={'X-Request-ID' : 'abc-123'})
+        assert res.headers['X-Request-ID'] == 'abc-123'
+        assert [profile['request_id'] for profile in test_client.get('/profiles').json] == ['abc-123']
+        assert test_client.get('/profiles/abc-123').status_code == 200
+
+        res = test_client.post('/search', data={'ticker' : 'AAPL'}, headers={'X-Request-ID' : '../x'})
+        request_id = res.headers['X-Request-ID']
+        assert request_id != '../x'
+        assert test_client.get(f'/profiles/{request_id}').status_code == 200
+        # Only the profiled endpoints are kept.
+        request_id = test_client.get('/api').headers['X-Request-ID']
+        assert test_client.get(f'/profiles/{request_id}').status_code == 404
+    profiler.close()
+    assert create_app(_fake_fetch).test_client().get('/profiles/abc-123').status_code == 404
+    directory.cleanup()